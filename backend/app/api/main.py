@@ -1,10 +1,24 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from .routers import api_router
 
 from .middleware.auth_middleware import add_auth_middleware
 from .middleware.error_middleware import add_error_middleware
 from .middleware.logging_middleware import add_logging_middleware
+from .middleware.profiling_middleware import add_profiling_middleware
+from ..services.metrics_service import render_metrics
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Bring databases created by earlier versions up to the current models
+    from ..db import engine
+    from ..db.models import upgrade_schema
+
+    with engine.begin() as connection:
+        upgrade_schema(connection)
+    yield
 
 def create_app():
     # Create FastAPI app
@@ -12,6 +26,7 @@ def create_app():
         title="PDF Retrieval DeepSeek API",
         description="API for retrieving and processing PDF documents, URLs, and YouTube videos",
         version="0.1.0",
+        lifespan=lifespan,
     )
     
     # Configure CORS
@@ -23,10 +38,11 @@ def create_app():
         allow_headers=["*"],
     )
     
-    # Add middleware (in order)
-    add_logging_middleware(app)  # First to log all requests
-    add_error_middleware(app)    # Second to catch errors
-    add_auth_middleware(app)     # Third to authenticate requests
+    # Add middleware (the last one added runs outermost)
+    add_profiling_middleware(app)  # Innermost, profiles admin-flagged or sampled requests
+    add_auth_middleware(app)     # Authenticates requests
+    add_error_middleware(app)    # Catches errors from auth and routes
+    add_logging_middleware(app)  # Outermost, logs all requests
     
     # Include routers
     app.include_router(api_router, prefix="/api")
@@ -35,6 +51,11 @@ def create_app():
     def health_check():
         """Health check endpoint"""
         return {"status": "healthy"}
+
+    @app.get("/metrics", response_class=PlainTextResponse)
+    def metrics():
+        """Prometheus metrics endpoint"""
+        return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
     
     return app
 
@@ -1,12 +1,20 @@
-from fastapi import Request, HTTPException, status
-from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from typing import Optional, Dict, Any
-from starlette.middleware.base import BaseHTTPMiddleware
+from fastapi import status
+from fastapi.security import HTTPBearer
+from fastapi.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+from typing import Optional, Dict, Any, Iterable
+from collections import OrderedDict
 import jwt
 from datetime import datetime, timedelta
+import hashlib
+import hmac
 import os
+import threading
+import time
 from dotenv import load_dotenv
 
+from ...services.metrics_service import METRICS_TOKEN, registry
+
 # Load environment variables
 load_dotenv()
 
@@ -15,53 +23,193 @@ SECRET_KEY = os.getenv("JWT_SECRET_KEY", "your-secret-key")
 ALGORITHM = os.getenv("JWT_ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
 
+# Verified token cache settings
+TOKEN_CACHE_SIZE = int(os.getenv("JWT_CACHE_SIZE", "10000"))
+TOKEN_CACHE_TTL_SECONDS = float(os.getenv("JWT_CACHE_TTL_SECONDS", "300"))
+REVOCATION_LIST_PATH = os.getenv("JWT_REVOCATION_LIST")
+
+# Paths that skip authentication (like login, health check, docs)
+PUBLIC_PATHS = frozenset(["/login", "/health", "/docs", "/openapi.json", "/redoc"])
+# Needs a user JWT or, for scrapers, the METRICS_TOKEN bearer token
+METRICS_PATH = "/metrics"
+
 security = HTTPBearer()
 
-class AuthMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
-        # Skip auth for specific paths (like login, health check, docs)
-        if request.url.path in ["/login", "/health", "/docs", "/openapi.json", "/redoc"]:
-            return await call_next(request)
-            
+token_cache_requests = registry.counter(
+    "deepnote_auth_token_cache_requests_total", "Verified token cache lookups by result"
+)
+token_cache_hit_ratio = registry.gauge(
+    "deepnote_auth_token_cache_hit_ratio", "Share of authenticated requests served from the token cache"
+)
+
+class VerifiedTokenCache:
+    """Bounded, TTL-aware LRU cache of verified tokens keyed by token digest"""
+    def __init__(self, max_size: int = TOKEN_CACHE_SIZE, ttl: float = TOKEN_CACHE_TTL_SECONDS):
+        self.max_size = max_size
+        self.ttl = ttl
+        # digest -> (monotonic deadline, user claims, jti), least recently used first
+        self._entries: "OrderedDict[bytes, tuple]" = OrderedDict()
+        self._revoked_digests = set()
+        self._revoked_jtis = set()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def digest(token: str) -> bytes:
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, token: str) -> Optional[Dict[str, Any]]:
+        """Return cached user claims, or None if the token must be verified"""
+        key = self.digest(token)
+        entry = self._entries.get(key)
+        if entry is not None and time.monotonic() < entry[0]:
+            with self._lock:
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+            self._record(hit=True)
+            return entry[1]
+        if entry is not None:
+            with self._lock:
+                self._entries.pop(key, None)
+        self._record(hit=False)
+        return None
+
+    def put(self, token: str, payload: Dict[str, Any], user: Dict[str, Any]):
+        """Cache verified claims until the earlier of the token's exp and the cache TTL"""
+        if self.is_revoked(token, payload):
+            return
+        remaining = payload["exp"] - datetime.utcnow().timestamp()
+        lifetime = min(remaining, self.ttl)
+        if lifetime <= 0:
+            return
+        key = self.digest(token)
+        with self._lock:
+            if key not in self._entries and len(self._entries) >= self.max_size:
+                self._evict()
+            self._entries[key] = (time.monotonic() + lifetime, user, payload.get("jti"))
+            self._entries.move_to_end(key)
+
+    def is_revoked(self, token: str, payload: Optional[Dict[str, Any]] = None) -> bool:
+        if self.digest(token) in self._revoked_digests:
+            return True
+        return bool(payload and payload.get("jti") in self._revoked_jtis)
+
+    def revoke(self, token: str):
+        """Revoke a single token"""
+        key = self.digest(token)
+        with self._lock:
+            self._revoked_digests.add(key)
+            self._entries.pop(key, None)
+
+    def revoke_jtis(self, jtis: Iterable[str]):
+        """Revoke tokens by their `jti` claim"""
+        with self._lock:
+            self._revoked_jtis.update(jtis)
+            for key, entry in list(self._entries.items()):
+                if entry[2] in self._revoked_jtis:
+                    del self._entries[key]
+
+    def load_revocation_list(self, path: str):
+        """Load revoked `jti` values from a file, one per line"""
+        with open(path) as f:
+            self.revoke_jtis(line.strip() for line in f if line.strip())
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _evict(self):
+        # Drop expired entries first, then the least recently used
+        now = time.monotonic()
+        expired = [key for key, entry in self._entries.items() if entry[0] <= now]
+        for key in expired:
+            del self._entries[key]
+        overflow = len(self._entries) - self.max_size + 1
+        if overflow > 0:
+            for _ in range(min(len(self._entries), max(overflow, self.max_size // 10))):
+                self._entries.popitem(last=False)
+
+    def _record(self, hit: bool):
+        if hit:
+            self.hits += 1
+        else:
+            self.misses += 1
+        token_cache_requests.inc(result="hit" if hit else "miss")
+        token_cache_hit_ratio.set(self.hits / (self.hits + self.misses))
+
+token_cache = VerifiedTokenCache()
+if REVOCATION_LIST_PATH and os.path.exists(REVOCATION_LIST_PATH):
+    token_cache.load_revocation_list(REVOCATION_LIST_PATH)
+
+def _unauthorized(detail: str) -> JSONResponse:
+    return JSONResponse(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        content={"detail": detail},
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+def _get_header(scope: Scope, name: bytes) -> Optional[str]:
+    for key, value in scope["headers"]:
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+def _is_metrics_token(token: str) -> bool:
+    return bool(METRICS_TOKEN) and hmac.compare_digest(token.encode(), METRICS_TOKEN.encode())
+
+class AuthMiddleware:
+    """Pure ASGI middleware validating bearer tokens"""
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or scope["path"] in PUBLIC_PATHS:
+            await self.app(scope, receive, send)
+            return
+
         # Get token from header
-        auth_header = request.headers.get("Authorization")
+        auth_header = _get_header(scope, b"authorization")
         if not auth_header or not auth_header.startswith("Bearer "):
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Invalid authentication credentials",
-                headers={"WWW-Authenticate": "Bearer"},
-            )
-            
+            await _unauthorized("Invalid authentication credentials")(scope, receive, send)
+            return
+
         token = auth_header.split(" ")[1]
-        
-        try:
-            # Decode and validate token
-            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-            
-            # Check if token is expired
+
+        if scope["path"] == METRICS_PATH and _is_metrics_token(token):
+            await self.app(scope, receive, send)
+            return
+
+        # Tokens verified recently skip decoding entirely
+        user = token_cache.get(token)
+        if user is None:
+            try:
+                # Decode and validate token
+                payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+            except jwt.PyJWTError:
+                await _unauthorized("Invalid token")(scope, receive, send)
+                return
+
+            # Check if token is expired or revoked
             if datetime.utcnow() > datetime.fromtimestamp(payload["exp"]):
-                raise HTTPException(
-                    status_code=status.HTTP_401_UNAUTHORIZED,
-                    detail="Token expired",
-                    headers={"WWW-Authenticate": "Bearer"},
-                )
-                
-            # Add user info to request state
-            request.state.user = {
+                await _unauthorized("Token expired")(scope, receive, send)
+                return
+            if token_cache.is_revoked(token, payload):
+                await _unauthorized("Token revoked")(scope, receive, send)
+                return
+
+            user = {
                 "id": payload.get("sub"),
                 "email": payload.get("email"),
                 "is_active": payload.get("is_active", True)
             }
-            
-        except jwt.PyJWTError:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Invalid token",
-                headers={"WWW-Authenticate": "Bearer"},
-            )
-            
+            token_cache.put(token, payload, user)
+
+        # Add user info to request state
+        scope.setdefault("state", {})["user"] = user
+
         # Continue with request
-        return await call_next(request)
+        await self.app(scope, receive, send)
 
 def create_access_token(data: Dict[str, Any], expires_delta: Optional[timedelta] = None):
     """Create a new JWT token"""
@@ -1,42 +1,66 @@
-from fastapi import FastAPI, Request, Response, status
+from fastapi import FastAPI, status
 from fastapi.responses import JSONResponse
 from sqlalchemy.exc import SQLAlchemyError
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 import traceback
 import logging
-from starlette.middleware.base import BaseHTTPMiddleware
-import time
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-class ErrorMiddleware(BaseHTTPMiddleware):
-    """Middleware for handling errors"""
-    async def dispatch(self, request: Request, call_next):
+class ErrorMiddleware:
+    """Pure ASGI middleware for handling errors"""
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        response_started = False
+
+        async def send_wrapper(message: Message):
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
         try:
             # Process the request normally
-            return await call_next(request)
-        
+            await self.app(scope, receive, send_wrapper)
+            return
+
         except SQLAlchemyError as e:
+            # A response that already sent its headers can't be replaced
+            if response_started:
+                raise
+
             # Handle database errors
             logger.error(f"Database error: {str(e)}")
 
-            return JSONResponse(
+            response = JSONResponse(
                 status_code = status.HTTP_500_INTERNAL_SERVER_ERROR,
                 content = {"detail": "Database error occured", "type": "database_error"}
             )
-        
+
         except Exception as e:
+            if response_started:
+                raise
+
             # Handle unexpected errors
             logger.error(f"Unexpected error: {str(e)}")
             logger.error(traceback.format_exc())
 
             # Return a user-friendly error message
-            return JSONResponse(
+            response = JSONResponse(
                 status_code = status.HTTP_500_INTERNAL_SERVER_ERROR,
                 content = {"detail": "An unexpected error occured", "type": "server_error"}
             )
-        
+
+        await response(scope, receive, send)
+
 class RequestValidationErrorHandler:
     """Handler for request validation errors"""
     def __init__(self, app: FastAPI):
@@ -46,7 +70,7 @@ class RequestValidationErrorHandler:
                 status_code = status.HTTP_422_UNPROCESSABLE_ENTITY,
                 content = {"detail": str(exc), "type": "validation_error"}
             )
-        
+
 def add_error_middleware(app: FastAPI):
     """Add error handling middleware to the FastAPI app"""
     app.add_middleware(ErrorMiddleware)
@@ -1,71 +1,129 @@
-from fastapi import FastAPI, Request
-from starlette.middleware.base import BaseHTTPMiddleware
+from fastapi import FastAPI
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 import logging
 import time
 import uuid
-import json
+
+from ...services.metrics_service import (
+    start_request_timing,
+    stop_request_timing,
+    current_request_timings,
+    format_server_timing,
+    http_request_duration,
+    METRICS_ENABLED,
+)
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-class LoggingMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
+class LoggingMiddleware:
+    """Pure ASGI middleware logging requests and tagging them with a request ID"""
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
         # Generate request ID for tracking
         request_id = str(uuid.uuid4())
-        
+
         # Add request ID to request state for later use
-        request.state.request_id = request_id
-        
-        # Start timer for request duration
-        start_time = time.time()
-        
+        scope.setdefault("state", {})["request_id"] = request_id
+
+        method = scope["method"]
+        path = scope["path"]
+
+        # Start monotonic timer for request duration and collect stage spans
+        start_time = time.perf_counter()
+        timing_token = start_request_timing()
+        status_code = 500
+
         # Log request details
-        logger.info(f"Request started | ID: {request_id} | Method: {request.method} | Path: {request.url.path}")
-        
+        logger.info(f"Request started | ID: {request_id} | Method: {method} | Path: {path}")
+
+        async def send_wrapper(message: Message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                headers = MutableHeaders(scope=message)
+
+                # Add request ID to response headers for tracking
+                headers["X-Request-ID"] = request_id
+
+                # Expose per-stage timings to the browser devtools
+                if METRICS_ENABLED:
+                    headers["Server-Timing"] = format_server_timing(
+                        current_request_timings(), total=time.perf_counter() - start_time
+                    )
+            await send(message)
+
         # Process the request
-        response = await call_next(request)
-        
-        # Calculate request duration
-        process_time = time.time() - start_time
-        
-        # Log response details
-        logger.info(
-            f"Request completed | ID: {request_id} | Method: {request.method} | "
-            f"Path: {request.url.path} | Status: {response.status_code} | "
-            f"Duration: {process_time:.4f}s"
-        )
-        
-        # Add request ID to response headers for tracking
-        response.headers["X-Request-ID"] = request_id
-        
-        return response
-
-class RequestBodyLoggerMiddleware(BaseHTTPMiddleware):
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            stop_request_timing(timing_token)
+
+            # Calculate request duration
+            process_time = time.perf_counter() - start_time
+            if METRICS_ENABLED:
+                http_request_duration.observe(process_time, method=method, status=str(status_code))
+
+            # Log response details
+            logger.info(
+                f"Request completed | ID: {request_id} | Method: {method} | "
+                f"Path: {path} | Status: {status_code} | "
+                f"Duration: {process_time:.4f}s"
+            )
+
+class RequestBodyLoggerMiddleware:
     """Log request bodies for debugging (use cautiously in production)"""
-    async def dispatch(self, request: Request, call_next):
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
         # Only log request body for specific content types
-        if request.headers.get("content-type") == "application/json":
-            request_body = await request.body()
-            
-            # Reset the request body stream
-            async def receive():
-                return {"type": "http.request", "body": request_body}
-            request._receive = receive
-            
-            # Log request body (be careful with sensitive data)
-            try:
-                body_str = request_body.decode()
-                logger.debug(f"Request body: {body_str}")
-            except Exception as e:
-                logger.error(f"Failed to decode request body: {str(e)}")
-                
+        content_type = dict(scope["headers"]).get(b"content-type")
+        if content_type != b"application/json":
+            await self.app(scope, receive, send)
+            return
+
+        # Read the full body, then replay it to the app
+        body = b""
+        more_body = True
+        while more_body:
+            message = await receive()
+            body += message.get("body", b"")
+            more_body = message.get("more_body", False)
+
+        # Log request body (be careful with sensitive data)
+        try:
+            logger.debug(f"Request body: {body.decode()}")
+        except Exception as e:
+            logger.error(f"Failed to decode request body: {str(e)}")
+
+        replayed = False
+
+        async def replay_receive() -> Message:
+            nonlocal replayed
+            if not replayed:
+                replayed = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()
+
         # Continue with the request
-        return await call_next(request)
+        await self.app(scope, replay_receive, send)
 
 def add_logging_middleware(app: FastAPI):
     """Add logging middleware to the FastAPI app"""
     app.add_middleware(LoggingMiddleware)
-    
+
     # Optional: Add request body logger for development environments
     # app.add_middleware(RequestBodyLoggerMiddleware)
\ No newline at end of file
@@ -0,0 +1,91 @@
+from fastapi import FastAPI
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+import hmac
+import logging
+import random
+import uuid
+
+from ...services.profiling_service import (
+    PROFILING_ADMIN_TOKEN,
+    PROFILING_ENABLED,
+    PROFILING_SAMPLE_RATE,
+    get_profile_store,
+    start_request_profile,
+    stop_request_profile,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def is_admin_token(value: str) -> bool:
+    """Whether a header value is the profiling admin token (never true when no token is configured)"""
+    return bool(PROFILING_ADMIN_TOKEN) and hmac.compare_digest(value.encode(), PROFILING_ADMIN_TOKEN.encode())
+
+
+def _profile_trigger(scope: Scope) -> str:
+    for key, value in scope["headers"]:
+        if key == b"x-profile-token":
+            return "header" if is_admin_token(value.decode("latin-1")) else ""
+    if PROFILING_SAMPLE_RATE and random.random() < PROFILING_SAMPLE_RATE:
+        return "sample"
+    return ""
+
+
+class ProfilingMiddleware:
+    """Pure ASGI middleware profiling requests that carry the admin token or are sampled.
+
+    The profile stays open until background tasks finish, so an upload's
+    ingestion is part of its profile. Artifacts are downloadable from
+    /api/profiles under the X-Profile-ID returned with the response.
+
+    Only one request per worker is profiled at a time; others arriving
+    meanwhile are served unprofiled, but not at full speed: allocation
+    tracing is process-wide and slows every request in the worker, in
+    proportion to how much it allocates, until the profile ends.
+    Keep PROFILING_SAMPLE_RATE low in production.
+    """
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or scope["path"].startswith("/api/profiles"):
+            await self.app(scope, receive, send)
+            return
+        trigger = _profile_trigger(scope)
+        if not trigger:
+            await self.app(scope, receive, send)
+            return
+
+        # The request ID set by the logging middleware doubles as the profile ID
+        profile_id = scope.get("state", {}).get("request_id") or str(uuid.uuid4())
+        token = start_request_profile(profile_id, scope["method"], scope["path"], trigger)
+        if token is None:
+            logger.info(f"Another request is being profiled, not profiling {scope['path']}")
+            await self.app(scope, receive, send)
+            return
+        status_code = None
+
+        async def send_wrapper(message: Message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                MutableHeaders(scope=message)["X-Profile-ID"] = profile_id
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            profile = stop_request_profile(token, status_code)
+            try:
+                await run_in_threadpool(get_profile_store().save, profile)
+                logger.info(f"Profiled {scope['method']} {scope['path']} as {profile_id} ({profile.seconds:.3f}s)")
+            except Exception as e:
+                logger.error(f"Error saving profile {profile_id}: {str(e)}")
+
+
+def add_profiling_middleware(app: FastAPI):
+    """Add the profiling middleware to the FastAPI app, unless profiling is disabled"""
+    if PROFILING_ENABLED:
+        app.add_middleware(ProfilingMiddleware)
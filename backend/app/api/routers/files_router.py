@@ -1,7 +1,8 @@
 from datetime import datetime
-from fastapi import APIRouter, Depends, UploadFile, File, Form, BackgroundTasks, BaseModel
+from fastapi import APIRouter, Depends, UploadFile, File, Form, BackgroundTasks
+from pydantic import BaseModel
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 
 from ...db.database import get_db
 from ...controllers.files_controller import FilesController
@@ -30,6 +31,8 @@ class URLRequest(BaseModel):
     url: str
     type: str = "url"
     upload_date: datetime
+    crawl: bool = False
+    max_depth: Optional[int] = None
 
 class YoutubeRequest(BaseModel):
     url: str
@@ -76,5 +79,5 @@ def get_file(file_id: int, db: Session = Depends(get_db)):
     return controller.get_file(file_id, db)
 
 @router.delete("/{file_id}")
-def delete_file(file_id: int, db: Session = Depends(get_db)):
-    return controller.delete_file(file_id, db)
\ No newline at end of file
+def delete_file(file_id: int, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
+    return controller.delete_file(file_id, db, background_tasks)
\ No newline at end of file
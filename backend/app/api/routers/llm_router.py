@@ -1,7 +1,41 @@
+import json
 from fastapi import APIRouter
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+from typing import List, Optional
+
+from ...controllers.llm_controller import LLMController
 
 router = APIRouter()
+controller = LLMController()
+
+
+class BatchQARequest(BaseModel):
+    questions: List[str]
+    file_ids: Optional[List[int]] = None
+    file_types: Optional[List[str]] = None
+    k: int = 5
+    concurrency: Optional[int] = None
+
 
 @router.get("/")
 async def get_chat():
-    return {"chat": []}
\ No newline at end of file
+    return {"chat": []}
+
+@router.get("/indexes")
+def get_index_stats():
+    """Residency, size, load time and eviction counts of per-tenant indexes"""
+    from ...services.index_manager import get_index_manager
+
+    return get_index_manager().stats()
+
+@router.post("/qa/batch")
+def answer_batch(request: BatchQARequest, user_id: int = 1):
+    """Answer many questions, streaming one JSON line per answer as generations complete"""
+    results = controller.answer_batch(
+        request.questions, user_id, file_ids=request.file_ids, file_types=request.file_types,
+        k=request.k, concurrency=request.concurrency,
+    )
+    return StreamingResponse(
+        (json.dumps(result) + "\n" for result in results), media_type="application/x-ndjson"
+    )
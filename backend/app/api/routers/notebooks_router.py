@@ -1,7 +1,79 @@
-from fastapi import APIRouter
+from datetime import datetime
+from fastapi import APIRouter, Depends
+from pydantic import BaseModel
+from sqlalchemy.orm import Session
+from typing import List, Optional
+
+from ...db import get_db
+from ...controllers.notebook_controller import NotebookController
 
 router = APIRouter()
+controller = NotebookController()
+
+
+class NotebookRequest(BaseModel):
+    title: str
+
+class EntryRequest(BaseModel):
+    content: str
+
+class AskRequest(BaseModel):
+    question: str
+    file_ids: Optional[List[int]] = None
+    file_types: Optional[List[str]] = None
+    k: int = 5
+
+class NotebookResponse(BaseModel):
+    id: int
+    title: str
+    created_at: datetime
+    updated_at: datetime
+
+    class Config:
+        orm_mode = True
+
+class EntryResponse(BaseModel):
+    id: int
+    content: str
+    entry_type: str
+    created_at: datetime
+
+    class Config:
+        orm_mode = True
+
+
+@router.post("/", response_model=NotebookResponse)
+def create_notebook(request: NotebookRequest, user_id: int = 1, db: Session = Depends(get_db)):
+    return controller.create_notebook(request.title, user_id, db)
+
+@router.get("/", response_model=List[NotebookResponse])
+def get_notebooks(user_id: int = 1, db: Session = Depends(get_db)):
+    return controller.get_notebooks(user_id, db)
+
+@router.get("/{notebook_id}", response_model=NotebookResponse)
+def get_notebook(notebook_id: int, db: Session = Depends(get_db)):
+    return controller.get_notebook(notebook_id, db)
+
+@router.delete("/{notebook_id}")
+def delete_notebook(notebook_id: int, db: Session = Depends(get_db)):
+    return controller.delete_notebook(notebook_id, db)
+
+@router.get("/{notebook_id}/entries", response_model=List[EntryResponse])
+def get_entries(notebook_id: int, after_id: Optional[int] = None, limit: Optional[int] = None,
+                db: Session = Depends(get_db)):
+    return controller.get_entries(notebook_id, db, after_id=after_id, limit=limit)
+
+@router.post("/{notebook_id}/entries", response_model=EntryResponse)
+def add_entry(notebook_id: int, request: EntryRequest, db: Session = Depends(get_db)):
+    return controller.add_entry(notebook_id, request.content, db)
+
+@router.post("/{notebook_id}/ask")
+def ask(notebook_id: int, request: AskRequest, user_id: int = 1, db: Session = Depends(get_db)):
+    """Answer a question in the notebook's conversation"""
+    return controller.ask(notebook_id, request.question, user_id, db, file_ids=request.file_ids,
+                          file_types=request.file_types, k=request.k)
 
-@router.get("/")
-async def get_chat():
-    return {"chat": []}
\ No newline at end of file
+@router.get("/{notebook_id}/memory")
+def get_memory(notebook_id: int, db: Session = Depends(get_db)):
+    """Rolling summary and recent-turn window the next answer would use"""
+    return controller.get_memory(notebook_id, db)
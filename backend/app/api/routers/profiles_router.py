@@ -0,0 +1,36 @@
+import os
+
+from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi.responses import FileResponse
+
+from ..middleware.profiling_middleware import is_admin_token
+from ...services.profiling_service import get_profile_store
+
+router = APIRouter()
+
+
+def require_admin(x_profile_token: str = Header("")):
+    if not is_admin_token(x_profile_token):
+        raise HTTPException(status_code=403, detail="Profiling admin token required")
+
+
+@router.get("/", dependencies=[Depends(require_admin)])
+def list_profiles():
+    """Recently profiled requests, newest first"""
+    return get_profile_store().list()
+
+@router.get("/{profile_id}", dependencies=[Depends(require_admin)])
+def get_profile(profile_id: str):
+    """Stages, slowest functions and largest allocations of a profiled request"""
+    summary = get_profile_store().get(profile_id)
+    if summary is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return summary
+
+@router.get("/{profile_id}/{kind}", dependencies=[Depends(require_admin)])
+def download_profile(profile_id: str, kind: str):
+    """Download the `cpu` profile (pstats, e.g. for snakeviz) or the `memory` tracemalloc snapshot"""
+    path = get_profile_store().path(profile_id, kind) if kind in ("cpu", "memory") else None
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile artifact not found")
+    return FileResponse(path, media_type="application/octet-stream", filename=os.path.basename(path))
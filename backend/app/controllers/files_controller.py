@@ -1,11 +1,15 @@
 from fastapi import UploadFile, HTTPException, BackgroundTasks
 from sqlalchemy.orm import Session
 import os
+import json
 import shutil
 from uuid import uuid4
 import logging
+import time
 
 from ..services.file_service import DocumentProcessor
+from ..services.dedup_service import SimHashIndex, is_duplicate
+from ..services.text_cache import content_hash
 from ..db.repositories.file_repository import FileRepository
 
 logger = logging.getLogger(__name__)
@@ -15,25 +19,247 @@ os.makedirs(UPLOAD_DIR, exist_ok=True)
 
 # Background processing class
 class process_in_background:
-    def __init__(self, file_type, file_path, file_id, db):
+    def __init__(self, file_type, file_path, file_id, db, crawl=False, max_depth=None):
         self.file_type = file_type
         self.file_path = file_path
         self.file_id = file_id
         self.db = db
+        self.crawl = crawl
+        self.max_depth = max_depth
         self.processor = DocumentProcessor()
-        
+        # Streaming state: stored chunk ids by chunk_index, and chunks and duplicate
+        # references to other files' chunks not yet in the index
+        self.chunk_ids = {}
+        self.next_index = 0
+        self.pending = []
+        self.pending_aliases = []
+        self.published_at = 0.0
+
     def process(self):
-        documents = self.processor.process_documents(self.file_path, self.file_type)
-        if not documents:
-            logger.error(f"Error processing file: {self.file_path}")
+        """Stream the source through the ingest pipeline, storing and indexing chunks in micro-batches"""
+        if self.crawl:
+            return self.process_crawl()
+        from ..services.index_manager import get_index_manager
+        from ..services.ingest_pipeline import IngestPipeline
+
+        db_file = FileRepository.get_file_by_id(self.db, self.file_id)
+        if not db_file:
+            logger.error(f"File {self.file_id} no longer exists, skipping {self.file_path}")
+            return
+        self.user_id = db_file.user_id
+        self.index_manager = get_index_manager()
+        # Near-duplicates of the user's existing chunks are stored as references
+        dedup_index = SimHashIndex.from_fingerprints(FileRepository.get_user_fingerprints(self.db, self.user_id))
+
+        self.pipeline = IngestPipeline(
+            self.processor, self.store_batch, embeddings=self.index_manager.embeddings, dedup_index=dedup_index
+        )
+        try:
+            # The content hash keys the extracted-text cache that scripts/reprocess_chunks.py re-chunks from
+            file_hash = None
+            if self.file_type == "pdf":
+                file_hash = content_hash(self.file_path)
+                FileRepository.set_content_hash(self.db, self.file_id, file_hash)
+            pages = self.processor.stream_pages(self.file_path, self.file_type, file_hash)
+            stats = self.pipeline.run(pages, self.file_type)
+        except Exception as e:
+            # Batches stored before the failure stay searchable
+            logger.error(f"Error processing file {self.file_path}: {str(e)}")
+            return
+        finally:
+            # A batch that failed to commit leaves the session unusable until rolled back
+            self.db.rollback()
+            if FileRepository.get_file_by_id(self.db, self.file_id) is None:
+                # Deleted while ingesting: drop what is held back and tombstone batches indexed after the delete
+                self.pending = []
+                self.pending_aliases = []
+                self.index_manager.delete_file(self.user_id, self.file_id)
+            else:
+                # The batches stored since the last throttled publish
+                self.publish(force=True)
+
+        if stats.cancelled:
+            logger.info(f"File {self.file_id} was deleted, stopped ingesting {self.file_path}")
+            return
+        if not stats.chunks:
+            logger.error(f"No content extracted from file: {self.file_path}")
+            return
+        FileRepository.set_dedup_ratio(self.db, self.file_id, stats.dedup_ratio)
+        logger.info(
+            f"Ingested {stats.chunks} chunks from {stats.pages} pages of {self.file_path} in {stats.seconds:.2f}s "
+            f"(first batch after {stats.first_batch_seconds:.2f}s, dedup ratio {stats.dedup_ratio:.1%})"
+        )
+
+    def store_batch(self, documents, vectors):
+        """Commit a micro-batch of chunks with their embeddings and queue it for the index"""
+        first_index = self.next_index
+        if FileRepository.append_document_chunks(
+            self.db, self.file_id, documents, first_index, self.chunk_ids, vectors
+        ) is None:
+            # Deleted meanwhile; purge_deleted_file removes the batches already stored
+            self.pipeline.cancel()
+            return
+        self.next_index += len(documents)
+        for offset, (doc, vector) in enumerate(zip(documents, vectors)):
+            chunk_index = first_index + offset
+            doc.metadata.update(chunk_id=self.chunk_ids[chunk_index], file_id=self.file_id, chunk_index=chunk_index)
+            if not is_duplicate(doc):
+                self.pending.append((doc, vector))
+            elif "duplicate_of_chunk" in doc.metadata:
+                # Answered by another file's chunk, which filters on this file must still match
+                self.pending_aliases.append(doc.metadata["duplicate_of_chunk"])
+        self.publish()
+
+    def publish(self, force=False):
+        """Add pending chunks to the user's index, at most once per INGEST_PUBLISH_SECONDS unless forced.
+
+        The first batch is added right away so a file's first pages are
+        searchable early; later ones are grouped because each addition
+        rebuilds the index's vector matrix on the next query and, with
+        segments, rewrites the published segment. Each addition is published,
+        so other workers (and this one when the user is not resident) see the
+        file as it grows rather than only when it is done.
+        """
+        from ..services.ingest_pipeline import INGEST_PUBLISH_SECONDS
+
+        if not (self.pending or self.pending_aliases) or (
+            not force and time.monotonic() - self.published_at < INGEST_PUBLISH_SECONDS
+        ):
+            return
+        documents = [doc for doc, _ in self.pending]
+        vectors = [vector for _, vector in self.pending]
+        duplicate_of = self.pending_aliases
+        self.pending = []
+        self.pending_aliases = []
+        self.published_at = time.monotonic()
+        # Updates the resident or published index; otherwise the next load reads the database
+        self.index_manager.index_file(
+            self.user_id, documents, self.file_id, file_type=self.file_type, user_id=self.user_id,
+            vectors=vectors if all(vector is not None for vector in vectors) else None,
+            duplicate_of=duplicate_of, publish=False,
+        )
+        self.index_manager.publish_file(self.user_id, self.file_id)
+
+    def process_crawl(self):
+        """Crawl a site, re-chunk only the pages that changed since the last crawl and re-index the file"""
+        db_file = FileRepository.get_file_by_id(self.db, self.file_id)
+        if not db_file:
+            logger.error(f"File {self.file_id} no longer exists, skipping crawl of {self.file_path}")
+            return
+        known = {
+            url: {
+                "etag": page.etag,
+                "last_modified": page.last_modified,
+                "content_hash": page.content_hash,
+                "depth": page.depth,
+            }
+            for url, page in FileRepository.get_crawled_pages(self.db, self.file_id).items()
+        }
+        results = self.processor.crawl_url(self.file_path, known, self.max_depth)
+
+        changed = 0
+        live_urls = []
+        for result in results:
+            if result.status == "failed":
+                continue
+            live_urls.append(result.url)
+            if result.status == "changed":
+                contents = [doc.page_content for doc in result.documents]
+                FileRepository.replace_page_chunks(
+                    self.db, self.file_id, result.url, result.content_hash, contents
+                )
+                changed += 1
+            FileRepository.upsert_crawled_page(
+                self.db, self.file_id, result.url, result.depth,
+                result.etag, result.last_modified, result.content_hash
+            )
+        if not live_urls:
+            # Nothing could be fetched (site down, network error): keep the last good crawl
+            logger.error(f"Crawl of {self.file_path} fetched no pages, keeping file {self.file_id} as it was")
             return
-        contents = [doc.page_content for doc in documents]
-        FileRepository.store_file_chunks(self.db, self.file_id, contents)
+
+        # Pages that failed or are gone, and chunks from before the URL was crawled
+        removed = FileRepository.remove_stale_pages(self.db, self.file_id, live_urls)
+        FileRepository.renumber_chunks(self.db, self.file_id)
+        if changed or removed:
+            self.index_crawl(db_file)
+        logger.info(
+            f"Crawled {len(results)} pages for file {self.file_id}, {changed} changed, {removed} stale chunks removed"
+        )
+
+    def index_crawl(self, db_file):
+        """Swap the file's index rows for its current chunks, embedding only chunks without a stored embedding.
+
+        Stale pages' rows go and renumbering changes the chunk_index of the
+        rest, so the whole file is re-indexed; unchanged pages reuse their
+        stored vectors.
+        """
+        from ..services.index_manager import chunk_documents, get_index_manager
+
+        manager = get_index_manager()
+        chunks = FileRepository.get_file_chunks(self.db, self.file_id)
+        missing = [chunk for chunk in chunks if not chunk.embedding]
+        new_vectors = {}
+        if missing:
+            vectors = manager.embeddings.embed_documents([chunk.content for chunk in missing])
+            new_vectors = {chunk.id: vector for chunk, vector in zip(missing, vectors)}
+            FileRepository.store_chunk_embeddings(self.db, new_vectors)
+        vectors = [new_vectors[chunk.id] if chunk.id in new_vectors else json.loads(chunk.embedding)
+                   for chunk in chunks]
+        # Updates the resident or published index; otherwise the next load reads the database
+        manager.replace_file(db_file.user_id, chunk_documents(chunks, db_file), self.file_id,
+                             file_type=db_file.file_type, user_id=db_file.user_id, vectors=vectors)
+
+
+def purge_deleted_file(file_id, user_id, file_type, file_path):
+    """Remove a deleted file's upload and rows after the response; its index rows are already tombstoned.
+
+    An ingest still streaming the file stores no batch after mark_file_deleted,
+    so no chunks are added behind the purge; it stops at its next batch.
+    """
+    from ..db import SessionLocal
+    from ..services.index_manager import chunk_documents, get_index_manager
+
+    start = time.time()
+    if file_type == "pdf" and os.path.exists(file_path):
+        try:
+            os.remove(file_path)
+        except Exception as e:
+            # Log but continue with database deletion
+            logger.error(f"Error deleting file: {str(e)}")
+
+    db = SessionLocal()
+    try:
+        promoted = FileRepository.purge_file(db, file_id)
+        if promoted:
+            # Near-duplicates of the deleted chunks answer for them now, so they need vectors
+            manager = get_index_manager()
+            rows = FileRepository.get_chunks_with_files(db, promoted)
+            vectors = manager.embeddings.embed_documents([chunk.content for chunk, _ in rows])
+            FileRepository.store_chunk_embeddings(db, {chunk.id: vector for (chunk, _), vector in zip(rows, vectors)})
+            start_row = 0
+            while start_row < len(rows):
+                db_file = rows[start_row][1]
+                end_row = start_row
+                while end_row < len(rows) and rows[end_row][1].id == db_file.id:
+                    end_row += 1
+                manager.index_file(
+                    db_file.user_id, chunk_documents([chunk for chunk, _ in rows[start_row:end_row]], db_file),
+                    db_file.id, db_file.file_type, db_file.user_id, vectors[start_row:end_row],
+                )
+                start_row = end_row
+        logger.info(f"Purged file {file_id} in {time.time() - start:.2f}s, {len(promoted)} duplicates promoted")
+    except Exception as e:
+        logger.error(f"Error purging file {file_id}: {str(e)}")
+    finally:
+        db.close()
 
 
 class FilesController:
-    def __init__(self):
-        self.processor = process_in_background()
+    def schedule_processing(self, background_tasks, db, file_type, file_path, file_id, **options):
+        """Run document processing after the response is sent"""
+        task = process_in_background(file_type, file_path, file_id, db, **options)
+        background_tasks.add_task(task.process)
         
     async def process_pdf(self, request, background_tasks, user_id, db):
         """Handle PDF File Upload"""
@@ -69,15 +295,23 @@ class FilesController:
             raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
             
         # Process document using service
-        self.processor(
-            db, file_type, file_path, db_file.id, background_tasks
-        )
+        self.schedule_processing(background_tasks, db, file_type, file_path, db_file.id)
         
         return db_file
     
     async def process_url(self, request, background_tasks, user_id, db):
         """Handle URL Processing"""
         logger.info(f"Uploading file: {request.url} for user: {user_id}")
+        # Re-crawling a known site only re-processes the pages that changed
+        if request.crawl:
+            existing = FileRepository.get_file_by_path(db, user_id, request.url, "url")
+            if existing:
+                self.schedule_processing(
+                    background_tasks, db, "url", request.url, existing.id,
+                    crawl=True, max_depth=request.max_depth
+                )
+                return existing
+
         # Create file record
         try:
             db_file = FileRepository.create_file(
@@ -92,8 +326,9 @@ class FilesController:
             raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
             
         # Process URL using service
-        self.processor(
-            db, "url", request.url, db_file.id, background_tasks
+        self.schedule_processing(
+            background_tasks, db, "url", request.url, db_file.id,
+            crawl=request.crawl, max_depth=request.max_depth
         )
         
         return db_file
@@ -114,9 +349,7 @@ class FilesController:
             raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
             
         # Process YouTube using service
-        self.processor(
-            db, "youtube", request.url, db_file.id, background_tasks
-        )
+        self.schedule_processing(background_tasks, db, "youtube", request.url, db_file.id)
         
         return db_file
     
@@ -134,27 +367,23 @@ class FilesController:
             raise HTTPException(status_code=404, detail="File not found")
         return file
         
-    def delete_file(self, file_id, db):
-        """Delete File"""
+    def delete_file(self, file_id, db, background_tasks=None):
+        """Delete File: hide it and tombstone its index rows now, purge its rows in the background"""
         logger.info(f"Deleting file: {file_id}")
-        file = FileRepository.get_file_by_id(db, file_id)
+        file = FileRepository.mark_file_deleted(db, file_id)
         if not file:
             logger.warning(f"File not found: {file_id}")
             raise HTTPException(status_code=404, detail="File not found")
-            
-        # Delete physical file if it's a PDF
-        if file.file_type == "pdf" and os.path.exists(file.file_path):
-            try:
-                os.remove(file.file_path)
-            except Exception as e:
-                # Log but continue with database deletion
-                logger.error(f"Error deleting file: {str(e)}")
-                
-        # Delete from database
-        success = FileRepository.delete_file(db, file_id)
-        if not success:
-            logger.error(f"Failed to delete file from database: {file_id}")
-            raise HTTPException(status_code=500, detail="Failed to delete file")
-            
+
+        from ..services.index_manager import get_index_manager
+
+        get_index_manager().delete_file(file.user_id, file_id)
+
+        args = (file_id, file.user_id, file.file_type, file.file_path)
+        if background_tasks is not None:
+            background_tasks.add_task(purge_deleted_file, *args)
+        else:
+            purge_deleted_file(*args)
+
         logger.info(f"File deleted successfully: {file_id}")
         return {"message": "File deleted successfully"}
\ No newline at end of file
@@ -0,0 +1,121 @@
+from fastapi import HTTPException
+import concurrent.futures
+import logging
+import os
+import time
+from typing import Iterator, List, Optional
+from dotenv import load_dotenv
+
+from ..services.metrics_service import registry, span
+
+# Load environment variables
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Batch question-answering settings
+# Concurrent generations per batch by default, and the most a request may ask for
+QA_BATCH_CONCURRENCY = int(os.getenv("QA_BATCH_CONCURRENCY", "4"))
+QA_BATCH_MAX_CONCURRENCY = int(os.getenv("QA_BATCH_MAX_CONCURRENCY", "16"))
+QA_BATCH_MAX_QUESTIONS = int(os.getenv("QA_BATCH_MAX_QUESTIONS", "1000"))
+
+qa_batch_questions = registry.counter("deepnote_qa_batch_questions_total", "Questions answered by batch QA, by result")
+
+
+def source_of(doc) -> dict:
+    """Citation fields of a retrieved chunk"""
+    return {
+        key: doc.metadata[key]
+        for key in ("chunk_id", "file_id", "source", "page", "start")
+        if key in doc.metadata
+    }
+
+
+class LLMController:
+    def __init__(self, llm_service=None, index_manager=None):
+        self._llm_service = llm_service
+        self._index_manager = index_manager
+
+    @property
+    def llm_service(self):
+        if self._llm_service is None:
+            from ..services.llm_service import LLMService
+
+            self._llm_service = LLMService()
+        return self._llm_service
+
+    @property
+    def index_manager(self):
+        if self._index_manager is None:
+            from ..services.index_manager import get_index_manager
+
+            self._index_manager = get_index_manager()
+        return self._index_manager
+
+    def answer_batch(self, questions: List[str], user_id: int, file_ids: Optional[List[int]] = None,
+                     file_types: Optional[List[str]] = None, k: int = 5,
+                     concurrency: Optional[int] = None) -> Iterator[dict]:
+        """Retrieve context for all questions at once, then answer them concurrently.
+
+        Retrieval runs before this returns, so its errors surface as HTTP
+        errors; the returned iterator yields one result per question in
+        completion order (each carries its `index`), then a summary.
+        """
+        if not questions:
+            raise HTTPException(status_code=400, detail="No questions given")
+        if len(questions) > QA_BATCH_MAX_QUESTIONS:
+            raise HTTPException(
+                status_code=400, detail=f"At most {QA_BATCH_MAX_QUESTIONS} questions per batch"
+            )
+        start = time.perf_counter()
+        with span("qa.batch_retrieve"):
+            contexts = self.index_manager.query_many(
+                user_id, questions, k=k, file_ids=file_ids, file_types=file_types, with_scores=True
+            )
+        retrieve_seconds = time.perf_counter() - start
+        logger.info(f"Retrieved context for {len(questions)} questions in {retrieve_seconds:.2f}s")
+        workers = max(1, min(concurrency or QA_BATCH_CONCURRENCY, QA_BATCH_MAX_CONCURRENCY, len(questions)))
+        return self._stream_answers(questions, contexts, workers, start, retrieve_seconds)
+
+    def _answer(self, index: int, question: str, context) -> dict:
+        start = time.perf_counter()
+        documents, similarities = context
+        try:
+            answer, thinking = self.llm_service.answer_question(question, documents, similarities)
+        except Exception as e:
+            logger.error(f"Error answering batch question {index}: {str(e)}")
+            qa_batch_questions.inc(result="error")
+            return {"index": index, "question": question, "error": str(e)}
+        qa_batch_questions.inc(result="answered")
+        return {
+            "index": index,
+            "question": question,
+            "answer": answer,
+            "thinking": thinking,
+            "sources": [source_of(doc) for doc in documents],
+            "seconds": round(time.perf_counter() - start, 3),
+        }
+
+    def _stream_answers(self, questions, contexts, workers: int, start: float,
+                        retrieve_seconds: float) -> Iterator[dict]:
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers, thread_name_prefix="qa-batch")
+        futures = [
+            executor.submit(self._answer, index, question, context)
+            for index, (question, context) in enumerate(zip(questions, contexts))
+        ]
+        errors = 0
+        try:
+            for future in concurrent.futures.as_completed(futures):
+                result = future.result()
+                errors += "error" in result
+                yield result
+        finally:
+            # A disconnected client closes the stream; queued generations are dropped
+            executor.shutdown(wait=False, cancel_futures=True)
+        yield {
+            "summary": True,
+            "questions": len(questions),
+            "errors": errors,
+            "retrieve_seconds": round(retrieve_seconds, 3),
+            "seconds": round(time.perf_counter() - start, 3),
+        }
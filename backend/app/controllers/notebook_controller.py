@@ -0,0 +1,108 @@
+from fastapi import HTTPException
+import logging
+import time
+from typing import List, Optional
+
+from ..db.repositories.notebook_repository import NotebookRepository
+from ..services.notebook_service import build_conversation_prompt, conversation_inputs
+from .llm_controller import source_of
+
+logger = logging.getLogger(__name__)
+
+
+class NotebookController:
+    def __init__(self, llm_service=None, index_manager=None, memory=None):
+        self._llm_service = llm_service
+        self._index_manager = index_manager
+        self._memory = memory
+        self.prompt = build_conversation_prompt()
+
+    @property
+    def llm_service(self):
+        if self._llm_service is None:
+            from ..services.llm_service import LLMService
+
+            self._llm_service = LLMService()
+        return self._llm_service
+
+    @property
+    def index_manager(self):
+        if self._index_manager is None:
+            from ..services.index_manager import get_index_manager
+
+            self._index_manager = get_index_manager()
+        return self._index_manager
+
+    @property
+    def memory(self):
+        if self._memory is None:
+            from ..services.notebook_service import get_notebook_memory
+
+            self._memory = get_notebook_memory()
+        return self._memory
+
+    def create_notebook(self, title, user_id, db):
+        return NotebookRepository.create_notebook(db, title, user_id)
+
+    def get_notebooks(self, user_id, db):
+        return NotebookRepository.get_notebooks(db, user_id)
+
+    def get_notebook(self, notebook_id, db):
+        notebook = NotebookRepository.get_notebook(db, notebook_id)
+        if not notebook:
+            raise HTTPException(status_code=404, detail="Notebook not found")
+        return notebook
+
+    def get_entries(self, notebook_id, db, after_id=None, limit=None):
+        self.get_notebook(notebook_id, db)
+        return NotebookRepository.get_entries(db, notebook_id, after_id=after_id, limit=limit)
+
+    def add_entry(self, notebook_id, content, db, entry_type="text"):
+        self.get_notebook(notebook_id, db)
+        entry = NotebookRepository.add_entry(db, notebook_id, content, entry_type)
+        # Notes take window space too, and may push older turns into the summary
+        self.memory.update(db, notebook_id)
+        return entry
+
+    def delete_notebook(self, notebook_id, db):
+        if not NotebookRepository.delete_notebook(db, notebook_id):
+            raise HTTPException(status_code=404, detail="Notebook not found")
+        self.memory.forget(notebook_id)
+        return {"message": "Notebook deleted successfully"}
+
+    def get_memory(self, notebook_id, db):
+        """What the next prompt of a notebook would remember"""
+        self.get_notebook(notebook_id, db)
+        return self.memory.build(db, notebook_id).stats()
+
+    def ask(self, notebook_id, question, user_id, db, file_ids: Optional[List[int]] = None,
+            file_types: Optional[List[str]] = None, k: int = 5):
+        """Answer a question with retrieved context and the notebook's bounded conversation memory"""
+        self.get_notebook(notebook_id, db)
+        start = time.perf_counter()
+        query = NotebookRepository.add_entry(db, notebook_id, question, "query")
+        memory = self.memory.context(db, notebook_id, exclude_entry_id=query.id)
+        documents, similarities = self.index_manager.query(
+            user_id, question, k=k, file_ids=file_ids, file_types=file_types, with_scores=True
+        )
+        inputs = conversation_inputs(memory, question, documents)
+        try:
+            answer, thinking, decision = self.llm_service.answer(
+                self.prompt, inputs, question, documents, similarities, stage="llm.notebook_answer"
+            )
+        except Exception as e:
+            logger.error(f"Error answering in notebook {notebook_id}: {str(e)}")
+            raise HTTPException(status_code=500, detail=f"Error generating answer: {str(e)}")
+        response = NotebookRepository.add_entry(db, notebook_id, answer, "response")
+        # The new turns may push older ones out of the window; fold those into the summary
+        self.memory.update(db, notebook_id)
+        return {
+            "query_entry_id": query.id,
+            "response_entry_id": response.id,
+            "answer": answer,
+            "thinking": thinking,
+            "sources": [source_of(doc) for doc in documents],
+            "model": decision.model,
+            "memory_tokens": memory.tokens,
+            "seconds": round(time.perf_counter() - start, 3),
+        }
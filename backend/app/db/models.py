@@ -0,0 +1,167 @@
+import os
+from sqlalchemy import Column, Integer, BigInteger, Boolean, Float, String, Text, DateTime, ForeignKey, DDL, event, inspect
+from sqlalchemy.orm import relationship
+from datetime import datetime
+from . import Base
+
+# Text search configuration of file_chunks.search_vector; "simple" only lowercases,
+# which suits mixed English/Indonesian content
+FTS_CONFIG = os.getenv("FTS_CONFIG", "simple")
+
+class User(Base):
+    __tablename__ = "users"
+
+    id = Column(Integer, primary_key = True, index = True)
+    email = Column(String, unique=True, index = True)
+    hashed_password = Column(String)
+    is_active = Column(Boolean, default=True)
+    created_at = Column(DateTime, default = datetime.now)
+
+    files = relationship("File", back_populates="owner")
+    notebooks = relationship("Notebook", back_populates="owner")
+
+class File(Base):
+    __tablename__ = "files"
+
+    id = Column(Integer, primary_key=True, index=True)
+    filename = Column(String, index = True)
+    file_path = Column(String)
+    file_type = Column(String) 
+    upload_date = Column(DateTime, default=datetime.now)
+    user_id = Column(Integer, ForeignKey("users.id"))
+    # Share of chunks found to be near-duplicates at ingest
+    dedup_ratio = Column(Float, nullable=True)
+    # SHA-256 of the uploaded bytes, the key of the file's extracted-text cache entry
+    content_hash = Column(String(64), nullable=True, index=True)
+    # Set when the file is deleted; its chunks are purged in the background
+    deleted_at = Column(DateTime, nullable=True, index=True)
+
+    owner = relationship("User", back_populates="files")
+    # Chunk rows are removed in bulk by the database, not loaded one by one
+    chunks = relationship("FileChunk", back_populates="file", cascade="all, delete-orphan", passive_deletes=True)
+
+class FileChunk(Base):
+    __tablename__ = "file_chunks"
+
+    id = Column(Integer, primary_key=True, index=True)
+    content = Column(Text)
+    embedding = Column(Text, nullable = True)
+    chunk_index = Column(Integer)
+    file_id = Column(Integer, ForeignKey("files.id", ondelete="CASCADE"), index=True)
+
+    # Lineage for crawled sources: the page a chunk came from and its content hash
+    source_url = Column(String, nullable = True, index = True)
+    source_hash = Column(String, nullable = True)
+
+    # SimHash of the cleaned content, and the chunk this one near-duplicates (not embedded)
+    fingerprint = Column(BigInteger, nullable = True, index = True)
+    duplicate_of_id = Column(Integer, ForeignKey("file_chunks.id"), nullable = True)
+
+    file = relationship("File", back_populates = "chunks")
+
+# Full-text search over chunk content, kept in the database so lexical search
+# needs no in-process index. The column is not mapped: it is only read by
+# FileRepository.search_chunks.
+SEARCH_INDEX_DDL = {
+    "postgresql": [
+        f"ALTER TABLE file_chunks ADD COLUMN IF NOT EXISTS search_vector tsvector "
+        f"GENERATED ALWAYS AS (to_tsvector('{FTS_CONFIG}', coalesce(content, ''))) STORED",
+        "CREATE INDEX IF NOT EXISTS ix_file_chunks_search_vector ON file_chunks USING gin (search_vector)",
+    ],
+    # Stand-in for local development and tests: an external-content FTS5 table kept in sync by triggers
+    "sqlite": [
+        "CREATE VIRTUAL TABLE IF NOT EXISTS file_chunks_fts USING fts5(content, content='file_chunks', content_rowid='id')",
+        "CREATE TRIGGER IF NOT EXISTS file_chunks_fts_insert AFTER INSERT ON file_chunks BEGIN "
+        "INSERT INTO file_chunks_fts(rowid, content) VALUES (new.id, new.content); END",
+        "CREATE TRIGGER IF NOT EXISTS file_chunks_fts_delete AFTER DELETE ON file_chunks BEGIN "
+        "INSERT INTO file_chunks_fts(file_chunks_fts, rowid, content) VALUES ('delete', old.id, old.content); END",
+        "CREATE TRIGGER IF NOT EXISTS file_chunks_fts_update AFTER UPDATE OF content ON file_chunks BEGIN "
+        "INSERT INTO file_chunks_fts(file_chunks_fts, rowid, content) VALUES ('delete', old.id, old.content); "
+        "INSERT INTO file_chunks_fts(rowid, content) VALUES (new.id, new.content); END",
+    ],
+}
+
+for _dialect, _statements in SEARCH_INDEX_DDL.items():
+    for _statement in _statements:
+        event.listen(FileChunk.__table__, "after_create", DDL(_statement).execute_if(dialect=_dialect))
+
+
+def create_search_index(connection):
+    """Add the full-text search column/table to an existing database (idempotent)"""
+    for statement in SEARCH_INDEX_DDL.get(connection.dialect.name, []):
+        connection.exec_driver_sql(statement)
+    if connection.dialect.name == "sqlite":
+        # Index rows that existed before the FTS table
+        connection.exec_driver_sql("INSERT INTO file_chunks_fts(file_chunks_fts) VALUES ('rebuild')")
+
+# Columns added to tables of existing databases, as (table, column, SQL type), with their indexes.
+# create_all() only creates missing tables, so databases from before a column need these ALTERs.
+COLUMN_UPGRADES = [
+    ("files", "dedup_ratio", "FLOAT"),
+    ("files", "content_hash", "VARCHAR(64)"),
+    ("files", "deleted_at", "TIMESTAMP"),
+    ("file_chunks", "source_url", "VARCHAR"),
+    ("file_chunks", "source_hash", "VARCHAR"),
+    ("file_chunks", "fingerprint", "BIGINT"),
+    ("file_chunks", "duplicate_of_id", "INTEGER REFERENCES file_chunks(id)"),
+    ("notebooks", "summary", "TEXT"),
+    ("notebooks", "summary_entry_id", "INTEGER"),
+]
+INDEX_UPGRADES = [
+    "CREATE INDEX IF NOT EXISTS ix_files_content_hash ON files (content_hash)",
+    "CREATE INDEX IF NOT EXISTS ix_files_deleted_at ON files (deleted_at)",
+    "CREATE INDEX IF NOT EXISTS ix_file_chunks_file_id ON file_chunks (file_id)",
+    "CREATE INDEX IF NOT EXISTS ix_file_chunks_source_url ON file_chunks (source_url)",
+    "CREATE INDEX IF NOT EXISTS ix_file_chunks_fingerprint ON file_chunks (fingerprint)",
+    "CREATE INDEX IF NOT EXISTS ix_notebook_entries_notebook_id ON notebook_entries (notebook_id)",
+]
+
+
+def upgrade_schema(connection):
+    """Create missing tables and add columns the models gained since a database was created (idempotent)"""
+    Base.metadata.create_all(connection)
+    existing = inspect(connection)
+    for table, column, column_type in COLUMN_UPGRADES:
+        if column not in {info["name"] for info in existing.get_columns(table)}:
+            connection.exec_driver_sql(f"ALTER TABLE {table} ADD COLUMN {column} {column_type}")
+    for statement in INDEX_UPGRADES:
+        connection.exec_driver_sql(statement)
+    create_search_index(connection)
+
+class CrawledPage(Base):
+    __tablename__ = "crawled_pages"
+
+    id = Column(Integer, primary_key=True, index=True)
+    url = Column(String, index=True)
+    depth = Column(Integer, default=0)
+    etag = Column(String, nullable=True)
+    last_modified = Column(String, nullable=True)
+    content_hash = Column(String, nullable=True)
+    fetched_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
+    file_id = Column(Integer, ForeignKey("files.id", ondelete="CASCADE"), index=True)
+
+class Notebook(Base):
+    __tablename__ = "notebooks"
+
+    id = Column(Integer, primary_key=True, index=True)
+    title = Column(String, index=True)
+    created_at = Column(DateTime, default=datetime.now)
+    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
+    user_id = Column(Integer, ForeignKey("users.id"))
+    # Rolling summary of the conversation up to and including entry summary_entry_id
+    summary = Column(Text, nullable=True)
+    summary_entry_id = Column(Integer, nullable=True)
+
+    owner = relationship("User", back_populates="notebooks")
+    entries = relationship("NotebookEntry", back_populates="notebook", cascade="all, delete-orphan")
+
+class NotebookEntry(Base):
+    __tablename__ = "notebook_entries"
+
+    id = Column(Integer, primary_key = True, index = True)
+    content = Column(Text)
+    entry_type = Column(String) # "text", "query", "response"
+    created_at = Column(DateTime, default=datetime.now)
+    notebook_id = Column(Integer, ForeignKey("notebooks.id"), index=True)
+
+    notebook = relationship("Notebook", back_populates="entries")
\ No newline at end of file
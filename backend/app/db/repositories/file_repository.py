@@ -1,6 +1,11 @@
-from sqlalchemy.orm import Session
-from typing import List, Optional
-from ..models import File, FileChunk
+import json
+from datetime import datetime
+from sqlalchemy import bindparam, func, or_, text
+from sqlalchemy.orm import Session, aliased
+from typing import Dict, List, Optional, Sequence, Tuple
+from ..models import File, FileChunk, CrawledPage, FTS_CONFIG
+from ...services.metrics_service import span
+from ...services.dedup_service import to_signed, to_unsigned
 
 class FileRepository:
     @staticmethod
@@ -13,32 +18,415 @@ class FileRepository:
     
     @staticmethod
     def get_files(db: Session, user_id: int) -> List[File]:
-        return db.query(File).filter(File.user_id == user_id).all()
+        return db.query(File).filter(File.user_id == user_id, File.deleted_at.is_(None)).all()
     
     @staticmethod
     def get_file_by_id(db: Session, file_id: int) -> Optional[File]:
-        return db.query(File).filter(File.id == file_id).first()
+        return db.query(File).filter(File.id == file_id, File.deleted_at.is_(None)).first()
+
+    @staticmethod
+    def get_file_by_path(db: Session, user_id: int, file_path: str, file_type: str) -> Optional[File]:
+        return db.query(File).filter(
+            File.user_id == user_id, File.file_path == file_path, File.file_type == file_type,
+            File.deleted_at.is_(None),
+        ).first()
     
     @staticmethod
     def store_file_chunks(db: Session, file_id: int, contents: List[str]) -> List[FileChunk]:
         chunks = []
-        for idx, content in enumerate(contents):
-            chunk = FileChunk(content=content, chunk_index = idx, file_id=file_id)
-            db.add(chunk)
-            chunks.append(chunk)
+        with span("db.store_file_chunks"):
+            for idx, content in enumerate(contents):
+                chunk = FileChunk(content=content, chunk_index = idx, file_id=file_id)
+                db.add(chunk)
+                chunks.append(chunk)
 
-        db.commit()
+            db.commit()
         for chunk in chunks:
             db.refresh(chunk)
         return chunks
     
     @staticmethod
-    def delete_file(db: Session, file_id: int) -> bool:
-        db_file = db.query(File).filter(File.id == file_id).first()
+    def store_document_chunks(db: Session, file_id: int, documents: list) -> Optional[List[FileChunk]]:
+        """Store processed chunks with their fingerprints and duplicate references"""
+        return FileRepository.append_document_chunks(db, file_id, documents)
+
+    @staticmethod
+    def append_document_chunks(db: Session, file_id: int, documents: list, first_index: int = 0,
+                               chunk_ids: Optional[Dict[int, int]] = None,
+                               vectors: Optional[Sequence[Optional[List[float]]]] = None) -> Optional[List[FileChunk]]:
+        """Store the next batch of a file's chunks, numbered from `first_index`, and commit.
+
+        `chunk_ids` maps chunk_index -> stored id for the file's earlier batches
+        (and is updated), so duplicate references to earlier chunks resolve
+        across batches. Vectors, where given, are stored as the chunk embeddings.
+        Returns None without storing anything once the file has been deleted.
+        """
+        chunk_ids = {} if chunk_ids is None else chunk_ids
+        with span("db.store_file_chunks"):
+            # The row lock orders this batch against mark_file_deleted: either the batch commits
+            # first and purge_file removes it, or it sees the delete and stores nothing
+            live = db.query(File.id).filter(File.id == file_id, File.deleted_at.is_(None)).with_for_update().first()
+            if live is None:
+                db.rollback()
+                return None
+            chunks = []
+            for offset, doc in enumerate(documents):
+                fingerprint = doc.metadata.get("fingerprint")
+                vector = vectors[offset] if vectors is not None else None
+                chunk = FileChunk(
+                    content=doc.page_content,
+                    chunk_index=first_index + offset,
+                    file_id=file_id,
+                    fingerprint=to_signed(fingerprint) if fingerprint is not None else None,
+                    duplicate_of_id=doc.metadata.get("duplicate_of_chunk"),
+                    embedding=json.dumps(vector) if vector is not None else None,
+                )
+                chunks.append(chunk)
+            db.add_all(chunks)
+            db.flush()
+
+            # Duplicates of earlier chunks in this file point at their stored ids
+            for chunk in chunks:
+                chunk_ids[chunk.chunk_index] = chunk.id
+            for chunk, doc in zip(chunks, documents):
+                local_ref = doc.metadata.get("duplicate_of_index")
+                if local_ref is not None:
+                    chunk.duplicate_of_id = chunk_ids[local_ref]
+            db.commit()
+        return chunks
+
+    @staticmethod
+    def replace_document_chunks(db: Session, file_id: int, documents: list,
+                                vectors: Optional[Sequence[Optional[List[float]]]] = None) -> Dict[int, int]:
+        """Swap all chunks of a file in one transaction, returning chunk_index -> new chunk id.
+
+        Chunks of other files that referenced the old chunks as duplicates
+        become canonical again; they were never embedded, so the next index
+        load embeds them.
+        """
+        with span("db.replace_file_chunks"):
+            old_ids = db.query(FileChunk.id).filter(FileChunk.file_id == file_id)
+            db.query(FileChunk).filter(
+                FileChunk.duplicate_of_id.in_(old_ids.scalar_subquery()), FileChunk.file_id != file_id
+            ).update({FileChunk.duplicate_of_id: None}, synchronize_session=False)
+            # Within-file duplicate references go first so no row is deleted while still referenced
+            db.query(FileChunk).filter(FileChunk.file_id == file_id).update(
+                {FileChunk.duplicate_of_id: None}, synchronize_session=False
+            )
+            db.query(FileChunk).filter(FileChunk.file_id == file_id).delete(synchronize_session=False)
+            chunk_ids: Dict[int, int] = {}
+            FileRepository.append_document_chunks(db, file_id, documents, 0, chunk_ids, vectors)
+        return chunk_ids
+
+    @staticmethod
+    def get_user_fingerprints(db: Session, user_id: int,
+                              exclude_file_ids: Optional[Sequence[int]] = None) -> List[Tuple[int, int]]:
+        """(fingerprint, chunk id) of every canonical chunk in a user's corpus"""
+        query = (
+            db.query(FileChunk.fingerprint, FileChunk.id)
+            .join(File, FileChunk.file_id == File.id)
+            .filter(
+                File.user_id == user_id,
+                File.deleted_at.is_(None),
+                FileChunk.fingerprint.isnot(None),
+                FileChunk.duplicate_of_id.is_(None),
+            )
+        )
+        if exclude_file_ids:
+            query = query.filter(FileChunk.file_id.notin_(list(exclude_file_ids)))
+        return [(to_unsigned(fingerprint), chunk_id) for fingerprint, chunk_id in query.all()]
+
+    @staticmethod
+    def set_dedup_ratio(db: Session, file_id: int, ratio: float):
+        db.query(File).filter(File.id == file_id).update({File.dedup_ratio: ratio})
+        db.commit()
+
+    @staticmethod
+    def set_content_hash(db: Session, file_id: int, content_hash: str):
+        db.query(File).filter(File.id == file_id).update({File.content_hash: content_hash})
+        db.commit()
+
+    @staticmethod
+    def get_files_by_type(db: Session, file_type: str, user_id: Optional[int] = None,
+                          file_ids: Optional[Sequence[int]] = None) -> List[File]:
+        """Files of a type, optionally of one user or among given ids, in upload order per user"""
+        query = db.query(File).filter(File.file_type == file_type, File.deleted_at.is_(None))
+        if user_id is not None:
+            query = query.filter(File.user_id == user_id)
+        if file_ids is not None:
+            query = query.filter(File.id.in_(list(file_ids)))
+        return query.order_by(File.user_id, File.id).all()
+
+    @staticmethod
+    def get_user_chunks(db: Session, user_id: int) -> List[Tuple[FileChunk, File]]:
+        """Canonical (non-duplicate) chunks of a user's files, grouped by file in chunk order"""
+        with span("db.get_user_chunks"):
+            return (
+                db.query(FileChunk, File)
+                .join(File, FileChunk.file_id == File.id)
+                .filter(
+                    File.user_id == user_id, File.deleted_at.is_(None), FileChunk.duplicate_of_id.is_(None)
+                )
+                .order_by(FileChunk.file_id, FileChunk.chunk_index)
+                .all()
+            )
+
+    @staticmethod
+    def get_file_chunks(db: Session, file_id: int) -> List[FileChunk]:
+        """Canonical (non-duplicate) chunks of one file in chunk order"""
+        with span("db.get_file_chunks"):
+            return (
+                db.query(FileChunk)
+                .filter(FileChunk.file_id == file_id, FileChunk.duplicate_of_id.is_(None))
+                .order_by(FileChunk.chunk_index)
+                .all()
+            )
+
+    @staticmethod
+    def get_user_duplicate_refs(db: Session, user_id: int) -> List[Tuple[int, str, int]]:
+        """(file_id, file_type, canonical chunk id) of chunks that duplicate another file's chunk"""
+        with span("db.get_user_duplicate_refs"):
+            canonical = aliased(FileChunk)
+            return [
+                tuple(row) for row in
+                db.query(FileChunk.file_id, File.file_type, FileChunk.duplicate_of_id)
+                .join(File, FileChunk.file_id == File.id)
+                .join(canonical, FileChunk.duplicate_of_id == canonical.id)
+                .filter(
+                    File.user_id == user_id, File.deleted_at.is_(None), canonical.file_id != FileChunk.file_id
+                )
+                .all()
+            ]
+
+    @staticmethod
+    def store_chunk_embeddings(db: Session, embeddings: Dict[int, List[float]]):
+        """Persist embeddings (JSON in file_chunks.embedding) so indexes can be reloaded without re-embedding"""
+        if not embeddings:
+            return
+        with span("db.store_chunk_embeddings"):
+            db.bulk_update_mappings(FileChunk, [
+                {"id": chunk_id, "embedding": json.dumps(vector)} for chunk_id, vector in embeddings.items()
+            ])
+            db.commit()
+
+    @staticmethod
+    def search_chunks(db: Session, terms: Sequence[str], user_id: Optional[int] = None,
+                      file_ids: Optional[Sequence[int]] = None, file_types: Optional[Sequence[str]] = None,
+                      k: int = 5) -> list:
+        """Top-k chunks matching any of the terms, ranked by the database's full-text search.
+
+        Rows carry id, file_id, chunk_index, content, filename and score (higher is better).
+        Uses the search_vector GIN index on Postgres and the file_chunks_fts table on SQLite.
+        A file or file type filter also matches canonical chunks of other files
+        that the filtered files' near-duplicate chunks reference. Each term is
+        quoted, so query operators in it are matched as text.
+        """
+        terms = [term for term in terms if term.strip()]
+        if not terms:
+            return []
+        dialect = db.get_bind().dialect.name
+        filters = ["c.duplicate_of_id IS NULL", "f.deleted_at IS NULL"]
+        params = {"k": k}
+        if user_id is not None:
+            filters.append("f.user_id = :user_id")
+            params["user_id"] = user_id
+        if file_ids is not None:
+            if not file_ids:
+                return []
+            filters.append(
+                "(c.file_id IN :file_ids OR EXISTS (SELECT 1 FROM file_chunks d JOIN files df ON df.id = d.file_id "
+                "WHERE d.duplicate_of_id = c.id AND d.file_id IN :file_ids AND df.deleted_at IS NULL))"
+            )
+            params["file_ids"] = list(file_ids)
+        if file_types is not None:
+            if not file_types:
+                return []
+            filters.append(
+                "(f.file_type IN :file_types OR EXISTS (SELECT 1 FROM file_chunks d JOIN files df ON df.id = d.file_id "
+                "WHERE d.duplicate_of_id = c.id AND df.file_type IN :file_types AND df.deleted_at IS NULL))"
+            )
+            params["file_types"] = list(file_types)
+
+        if dialect == "postgresql":
+            sql = f"""
+                SELECT c.id, c.file_id, c.chunk_index, c.content, f.filename,
+                       ts_rank_cd(c.search_vector, q) AS score
+                FROM file_chunks c JOIN files f ON f.id = c.file_id,
+                     to_tsquery(CAST(:config AS regconfig), :query) q
+                WHERE c.search_vector @@ q AND {" AND ".join(filters)}
+                ORDER BY score DESC
+                LIMIT :k
+            """
+            quoted = ("'" + term.replace("\\", "\\\\").replace("'", "''") + "'" for term in terms)
+            params.update(config=FTS_CONFIG, query=" | ".join(quoted))
+        elif dialect == "sqlite":
+            # bm25() is lower-is-better, so it is negated into a score
+            sql = f"""
+                SELECT c.id, c.file_id, c.chunk_index, c.content, f.filename,
+                       -bm25(file_chunks_fts) AS score
+                FROM file_chunks_fts
+                JOIN file_chunks c ON c.id = file_chunks_fts.rowid
+                JOIN files f ON f.id = c.file_id
+                WHERE file_chunks_fts MATCH :query AND {" AND ".join(filters)}
+                ORDER BY score DESC
+                LIMIT :k
+            """
+            params["query"] = " OR ".join('"' + term.replace('"', '""') + '"' for term in terms)
+        else:
+            raise ValueError(f"Full-text search is not supported on {dialect}")
+
+        statement = text(sql)
+        for name in ("file_ids", "file_types"):
+            if name in params:
+                statement = statement.bindparams(bindparam(name, expanding=True))
+        with span("db.search_chunks", dialect=dialect):
+            return db.execute(statement, params).all()
+
+    @staticmethod
+    def get_crawled_pages(db: Session, file_id: int) -> Dict[str, CrawledPage]:
+        pages = db.query(CrawledPage).filter(CrawledPage.file_id == file_id).all()
+        return {page.url: page for page in pages}
+
+    @staticmethod
+    def upsert_crawled_page(db: Session, file_id: int, url: str, depth: int, etag: Optional[str],
+                            last_modified: Optional[str], content_hash: Optional[str]) -> CrawledPage:
+        page = db.query(CrawledPage).filter(CrawledPage.file_id == file_id, CrawledPage.url == url).first()
+        if page is None:
+            page = CrawledPage(file_id=file_id, url=url)
+            db.add(page)
+        page.depth = depth
+        page.etag = etag
+        page.last_modified = last_modified
+        page.content_hash = content_hash
+        db.commit()
+        return page
+
+    @staticmethod
+    def replace_page_chunks(db: Session, file_id: int, source_url: str, source_hash: str,
+                            contents: List[str]) -> List[FileChunk]:
+        """Swap the chunks of one crawled page, leaving the rest of the file untouched.
+
+        New chunks are numbered after the file's last chunk, so chunk_index
+        stays unique within the file; renumber_chunks closes the gaps.
+        """
+        with span("db.replace_page_chunks"):
+            db.query(FileChunk).filter(
+                FileChunk.file_id == file_id, FileChunk.source_url == source_url
+            ).delete(synchronize_session=False)
+            last_index = db.query(func.max(FileChunk.chunk_index)).filter(FileChunk.file_id == file_id).scalar()
+            first_index = 0 if last_index is None else last_index + 1
+            chunks = [
+                FileChunk(content=content, chunk_index=first_index + idx, file_id=file_id,
+                          source_url=source_url, source_hash=source_hash)
+                for idx, content in enumerate(contents)
+            ]
+            db.add_all(chunks)
+            db.commit()
+        return chunks
+
+    @staticmethod
+    def remove_stale_pages(db: Session, file_id: int, live_urls: Sequence[str]) -> int:
+        """Delete a crawled file's chunks and page records that are not from `live_urls`.
+
+        Covers pages that failed or disappeared since the last crawl, and
+        chunks without a source page (from ingesting the URL before it was
+        crawled). Chunks of other files that referenced them as duplicates
+        become canonical again. Returns the number of chunks deleted.
+        """
+        with span("db.remove_stale_pages"):
+            live_urls = list(live_urls)
+            stale_ids = db.query(FileChunk.id).filter(
+                FileChunk.file_id == file_id,
+                or_(FileChunk.source_url.is_(None), FileChunk.source_url.notin_(live_urls)),
+            )
+            db.query(FileChunk).filter(
+                FileChunk.duplicate_of_id.in_(stale_ids.scalar_subquery())
+            ).update({FileChunk.duplicate_of_id: None}, synchronize_session=False)
+            deleted = db.query(FileChunk).filter(
+                FileChunk.file_id == file_id,
+                or_(FileChunk.source_url.is_(None), FileChunk.source_url.notin_(live_urls)),
+            ).delete(synchronize_session=False)
+            db.query(CrawledPage).filter(
+                CrawledPage.file_id == file_id, CrawledPage.url.notin_(live_urls)
+            ).delete(synchronize_session=False)
+            db.commit()
+        return deleted
+
+    @staticmethod
+    def renumber_chunks(db: Session, file_id: int):
+        """Number a file's chunks 0..n-1 in their current order"""
+        with span("db.renumber_chunks"):
+            rows = (
+                db.query(FileChunk.id, FileChunk.chunk_index)
+                .filter(FileChunk.file_id == file_id)
+                .order_by(FileChunk.chunk_index, FileChunk.id)
+                .all()
+            )
+            updates = [
+                {"id": chunk_id, "chunk_index": idx}
+                for idx, (chunk_id, chunk_index) in enumerate(rows) if chunk_index != idx
+            ]
+            if updates:
+                db.bulk_update_mappings(FileChunk, updates)
+            db.commit()
+
+    @staticmethod
+    def mark_file_deleted(db: Session, file_id: int) -> Optional[File]:
+        """Hide a file from every query at once (a single-row update); purge_file removes its rows later.
+
+        Once this commits, an ingest still streaming the file stores no more
+        batches (see append_document_chunks).
+        """
+        db_file = db.query(File).filter(File.id == file_id, File.deleted_at.is_(None)).with_for_update().first()
         if db_file:
-            db.delete(db_file)
+            db_file.deleted_at = datetime.now()
             db.commit()
-            return True
-        return False
+        return db_file
 
+    @staticmethod
+    def purge_file(db: Session, file_id: int, batch_size: int = 1000) -> List[int]:
+        """Delete a file with its chunks and crawled pages, committing chunk deletes in batches.
 
+        Chunks of other files that referenced this file's chunks as duplicates
+        become canonical again; their ids are returned so they can be embedded
+        and indexed.
+        """
+        with span("db.purge_file"):
+            file_chunk_ids = db.query(FileChunk.id).filter(FileChunk.file_id == file_id)
+            promoted = [
+                chunk_id for (chunk_id,) in db.query(FileChunk.id).filter(
+                    FileChunk.duplicate_of_id.in_(file_chunk_ids.scalar_subquery()), FileChunk.file_id != file_id
+                ).all()
+            ]
+            if promoted:
+                db.query(FileChunk).filter(FileChunk.id.in_(promoted)).update(
+                    {FileChunk.duplicate_of_id: None}, synchronize_session=False
+                )
+            db.query(FileChunk).filter(FileChunk.file_id == file_id).update(
+                {FileChunk.duplicate_of_id: None}, synchronize_session=False
+            )
+            db.commit()
+            # Short transactions keep a large file from holding locks for the whole delete
+            while True:
+                batch = [chunk_id for (chunk_id,) in file_chunk_ids.limit(batch_size).all()]
+                if not batch:
+                    break
+                db.query(FileChunk).filter(FileChunk.id.in_(batch)).delete(synchronize_session=False)
+                db.commit()
+            db.query(CrawledPage).filter(CrawledPage.file_id == file_id).delete(synchronize_session=False)
+            db.query(File).filter(File.id == file_id).delete(synchronize_session=False)
+            db.commit()
+        return promoted
+
+    @staticmethod
+    def get_chunks_with_files(db: Session, chunk_ids: Sequence[int]) -> List[Tuple[FileChunk, File]]:
+        """Chunks by id with their files, grouped by file in chunk order"""
+        if not chunk_ids:
+            return []
+        return (
+            db.query(FileChunk, File)
+            .join(File, FileChunk.file_id == File.id)
+            .filter(FileChunk.id.in_(list(chunk_ids)), File.deleted_at.is_(None))
+            .order_by(File.id, FileChunk.chunk_index)
+            .all()
+        )
@@ -0,0 +1,79 @@
+from sqlalchemy.orm import Session
+from typing import List, Optional
+from ..models import Notebook, NotebookEntry
+
+class NotebookRepository:
+    @staticmethod
+    def create_notebook(db: Session, title: str, user_id: int) -> Notebook:
+        notebook = Notebook(title=title, user_id=user_id)
+        db.add(notebook)
+        db.commit()
+        db.refresh(notebook)
+        return notebook
+
+    @staticmethod
+    def get_notebooks(db: Session, user_id: int) -> List[Notebook]:
+        return db.query(Notebook).filter(Notebook.user_id == user_id).order_by(Notebook.updated_at.desc()).all()
+
+    @staticmethod
+    def get_notebook(db: Session, notebook_id: int) -> Optional[Notebook]:
+        return db.query(Notebook).filter(Notebook.id == notebook_id).first()
+
+    @staticmethod
+    def delete_notebook(db: Session, notebook_id: int) -> bool:
+        notebook = db.query(Notebook).filter(Notebook.id == notebook_id).first()
+        if notebook:
+            db.delete(notebook)
+            db.commit()
+            return True
+        return False
+
+    @staticmethod
+    def add_entry(db: Session, notebook_id: int, content: str, entry_type: str) -> NotebookEntry:
+        entry = NotebookEntry(content=content, entry_type=entry_type, notebook_id=notebook_id)
+        db.add(entry)
+        db.commit()
+        db.refresh(entry)
+        return entry
+
+    @staticmethod
+    def get_entries(db: Session, notebook_id: int, after_id: Optional[int] = None,
+                    before_id: Optional[int] = None, limit: Optional[int] = None) -> List[NotebookEntry]:
+        """Entries of a notebook in order, optionally only those between two entry ids (exclusive)"""
+        query = db.query(NotebookEntry).filter(NotebookEntry.notebook_id == notebook_id)
+        if after_id is not None:
+            query = query.filter(NotebookEntry.id > after_id)
+        if before_id is not None:
+            query = query.filter(NotebookEntry.id < before_id)
+        query = query.order_by(NotebookEntry.id)
+        if limit is not None:
+            query = query.limit(limit)
+        return query.all()
+
+    @staticmethod
+    def count_entries(db: Session, notebook_id: int, after_id: Optional[int] = None,
+                      before_id: Optional[int] = None) -> int:
+        query = db.query(NotebookEntry).filter(NotebookEntry.notebook_id == notebook_id)
+        if after_id is not None:
+            query = query.filter(NotebookEntry.id > after_id)
+        if before_id is not None:
+            query = query.filter(NotebookEntry.id < before_id)
+        return query.count()
+
+    @staticmethod
+    def get_recent_entries(db: Session, notebook_id: int, limit: int, after_id: Optional[int] = None,
+                           before_id: Optional[int] = None) -> List[NotebookEntry]:
+        """The newest `limit` entries, newest first, optionally only those between two entry ids (exclusive)"""
+        query = db.query(NotebookEntry).filter(NotebookEntry.notebook_id == notebook_id)
+        if after_id is not None:
+            query = query.filter(NotebookEntry.id > after_id)
+        if before_id is not None:
+            query = query.filter(NotebookEntry.id < before_id)
+        return query.order_by(NotebookEntry.id.desc()).limit(limit).all()
+
+    @staticmethod
+    def set_summary(db: Session, notebook_id: int, summary: str, summary_entry_id: int):
+        db.query(Notebook).filter(Notebook.id == notebook_id).update(
+            {Notebook.summary: summary, Notebook.summary_entry_id: summary_entry_id}
+        )
+        db.commit()
@@ -0,0 +1,212 @@
+import os
+import re
+import unicodedata
+from functools import lru_cache
+from typing import Callable, Dict, FrozenSet, Iterable, List, Optional
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Lexical analysis settings
+BM25_ANALYZER = os.getenv("BM25_ANALYZER", "multilingual")
+TERM_CACHE_SIZE = int(os.getenv("TERM_CACHE_SIZE", "100000"))
+
+# Letters and digits; underscores and punctuation separate tokens
+TOKEN_PATTERN = re.compile(r"[^\W_]+", re.UNICODE)
+
+STOPWORDS: Dict[str, FrozenSet[str]] = {
+    "en": frozenset("""
+        a about above after again against all am an and any are as at be because been before being below
+        between both but by can could did do does doing down during each few for from further had has have
+        having he her here hers herself him himself his how i if in into is it its itself just me more most
+        my myself no nor not now of off on once only or other our ours ourselves out over own same she
+        should so some such than that the their theirs them themselves then there these they this those
+        through to too under until up very was we were what when where which while who whom why will with
+        would you your yours yourself yourselves
+    """.split()),
+    "id": frozenset("""
+        ada adalah agar akan aku anda antara apa apabila atau bagaimana bagi bahwa banyak belum beberapa
+        begitu berapa bisa boleh bukan dalam dan dapat dari daripada demikian dengan di dia harus hanya
+        hingga ia ini itu jadi jika juga kalau kami kamu karena ke kemudian kepada ketika kita lagi lain
+        lebih maka masih mereka misalnya mungkin namun oleh pada para pun saat saja sama sampai sangat
+        saya se sebagai sebelum sedang sehingga sejak selain semua seperti serta setelah sudah supaya
+        tapi telah tentang tersebut tetapi tidak untuk yaitu yakni yang
+    """.split()),
+}
+
+
+def stem_english(term: str) -> str:
+    """Light suffix stripping (plural S-stemmer plus -ing/-ed/-ly)"""
+    if len(term) <= 3 or not term.isalpha():
+        return term
+    if term.endswith("ies") and not term.endswith(("eies", "aies")):
+        return term[:-3] + "y"
+    if term.endswith("es") and not term.endswith(("aes", "ees", "oes")) and term[-3] in "sxz":
+        return term[:-2]
+    if term.endswith("s") and not term.endswith(("us", "ss")):
+        term = term[:-1]
+    for suffix in ("ing", "ed", "ly"):
+        if term.endswith(suffix) and len(term) - len(suffix) >= 4:
+            term = term[:-len(suffix)]
+            # running -> run, stopped -> stop
+            if suffix != "ly" and term[-1] == term[-2] and term[-1] not in "aeioulsz":
+                term = term[:-1]
+            return term
+    return term
+
+
+_ID_PARTICLES = ("kah", "lah", "tah", "pun")
+_ID_POSSESSIVES = ("nya", "ku", "mu")
+_ID_VOWELS = "aeiou"
+# (prefix, letters the stem may start with after it, letter restored to the stem). The nasal of
+# meN-/peN- assimilates to the stem: menulis <- tulis, memukul <- pukul, menyapu <- sapu, mengambil <- ambil
+_ID_FIRST_PREFIXES = (
+    ("meny", _ID_VOWELS, "s"), ("peny", _ID_VOWELS, "s"),
+    ("meng", _ID_VOWELS + "ghk", ""), ("peng", _ID_VOWELS + "ghk", ""),
+    ("mem", "bfpv", ""), ("pem", "bfv", ""),
+    ("mem", _ID_VOWELS, "p"), ("pem", _ID_VOWELS, "p"),
+    ("men", "cdjsz", ""), ("pen", "cdjz", ""),
+    ("men", _ID_VOWELS, "t"), ("pen", _ID_VOWELS, "t"),
+    ("me", "lmnrwy", ""),
+    ("di", None, ""), ("ter", None, ""), ("ke", None, ""),
+)
+# be-/pe- only where ber-/per- lost their r: bekerja, peserta, pelajar
+_ID_SECOND_PREFIXES = (
+    ("ber", None), ("per", None), ("be", re.compile(r"[^aeiou]er")), ("pe", re.compile(r"[lrwy]|[^aeiou]er")),
+)
+_ID_SUFFIXES = ("kan", "an", "i")
+
+
+def stem_indonesian(term: str) -> str:
+    """Rule-based Indonesian stemmer after Tala (2003), with the meN-/peN- allomorphs of Asian et al. (2005)"""
+    if len(term) <= 4 or not term.isalpha():
+        return term
+
+    def strip_suffix(word: str, suffixes, min_stem: int = 3) -> str:
+        for suffix in suffixes:
+            if word.endswith(suffix) and len(word) - len(suffix) >= min_stem:
+                return word[:-len(suffix)]
+        return word
+
+    def strip_second_prefix(word: str) -> Optional[str]:
+        # Only the longest matching prefix is tried, and it must leave four letters, so roots
+        # like bersih and perang stay whole
+        for prefix, follows in _ID_SECOND_PREFIXES:
+            if word.startswith(prefix):
+                rest = word[len(prefix):]
+                if len(rest) >= 4 and (follows is None or follows.match(rest)):
+                    return rest
+                return None
+        return None
+
+    term = strip_suffix(term, _ID_PARTICLES)
+    term = strip_suffix(term, _ID_POSSESSIVES)
+
+    stripped = None
+    for prefix, follows, replacement in _ID_FIRST_PREFIXES:
+        rest = term[len(prefix):]
+        if term.startswith(prefix) and len(rest) >= 3 and (follows is None or rest[0] in follows):
+            stripped = replacement + rest
+            break
+    if stripped is not None:
+        term = strip_suffix(stripped, _ID_SUFFIXES, min_stem=4)
+        return strip_second_prefix(term) or term
+
+    stripped = strip_second_prefix(term)
+    if stripped is not None:
+        return strip_suffix(stripped, _ID_SUFFIXES, min_stem=4)
+    return term
+
+
+STEMMERS: Dict[str, Callable[[str], str]] = {
+    "en": stem_english,
+    "id": stem_indonesian,
+}
+
+
+class Analyzer:
+    """Tokenizer and term normalization shared by lexical indexing and queries.
+
+    Text is NFKC-normalized (non-ASCII only), case-folded and split on a
+    Unicode-aware regex. Each distinct term then goes through stopword removal
+    and the stemmers of the configured languages once; the result is memoized
+    so repeated terms cost a single dict lookup.
+    """
+    def __init__(self, languages: Iterable[str] = ("en",), stopwords: bool = True, stem: bool = False,
+                 min_length: int = 1, cache_size: int = TERM_CACHE_SIZE):
+        self.languages = tuple(languages)
+        self.stopwords = frozenset().union(*(STOPWORDS[lang] for lang in self.languages)) if stopwords else frozenset()
+        self.stemmers = [STEMMERS[lang] for lang in self.languages] if stem else []
+        self.min_length = min_length
+        self.normalize = lru_cache(maxsize=cache_size)(self._normalize)
+        self._passthrough = not self.stopwords and not self.stemmers and min_length <= 1
+
+    def _normalize(self, term: str) -> Optional[str]:
+        if len(term) < self.min_length or term in self.stopwords:
+            return None
+        for stemmer in self.stemmers:
+            term = stemmer(term)
+        return term
+
+    def tokenize(self, text: str) -> List[str]:
+        if not text.isascii():
+            text = unicodedata.normalize("NFKC", text)
+        return TOKEN_PATTERN.findall(text.casefold())
+
+    def __call__(self, text: str) -> List[str]:
+        tokens = self.tokenize(text)
+        if self._passthrough:
+            return tokens
+        normalize = self.normalize
+        return [term for term in map(normalize, tokens) if term is not None]
+
+    def cache_info(self):
+        return self.normalize.cache_info()
+
+
+# name -> factory building an analyzer
+_ANALYZERS: Dict[str, Callable[[], Analyzer]] = {}
+_instances: Dict[str, Analyzer] = {}
+
+
+def register_analyzer(name: str):
+    """Register an analyzer factory under a name usable in BM25_ANALYZER"""
+    def decorator(func: Callable[[], Analyzer]):
+        _ANALYZERS[name] = func
+        _instances.pop(name, None)
+        return func
+    return decorator
+
+
+def get_analyzer(name: Optional[str] = None) -> Analyzer:
+    """Shared analyzer instance, so index and query tokenization use one term cache"""
+    name = name or BM25_ANALYZER
+    if name not in _instances:
+        try:
+            factory = _ANALYZERS[name]
+        except KeyError:
+            raise ValueError(f"No analyzer registered with name: {name}")
+        _instances[name] = factory()
+    return _instances[name]
+
+
+@register_analyzer("multilingual")
+def multilingual_analyzer() -> Analyzer:
+    # Stemming is off because English and Indonesian rules conflict on mixed corpora
+    return Analyzer(languages=("en", "id"), stopwords=True, stem=False)
+
+
+@register_analyzer("english")
+def english_analyzer() -> Analyzer:
+    return Analyzer(languages=("en",), stopwords=True, stem=True)
+
+
+@register_analyzer("indonesian")
+def indonesian_analyzer() -> Analyzer:
+    return Analyzer(languages=("id",), stopwords=True, stem=True)
+
+
+@register_analyzer("simple")
+def simple_analyzer() -> Analyzer:
+    return Analyzer(languages=(), stopwords=False, stem=False)
@@ -0,0 +1,203 @@
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional, Tuple
+from dotenv import load_dotenv
+
+from .metrics_service import registry, span
+
+# Load environment variables
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Browser pool settings
+BROWSER = os.getenv("BROWSER_POOL_BROWSER", "chrome")
+POOL_SIZE = int(os.getenv("BROWSER_POOL_SIZE", "2"))
+PAGE_LOAD_TIMEOUT_SECONDS = float(os.getenv("BROWSER_PAGE_LOAD_TIMEOUT_SECONDS", "30"))
+ACQUIRE_TIMEOUT_SECONDS = float(os.getenv("BROWSER_ACQUIRE_TIMEOUT_SECONDS", "120"))
+MAX_PAGES_PER_SESSION = int(os.getenv("BROWSER_MAX_PAGES_PER_SESSION", "50"))
+MAX_SESSION_MEMORY_MB = float(os.getenv("BROWSER_MAX_SESSION_MEMORY_MB", "1024"))
+
+browser_sessions_started = registry.counter(
+    "deepnote_browser_sessions_started_total", "Headless browser sessions launched"
+)
+browser_sessions_recycled = registry.counter(
+    "deepnote_browser_sessions_recycled_total", "Headless browser sessions recycled by reason"
+)
+browser_pages_rendered = registry.counter(
+    "deepnote_browser_pages_rendered_total", "Pages rendered through the browser pool"
+)
+
+
+class BrowserSession:
+    """A long-lived browser and its usage counters"""
+    def __init__(self, driver):
+        self.driver = driver
+        self.pages_served = 0
+        self.created_at = time.monotonic()
+
+    def is_healthy(self) -> bool:
+        try:
+            return self.driver.execute_script("return 1") == 1
+        except Exception:
+            return False
+
+    def memory_mb(self) -> float:
+        """Resident memory of the driver process and the browser processes it spawned"""
+        try:
+            import psutil
+
+            process = psutil.Process(self.driver.service.process.pid)
+            rss = process.memory_info().rss
+            for child in process.children(recursive=True):
+                rss += child.memory_info().rss
+            return rss / (1024 * 1024)
+        except Exception:
+            return 0.0
+
+    def quit(self):
+        try:
+            self.driver.quit()
+        except Exception as e:
+            logger.warning(f"Error closing browser session: {str(e)}")
+
+
+class BrowserPool:
+    """Pool of headless browser sessions shared by all URL ingestion.
+
+    Sessions are started lazily up to `size`, health-checked before being lent
+    out, and recycled after `max_pages` pages or once their process tree grows
+    past `max_memory_mb`.
+    """
+    def __init__(self, size: int = POOL_SIZE, browser: str = BROWSER,
+                 page_load_timeout: float = PAGE_LOAD_TIMEOUT_SECONDS,
+                 max_pages: int = MAX_PAGES_PER_SESSION, max_memory_mb: float = MAX_SESSION_MEMORY_MB):
+        self.size = size
+        self.browser = browser
+        self.page_load_timeout = page_load_timeout
+        self.max_pages = max_pages
+        self.max_memory_mb = max_memory_mb
+        self._idle: "queue.LifoQueue[BrowserSession]" = queue.LifoQueue()
+        self._started = 0
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def _create_session(self) -> BrowserSession:
+        from selenium import webdriver
+
+        with span("browser.start", browser=self.browser):
+            if self.browser == "firefox":
+                options = webdriver.FirefoxOptions()
+                options.add_argument("--headless")
+                driver = webdriver.Firefox(options=options)
+            else:
+                options = webdriver.ChromeOptions()
+                for argument in ("--headless=new", "--no-sandbox", "--disable-dev-shm-usage", "--disable-gpu"):
+                    options.add_argument(argument)
+                driver = webdriver.Chrome(options=options)
+            driver.set_page_load_timeout(self.page_load_timeout)
+        browser_sessions_started.inc(browser=self.browser)
+        return BrowserSession(driver)
+
+    def _discard(self, session: BrowserSession, reason: str):
+        session.quit()
+        browser_sessions_recycled.inc(reason=reason)
+        with self._lock:
+            self._started -= 1
+
+    def _checkout(self, timeout: float) -> BrowserSession:
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                session = self._idle.get_nowait()
+            except queue.Empty:
+                with self._lock:
+                    can_start = self._started < self.size
+                    if can_start:
+                        self._started += 1
+                if can_start:
+                    try:
+                        return self._create_session()
+                    except Exception:
+                        with self._lock:
+                            self._started -= 1
+                        raise
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError("Timed out waiting for a browser session")
+                try:
+                    session = self._idle.get(timeout=remaining)
+                except queue.Empty:
+                    raise TimeoutError("Timed out waiting for a browser session")
+
+            if session.is_healthy():
+                return session
+            logger.warning("Discarding unhealthy browser session")
+            self._discard(session, "unhealthy")
+
+    def _checkin(self, session: BrowserSession, failed: bool):
+        session.pages_served += 1
+        if self._closed:
+            self._discard(session, "closed")
+        elif failed and not session.is_healthy():
+            self._discard(session, "unhealthy")
+        elif session.pages_served >= self.max_pages:
+            self._discard(session, "max_pages")
+        elif self.max_memory_mb and session.memory_mb() > self.max_memory_mb:
+            self._discard(session, "memory")
+        else:
+            self._idle.put(session)
+
+    @contextmanager
+    def session(self, timeout: float = ACQUIRE_TIMEOUT_SECONDS):
+        """Borrow a browser driver for the duration of the block"""
+        if self._closed:
+            raise RuntimeError("Browser pool is closed")
+        session = self._checkout(timeout)
+        failed = False
+        try:
+            yield session.driver
+        except Exception:
+            failed = True
+            raise
+        finally:
+            self._checkin(session, failed)
+
+    def render(self, url: str) -> Tuple[str, str]:
+        """Load a page and return (title, rendered HTML)"""
+        with self.session() as driver:
+            with span("browser.render", browser=self.browser):
+                driver.get(url)
+                title, html = driver.title, driver.page_source
+        browser_pages_rendered.inc(browser=self.browser)
+        return title, html
+
+    def close(self):
+        """Quit all idle sessions; sessions in use are closed when returned"""
+        self._closed = True
+        while True:
+            try:
+                session = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(session, "closed")
+
+
+_pool: Optional[BrowserPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_browser_pool() -> BrowserPool:
+    """Process-wide browser pool, created on first use"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = BrowserPool()
+                atexit.register(_pool.close)
+    return _pool
@@ -0,0 +1,209 @@
+import mmap
+import os
+from array import array
+from bisect import bisect_right
+from typing import Callable, Dict, Iterator, List, Optional
+
+from langchain_core.documents import Document
+
+
+class ChunkView:
+    """Lightweight reference to one chunk of a ChunkStore"""
+    __slots__ = ("store", "index")
+
+    def __init__(self, store: "ChunkStore", index: int):
+        self.store = store
+        self.index = index
+
+    @property
+    def start(self) -> int:
+        return self.store.starts[self.index]
+
+    @property
+    def end(self) -> int:
+        return self.store.ends[self.index]
+
+    @property
+    def page(self) -> int:
+        return self.store.page_numbers[self.store.chunk_pages[self.index]]
+
+    @property
+    def start_index(self) -> int:
+        """Offset of the chunk within its page, as LangChain's add_start_index reports it"""
+        return self.start - self.store.page_starts[self.store.chunk_pages[self.index]]
+
+    @property
+    def text(self) -> str:
+        return self.store.chunk_text(self.index)
+
+    @property
+    def metadata(self) -> Dict:
+        return {**self.store.metadata, "page": self.page, "start_index": self.start_index}
+
+    def to_document(self) -> Document:
+        return Document(page_content=self.text, metadata=self.metadata)
+
+    def __repr__(self):
+        return f"ChunkView(index={self.index}, page={self.page}, start={self.start}, end={self.end})"
+
+
+class ChunkStore:
+    """Compact chunk storage for one file.
+
+    All page text lives once in a single text arena and chunks are (start, end,
+    page) offsets into it held in typed arrays, so overlapping chunks share
+    their text instead of copying it. Chunks are exposed as slotted ChunkView
+    objects and only become LangChain Documents at the retriever boundary.
+
+    An optional `transform` (e.g. DocumentProcessor.clean_text) is applied when
+    chunk text is read rather than stored, keeping the arena untouched.
+    """
+    def __init__(self, metadata: Optional[Dict] = None, transform: Optional[Callable[[str], str]] = None):
+        self.metadata = metadata or {}
+        self.transform = transform
+        self._parts: List[str] = []
+        self._length = 0
+        self._text: Optional[str] = None
+        self._buffer = None
+        # Page table: arena offset and page number of every page
+        self.page_starts = array("q")
+        self.page_numbers = array("i")
+        # Chunk table: arena offsets and page table index of every chunk
+        self.starts = array("q")
+        self.ends = array("q")
+        self.chunk_pages = array("i")
+        # UTF-8 byte offsets of every chunk in a memory-mapped arena; the tables above stay in characters
+        self._byte_starts = array("q")
+        self._byte_ends = array("q")
+
+    def add_page(self, text: str, page: int = 0) -> int:
+        """Append page text to the arena and return its page table index"""
+        if self._text is not None or self._buffer is not None:
+            raise RuntimeError("Cannot add pages to a frozen chunk store")
+        self.page_starts.append(self._length)
+        self.page_numbers.append(page)
+        self._parts.append(text)
+        self._length += len(text)
+        return len(self.page_starts) - 1
+
+    def add_chunk(self, page_index: int, start: int, end: int):
+        """Record a chunk by its offsets within a page"""
+        base = self.page_starts[page_index]
+        self.starts.append(base + start)
+        self.ends.append(base + end)
+        self.chunk_pages.append(page_index)
+
+    def freeze(self) -> "ChunkStore":
+        """Join the arena into one string; called automatically on first read"""
+        if self._text is None and self._buffer is None:
+            self._text = "".join(self._parts)
+            self._parts = []
+        return self
+
+    @property
+    def text(self) -> str:
+        if self._buffer is not None:
+            return bytes(self._buffer).decode("utf-8")
+        self.freeze()
+        return self._text
+
+    def raw_chunk_text(self, index: int) -> str:
+        if self._buffer is not None:
+            # Memory-mapped arenas are sliced by byte offsets
+            return self._buffer[self._byte_starts[index]:self._byte_ends[index]].decode("utf-8")
+        self.freeze()
+        return self._text[self.starts[index]:self.ends[index]]
+
+    def chunk_text(self, index: int) -> str:
+        text = self.raw_chunk_text(index)
+        return self.transform(text) if self.transform else text
+
+    def page_of_offset(self, offset: int) -> int:
+        return self.page_numbers[bisect_right(self.page_starts, offset) - 1]
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def __getitem__(self, index: int) -> ChunkView:
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("chunk index out of range")
+        return ChunkView(self, index)
+
+    def __iter__(self) -> Iterator[ChunkView]:
+        for index in range(len(self)):
+            yield ChunkView(self, index)
+
+    def texts(self) -> List[str]:
+        return [self.chunk_text(index) for index in range(len(self))]
+
+    def to_documents(self) -> List[Document]:
+        """Materialize LangChain Documents, e.g. to hand chunks to a LangChain retriever"""
+        return [view.to_document() for view in self]
+
+    def nbytes(self) -> int:
+        """Approximate memory held by the arena and offset tables"""
+        arena = len(self._buffer) if self._buffer is not None else (self._length if self._text is None else len(self._text))
+        tables = (self.page_starts, self.page_numbers, self.starts, self.ends, self.chunk_pages,
+                  self._byte_starts, self._byte_ends)
+        return arena + sum(len(table) * table.itemsize for table in tables)
+
+    def save(self, path: str):
+        """Write the arena as UTF-8 (`path`.txt) and offset tables (`path`.idx).
+
+        The index holds UTF-8 byte offsets, to slice the memory-mapped arena,
+        followed by the character offsets, so a loaded store reports the same
+        offsets and start_index as the one that was saved.
+        """
+        text = self.text
+        # Convert character offsets to UTF-8 byte offsets in one pass over the boundaries
+        boundaries = sorted(set(self.page_starts) | set(self.starts) | set(self.ends) | {len(text)})
+        byte_offsets = {}
+        position = 0
+        previous = 0
+        for boundary in boundaries:
+            position += len(text[previous:boundary].encode("utf-8"))
+            byte_offsets[boundary] = position
+            previous = boundary
+
+        with open(path + ".txt", "wb") as f:
+            f.write(text.encode("utf-8"))
+        with open(path + ".idx", "wb") as f:
+            header = array("q", [len(self.page_starts), len(self.starts)])
+            header.tofile(f)
+            array("q", (byte_offsets[offset] for offset in self.page_starts)).tofile(f)
+            self.page_numbers.tofile(f)
+            array("q", (byte_offsets[offset] for offset in self.starts)).tofile(f)
+            array("q", (byte_offsets[offset] for offset in self.ends)).tofile(f)
+            self.chunk_pages.tofile(f)
+            self.page_starts.tofile(f)
+            self.starts.tofile(f)
+            self.ends.tofile(f)
+
+    @classmethod
+    def load(cls, path: str, metadata: Optional[Dict] = None,
+             transform: Optional[Callable[[str], str]] = None) -> "ChunkStore":
+        """Open a saved store with its arena memory-mapped instead of loaded"""
+        store = cls(metadata, transform)
+        with open(path + ".idx", "rb") as f:
+            header = array("q")
+            header.fromfile(f, 2)
+            page_count, chunk_count = header
+            # Byte offsets of the pages are only needed to write the arena
+            f.seek(page_count * array("q").itemsize, os.SEEK_CUR)
+            store.page_numbers.fromfile(f, page_count)
+            store._byte_starts.fromfile(f, chunk_count)
+            store._byte_ends.fromfile(f, chunk_count)
+            store.chunk_pages.fromfile(f, chunk_count)
+            store.page_starts.fromfile(f, page_count)
+            store.starts.fromfile(f, chunk_count)
+            store.ends.fromfile(f, chunk_count)
+
+        if os.path.getsize(path + ".txt") == 0:
+            store._buffer = b""
+        else:
+            with open(path + ".txt", "rb") as f:
+                store._buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        store._length = len(store._buffer)
+        return store
@@ -0,0 +1,234 @@
+import asyncio
+import hashlib
+import logging
+import os
+import re
+import time
+from typing import Dict, List, Optional, Set, Tuple
+from urllib.parse import urljoin, urldefrag, urlparse
+from urllib.robotparser import RobotFileParser
+
+from langchain_core.documents import Document
+from dotenv import load_dotenv
+
+from .metrics_service import registry, span
+from .url_service import USER_AGENT, FETCH_TIMEOUT_SECONDS, extract_main_content, run_sync
+
+# Load environment variables
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Crawl settings
+CRAWL_MAX_DEPTH = int(os.getenv("CRAWL_MAX_DEPTH", "2"))
+CRAWL_MAX_PAGES = int(os.getenv("CRAWL_MAX_PAGES", "200"))
+CRAWL_WORKERS = int(os.getenv("CRAWL_WORKERS", "8"))
+CRAWL_DELAY_SECONDS = float(os.getenv("CRAWL_DELAY_SECONDS", "0.25"))
+
+# Links to documents we cannot extract text from
+_SKIPPED_EXTENSIONS = re.compile(
+    r"\.(?:jpe?g|png|gif|svg|webp|ico|css|js|zip|gz|tar|mp3|mp4|webm|avi|mov|woff2?|ttf|exe|dmg)$",
+    re.IGNORECASE,
+)
+_SITEMAP_LOC = re.compile(r"<loc>\s*([^<\s]+)\s*</loc>", re.IGNORECASE)
+
+crawl_pages_total = registry.counter("deepnote_crawl_pages_total", "Crawled pages by outcome")
+
+
+class CrawlResult:
+    """Outcome of fetching one page during a crawl"""
+    __slots__ = ("url", "depth", "status", "documents", "etag", "last_modified", "content_hash")
+
+    def __init__(self, url: str, depth: int, status: str, documents: Optional[List[Document]] = None,
+                 etag: Optional[str] = None, last_modified: Optional[str] = None,
+                 content_hash: Optional[str] = None):
+        self.url = url
+        self.depth = depth
+        # "changed", "unchanged" or "failed"
+        self.status = status
+        self.documents = documents or []
+        self.etag = etag
+        self.last_modified = last_modified
+        self.content_hash = content_hash
+
+
+def normalize_url(url: str) -> str:
+    url, _ = urldefrag(url)
+    return url.rstrip("/") if urlparse(url).path not in ("", "/") else url
+
+
+def extract_links(html: str, base_url: str) -> List[str]:
+    """Absolute http(s) links found in a page"""
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, "lxml")
+    links = []
+    for anchor in soup.find_all("a", href=True):
+        href = urljoin(base_url, anchor["href"])
+        if urlparse(href).scheme in ("http", "https") and not _SKIPPED_EXTENSIONS.search(urlparse(href).path):
+            links.append(normalize_url(href))
+    return links
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class SiteCrawler:
+    """Bounded async crawler for keeping URL sources fresh.
+
+    Follows same-site links (or a sitemap) breadth-first up to `max_depth`,
+    honours robots.txt and a per-host politeness delay, and re-fetches known
+    pages with conditional GETs so unchanged pages cost a 304 and no parsing.
+
+    `known` maps page URLs from the previous crawl to their validators, as
+    {"etag", "last_modified", "content_hash", "depth"}. Known pages are always
+    revisited, since a 304 response carries no links to rediscover them.
+    """
+    def __init__(self, max_depth: int = CRAWL_MAX_DEPTH, max_pages: int = CRAWL_MAX_PAGES,
+                 workers: int = CRAWL_WORKERS, delay: float = CRAWL_DELAY_SECONDS,
+                 respect_robots: bool = True, timeout: float = FETCH_TIMEOUT_SECONDS):
+        self.max_depth = max_depth
+        self.max_pages = max_pages
+        self.workers = workers
+        self.delay = delay
+        self.respect_robots = respect_robots
+        self.timeout = timeout
+        self._client = None
+        self._robots: Optional[RobotFileParser] = None
+        self._host_lock = asyncio.Lock()
+        self._next_fetch_at = 0.0
+
+    async def crawl(self, start_url: str, known: Optional[Dict[str, dict]] = None) -> List[CrawlResult]:
+        import httpx
+
+        known = known or {}
+        start_url = normalize_url(start_url)
+        site = urlparse(start_url).netloc
+
+        async with httpx.AsyncClient(
+            timeout=self.timeout,
+            follow_redirects=True,
+            headers={"User-Agent": USER_AGENT},
+            limits=httpx.Limits(max_connections=self.workers),
+        ) as client:
+            self._client = client
+            await self._load_robots(start_url)
+
+            seeds = await self._sitemap_urls(start_url) if start_url.endswith(".xml") else [start_url]
+            # Sitemap entries are all crawled at depth 0 without following links
+            follow_links = not start_url.endswith(".xml")
+
+            queue: asyncio.Queue = asyncio.Queue()
+            seen: Set[str] = set()
+            results: List[CrawlResult] = []
+            for seed in seeds:
+                if seed not in seen and len(seen) < self.max_pages:
+                    seen.add(seed)
+                    queue.put_nowait((seed, 0))
+            for url, page in known.items():
+                if url not in seen and len(seen) < self.max_pages:
+                    seen.add(url)
+                    queue.put_nowait((url, page.get("depth") or 0))
+
+            async def worker():
+                while True:
+                    url, depth = await queue.get()
+                    try:
+                        result, links = await self._crawl_page(url, depth, known.get(url))
+                        results.append(result)
+                        crawl_pages_total.inc(status=result.status)
+                        if follow_links and depth < self.max_depth:
+                            for link in links:
+                                if urlparse(link).netloc == site and link not in seen and len(seen) < self.max_pages:
+                                    seen.add(link)
+                                    queue.put_nowait((link, depth + 1))
+                    except Exception as e:
+                        logger.error(f"Error crawling {url}: {str(e)}")
+                        results.append(CrawlResult(url, depth, "failed"))
+                    finally:
+                        queue.task_done()
+
+            tasks = [asyncio.create_task(worker()) for _ in range(self.workers)]
+            await queue.join()
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            self._client = None
+
+        return results
+
+    async def _load_robots(self, start_url: str):
+        if not self.respect_robots:
+            return
+        parsed = urlparse(start_url)
+        robots_url = f"{parsed.scheme}://{parsed.netloc}/robots.txt"
+        self._robots = RobotFileParser(robots_url)
+        try:
+            response = await self._client.get(robots_url)
+            if response.status_code == 200:
+                self._robots.parse(response.text.splitlines())
+                crawl_delay = self._robots.crawl_delay(USER_AGENT)
+                if crawl_delay:
+                    self.delay = max(self.delay, float(crawl_delay))
+            else:
+                self._robots.allow_all = True
+        except Exception:
+            self._robots.allow_all = True
+
+    async def _sitemap_urls(self, sitemap_url: str) -> List[str]:
+        response = await self._client.get(sitemap_url)
+        response.raise_for_status()
+        return [normalize_url(url) for url in _SITEMAP_LOC.findall(response.text)][:self.max_pages]
+
+    async def _wait_politely(self):
+        # Space out requests to the site by `delay` seconds
+        async with self._host_lock:
+            now = time.monotonic()
+            wait = self._next_fetch_at - now
+            self._next_fetch_at = max(now, self._next_fetch_at) + self.delay
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    async def _crawl_page(self, url: str, depth: int, previous: Optional[dict]) -> Tuple[CrawlResult, List[str]]:
+        if self._robots is not None and not self._robots.can_fetch(USER_AGENT, url):
+            logger.info(f"Skipping {url}: disallowed by robots.txt")
+            return CrawlResult(url, depth, "failed"), []
+
+        # Conditional GET against the validators from the previous crawl
+        headers = {}
+        previous = previous or {}
+        etag, last_modified = previous.get("etag"), previous.get("last_modified")
+        previous_hash = previous.get("content_hash")
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+
+        await self._wait_politely()
+        with span("crawl.fetch"):
+            response = await self._client.get(url, headers=headers)
+
+        if response.status_code == 304:
+            return CrawlResult(url, depth, "unchanged", etag=etag, last_modified=last_modified,
+                               content_hash=previous_hash), []
+        response.raise_for_status()
+
+        etag = response.headers.get("etag")
+        last_modified = response.headers.get("last-modified")
+        html = response.text
+        with span("crawl.parse"):
+            title, text = await asyncio.to_thread(extract_main_content, html)
+            links = await asyncio.to_thread(extract_links, html, str(response.url))
+
+        page_hash = content_hash(text)
+        status = "unchanged" if page_hash == previous_hash else "changed"
+        documents = [] if status == "unchanged" else [
+            Document(page_content=text, metadata={"source": url, "title": title, "depth": depth})
+        ]
+        return CrawlResult(url, depth, status, documents, etag, last_modified, page_hash), links
+
+
+def crawl_site(start_url: str, known=None, **kwargs) -> List[CrawlResult]:
+    """Synchronous entry point for background tasks"""
+    return run_sync(lambda: SiteCrawler(**kwargs).crawl(start_url, known))
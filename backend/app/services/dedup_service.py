@@ -0,0 +1,217 @@
+import hashlib
+import re
+from collections import Counter
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from .metrics_service import registry
+
+SIMHASH_BITS = 64
+SHINGLE_SIZE = 3
+# Chunks within this Hamming distance are treated as near-duplicates
+MAX_HAMMING_DISTANCE = 3
+# 4 bands of 16 bits: any pair within distance 3 shares at least one band exactly
+BANDS = 4
+BAND_BITS = SIMHASH_BITS // BANDS
+BAND_MASK = (1 << BAND_BITS) - 1
+
+_WORD_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+dedup_ratio = registry.histogram(
+    "deepnote_dedup_ratio", "Share of a file's chunks found to be duplicates at ingest",
+    buckets=(0.0, 0.01, 0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1.0)
+)
+dedup_chunks = registry.counter("deepnote_dedup_chunks_total", "Ingested chunks by dedup outcome")
+
+
+def _hash64(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+def simhash(text: str) -> int:
+    """64-bit SimHash over word shingles of a chunk"""
+    words = _WORD_PATTERN.findall(text.lower())
+    if len(words) < SHINGLE_SIZE:
+        shingles = [" ".join(words)] if words else []
+    else:
+        shingles = [" ".join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)]
+
+    weights = [0] * SIMHASH_BITS
+    for shingle, count in Counter(shingles).items():
+        value = _hash64(shingle)
+        for bit in range(SIMHASH_BITS):
+            weights[bit] += count if (value >> bit) & 1 else -count
+
+    fingerprint = 0
+    for bit, weight in enumerate(weights):
+        if weight > 0:
+            fingerprint |= 1 << bit
+    return fingerprint
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+def to_signed(fingerprint: int) -> int:
+    """Store unsigned 64-bit fingerprints in a signed BIGINT column"""
+    return fingerprint - (1 << 64) if fingerprint >= (1 << 63) else fingerprint
+
+
+def to_unsigned(fingerprint: int) -> int:
+    return fingerprint + (1 << 64) if fingerprint < 0 else fingerprint
+
+
+class SimHashIndex:
+    """Banded lookup of near-duplicate fingerprints"""
+    def __init__(self, max_distance: int = MAX_HAMMING_DISTANCE):
+        self.max_distance = max_distance
+        self._bands: List[Dict[int, List[Tuple[int, object]]]] = [{} for _ in range(BANDS)]
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def add(self, fingerprint: int, ref):
+        for band in range(BANDS):
+            key = (fingerprint >> (band * BAND_BITS)) & BAND_MASK
+            self._bands[band].setdefault(key, []).append((fingerprint, ref))
+        self._size += 1
+
+    def find(self, fingerprint: int) -> Optional[object]:
+        """Reference of the closest indexed fingerprint within max_distance, if any"""
+        best = None
+        best_distance = self.max_distance + 1
+        for band in range(BANDS):
+            key = (fingerprint >> (band * BAND_BITS)) & BAND_MASK
+            for candidate, ref in self._bands[band].get(key, ()):
+                distance = hamming_distance(fingerprint, candidate)
+                if distance < best_distance:
+                    best, best_distance = ref, distance
+                    if distance == 0:
+                        return best
+        return best
+
+    @classmethod
+    def from_fingerprints(cls, items: Iterable[Tuple[int, object]],
+                          max_distance: int = MAX_HAMMING_DISTANCE) -> "SimHashIndex":
+        index = cls(max_distance)
+        for fingerprint, ref in items:
+            index.add(fingerprint, ref)
+        return index
+
+
+class Deduplicator:
+    """Marks chunks that near-duplicate earlier chunks of the same file or the user's corpus.
+
+    Duplicates get `duplicate_of_index` (an earlier chunk of this file) or
+    `duplicate_of_chunk` (a stored FileChunk id) in their metadata and are
+    skipped when building retrieval indexes, so they are never re-embedded.
+    Chunks can be marked one at a time as they stream in (`mark`, then
+    `finish`) or all at once (`dedupe`).
+    """
+    def __init__(self, corpus_index: Optional[SimHashIndex] = None, max_distance: int = MAX_HAMMING_DISTANCE):
+        self.corpus_index = corpus_index
+        self.max_distance = max_distance
+        self.reset()
+
+    def reset(self):
+        self.local_index = SimHashIndex(self.max_distance)
+        self.count = 0
+        self.duplicates = 0
+
+    def mark(self, doc) -> bool:
+        """Fingerprint the file's next chunk and annotate it if it is a duplicate"""
+        position = self.count
+        self.count += 1
+        fingerprint = simhash(doc.page_content)
+        doc.metadata["fingerprint"] = fingerprint
+
+        corpus_ref = self.corpus_index.find(fingerprint) if self.corpus_index is not None else None
+        local_ref = self.local_index.find(fingerprint) if corpus_ref is None else None
+        if corpus_ref is not None:
+            doc.metadata["duplicate_of_chunk"] = corpus_ref
+        elif local_ref is not None:
+            doc.metadata["duplicate_of_index"] = local_ref
+        else:
+            self.local_index.add(fingerprint, position)
+            dedup_chunks.inc(result="unique")
+            return False
+        self.duplicates += 1
+        dedup_chunks.inc(result="duplicate")
+        return True
+
+    def finish(self) -> float:
+        """Record and return the dedup ratio of the chunks marked so far"""
+        ratio = self.duplicates / self.count if self.count else 0.0
+        dedup_ratio.observe(ratio)
+        return ratio
+
+    def dedupe(self, documents: list) -> float:
+        """Annotate documents in place and return the file's dedup ratio"""
+        self.reset()
+        for doc in documents:
+            self.mark(doc)
+        return self.finish()
+
+
+def is_duplicate(doc) -> bool:
+    return "duplicate_of_index" in doc.metadata or "duplicate_of_chunk" in doc.metadata
+
+
+def _normalize_line(line: str) -> str:
+    return re.sub(r"\d+", "#", line.strip().lower())
+
+
+def find_repeated_lines(pages: list, edge_lines: int = 3, min_pages: int = 3, threshold: float = 0.5) -> Set[str]:
+    """Normalized header/footer lines found on at least `threshold` of the pages"""
+    if len(pages) < min_pages:
+        return set()
+    counts = Counter()
+    for page in pages:
+        lines = [line for line in page.page_content.splitlines() if line.strip()]
+        counts.update({_normalize_line(line) for line in lines[:edge_lines] + lines[-edge_lines:]})
+    return {line for line, count in counts.items() if count / len(pages) >= threshold}
+
+
+def _strip_page(page, repeated: Set[str], edge_lines: int):
+    lines = page.page_content.splitlines()
+    non_empty = [i for i, line in enumerate(lines) if line.strip()]
+    edge_indexes = set(non_empty[:edge_lines] + non_empty[-edge_lines:])
+    page.page_content = "\n".join(
+        line for i, line in enumerate(lines)
+        if not (i in edge_indexes and _normalize_line(line) in repeated)
+    )
+
+
+def strip_repeated_lines(pages: list, edge_lines: int = 3, min_pages: int = 3, threshold: float = 0.5) -> list:
+    """Remove header/footer lines repeated on most pages of a document.
+
+    Only the first and last `edge_lines` lines of each page are considered, and
+    digits are ignored when comparing so running page numbers still match.
+    """
+    repeated = find_repeated_lines(pages, edge_lines, min_pages, threshold)
+    if repeated:
+        for page in pages:
+            _strip_page(page, repeated, edge_lines)
+    return pages
+
+
+def stream_strip_repeated_lines(pages: Iterable, sample_pages: int = 8, edge_lines: int = 3, min_pages: int = 3,
+                                threshold: float = 0.5) -> Iterator:
+    """strip_repeated_lines over a page stream.
+
+    Repeated lines are learned from the first `sample_pages` pages, which are
+    held back until then; later pages are stripped as they arrive.
+    """
+    pages = iter(pages)
+    sample = list(islice(pages, sample_pages))
+    repeated = find_repeated_lines(sample, edge_lines, min_pages, threshold)
+    for page in sample:
+        if repeated:
+            _strip_page(page, repeated, edge_lines)
+        yield page
+    for page in pages:
+        if repeated:
+            _strip_page(page, repeated, edge_lines)
+        yield page
@@ -0,0 +1,124 @@
+import logging
+from typing import Callable, Dict, Iterator, List
+
+from langchain_core.documents import Document
+
+logger = logging.getLogger(__name__)
+
+# file_type -> extractor returning raw (unsplit) content for a source
+_EXTRACTORS: Dict[str, Callable[[str], list]] = {}
+# file_type -> extractor yielding raw pages one at a time, for streaming ingestion
+_PAGE_STREAMERS: Dict[str, Callable[[str], Iterator[Document]]] = {}
+
+
+def register_extractor(file_type: str):
+    """Register an extractor for a file type.
+
+    Extractors import their loader libraries inside the function body so that
+    importing this module (or the API) never pulls in selenium, pdfplumber or
+    the YouTube clients. Only the extractor used for a file pays that cost.
+    """
+    def decorator(func: Callable[[str], list]):
+        _EXTRACTORS[file_type] = func
+        return func
+    return decorator
+
+
+def get_extractor(file_type: str) -> Callable[[str], list]:
+    """Return the extractor registered for a file type"""
+    try:
+        return _EXTRACTORS[file_type]
+    except KeyError:
+        raise ValueError(f"No extractor registered for file type: {file_type}")
+
+
+def register_page_streamer(file_type: str):
+    """Register an extractor that yields pages lazily instead of returning them all"""
+    def decorator(func: Callable[[str], Iterator[Document]]):
+        _PAGE_STREAMERS[file_type] = func
+        return func
+    return decorator
+
+
+def iter_pages(file_type: str, source: str) -> Iterator[Document]:
+    """Pages of a source, streamed when the file type supports it"""
+    streamer = _PAGE_STREAMERS.get(file_type)
+    if streamer is not None:
+        return streamer(source)
+    return iter(get_extractor(file_type)(source))
+
+
+def supported_file_types() -> List[str]:
+    return list(_EXTRACTORS)
+
+
+@register_extractor("pdf")
+def extract_pdf(file_path: str) -> List[Document]:
+    """Extract one document per PDF page"""
+    from langchain_community.document_loaders import PDFPlumberLoader
+
+    return PDFPlumberLoader(file_path).load()
+
+
+@register_page_streamer("pdf")
+def stream_pdf(file_path: str) -> Iterator[Document]:
+    """Yield PDF pages as they are parsed, with the same content and metadata as extract_pdf.
+
+    PDFPlumberLoader parses every page before returning the first one; here
+    each page's parsed layout is released once its text is extracted, so
+    memory stays flat over long documents.
+    """
+    import pdfplumber
+
+    with pdfplumber.open(file_path) as pdf:
+        total_pages = len(pdf.pages)
+        doc_metadata = {key: value for key, value in pdf.metadata.items() if type(value) in (str, int)}
+        for page in pdf.pages:
+            text = page.extract_text()
+            # Page.close() in newer pdfplumber; before it, the cached layout and text map are released by hand
+            if hasattr(page, "close"):
+                page.close()
+            else:
+                page.flush_cache()
+                page.get_textmap.cache_clear()
+            yield Document(
+                page_content=text + "\n",
+                metadata={
+                    "source": file_path, "file_path": file_path,
+                    "page": page.page_number - 1, "total_pages": total_pages,
+                    **doc_metadata,
+                },
+            )
+
+
+@register_extractor("url")
+def extract_url(url: str) -> List[Document]:
+    """Extract a web page over plain HTTP, rendering it in a browser only if needed"""
+    from .url_service import extract_urls
+
+    return extract_urls([url])
+
+
+def extract_url_with_browser(url: str) -> List[Document]:
+    """Extract a web page by rendering it in a pooled headless browser"""
+    from .browser_pool import get_browser_pool
+    from .url_service import extract_main_content
+
+    title, html = get_browser_pool().render(url)
+    page_title, text = extract_main_content(html)
+    return [Document(page_content=text, metadata={"source": url, "title": title or page_title})]
+
+
+@register_extractor("youtube")
+def extract_youtube_transcript(video_id: str) -> List[dict]:
+    """Fetch the transcript entries ({"text", "start", "duration"}) of a video"""
+    from youtube_transcript_api import YouTubeTranscriptApi
+
+    return YouTubeTranscriptApi.get_transcript(video_id)
+
+
+def fetch_youtube_title_pytube(url: str) -> str:
+    """Fetch a video title with pytube"""
+    from pytube import YouTube
+
+    return YouTube(url).title
@@ -1,32 +1,45 @@
 import concurrent.futures
 import re
-import requests
 import logging
-from typing import List
+from typing import Dict, Iterator, List, Optional
 
-from youtube_transcript_api import YouTubeTranscriptApi
-from pytube import YouTube
-
-from langchain_community.document_loaders import PDFPlumberLoader, SeleniumURLLoader
 from langchain_core.documents import Document
-from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from .dedup_service import Deduplicator, SimHashIndex, stream_strip_repeated_lines, strip_repeated_lines
+from .extractors import get_extractor, iter_pages
+from .metrics_service import span
+from .profiling_service import profiled
+from .text_cache import ExtractedTextCache
+from .text_splitter import TextSplitter
 
 logger = logging.getLogger(__name__)
 
 class DocumentProcessor:
-    def __init__(self):
-        self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size = 1000,
-            chunk_overlap=200,
+    def __init__(self, youtube_ingestor=None, text_cache: Optional[ExtractedTextCache] = None):
+        self.chunk_size = 1000
+        self.chunk_overlap = 200
+        # Same separators and merge rules as RecursiveCharacterTextSplitter, but offset based
+        # and always recording start_index (as pdf_rag.py's add_start_index=True does)
+        self.text_splitter = TextSplitter(
+            chunk_size = self.chunk_size,
+            chunk_overlap=self.chunk_overlap,
             separators=["\n\n", "\n", ".", "!", "?", ",", " "]
         )
+        # Pass an ingestor with a stub provider to ingest YouTube without network calls
+        self.youtube_ingestor = youtube_ingestor
+        # Raw PDF page text by content hash, so changing the chunking never re-parses PDFs
+        self.text_cache = text_cache or ExtractedTextCache()
+        self.last_dedup_ratio = 0.0
 
     def load_pdf(self, file_path: str) -> List[Document]:
         """Load PDF and split into chunks"""
         try:
-            loader = PDFPlumberLoader(file_path)
-            documents = loader.load()
-            split_docs = self.text_splitter.split_documents(documents)
+            with span("ingest.extract", file_type="pdf"):
+                documents = list(self.text_cache.pages(file_path, "pdf"))
+            # Headers and footers repeated on every page would otherwise be indexed once per chunk
+            documents = strip_repeated_lines(documents)
+            with span("ingest.split", file_type="pdf"):
+                split_docs = self.text_splitter.split_documents(documents)
             return split_docs
         except Exception as e:
             logger.error(f"Error loading PDF: {str(e)}")
@@ -35,76 +48,80 @@ class DocumentProcessor:
     def load_url(self, url: str) -> List[Document]:
         """Load content from a URL, extract text and create a Document"""
         try:
-            loader = SeleniumURLLoader(urls=[url])
-            documents = loader.load()
+            with span("ingest.extract", file_type="url"):
+                documents = get_extractor("url")(url)
             fixed_docs = []
-            for doc in documents:
-                # Ensure page_content is a string
-                text = doc.page_content
-                if not isinstance(text, str):
-                    text = str(text)
-                fixed_doc = Document(page_content=text, metadata={"source": url})
-                fixed_docs.extend(self.text_splitter.split_documents([fixed_doc]))
+            with span("ingest.split", file_type="url"):
+                for doc in documents:
+                    # Ensure page_content is a string
+                    text = doc.page_content
+                    if not isinstance(text, str):
+                        text = str(text)
+                    fixed_doc = Document(page_content=text, metadata={"source": url})
+                    fixed_docs.extend(self.text_splitter.split_documents([fixed_doc]))
             return fixed_docs
         except Exception as e:
             logger.error(f"Error loading URL: {str(e)}")
+            return []
+
+    def load_urls(self, urls: List[str]) -> List[Document]:
+        """Load several URLs concurrently and split them into chunks"""
+        from .url_service import extract_urls
+
+        try:
+            with span("ingest.extract", file_type="url"):
+                documents = extract_urls(urls)
+            with span("ingest.split", file_type="url"):
+                return self.text_splitter.split_documents(documents)
+        except Exception as e:
+            logger.error(f"Error loading URLs: {str(e)}")
+            return []
     
+    @profiled("ingest.crawl")
+    def crawl_url(self, url: str, known: Optional[Dict[str, dict]] = None, max_depth: Optional[int] = None):
+        """Crawl a site, returning per-page results with changed pages split and cleaned"""
+        from .crawl_service import crawl_site
+
+        options = {"max_depth": max_depth} if max_depth is not None else {}
+        with span("ingest.crawl", file_type="url"):
+            results = crawl_site(url, known, **options)
+
+        with span("ingest.split", file_type="url"):
+            for result in results:
+                if not result.documents:
+                    continue
+                split_docs = self.text_splitter.split_documents(result.documents)
+                cleaned_docs = []
+                for doc in split_docs:
+                    doc.page_content = self.clean_text(doc.page_content)
+                    if doc.page_content.strip():
+                        cleaned_docs.append(doc)
+                result.documents = cleaned_docs
+        return results
+
     def load_youtube(self, url: str) -> List[Document]:
-        """Load content from a YouTube video, extract transcript and create a Document"""
+        """Load content from a YouTube video or playlist as timestamped transcript chunks"""
+        return self.load_youtube_batch([url])
+
+    def load_youtube_batch(self, urls: List[str]) -> List[Document]:
+        """Load many YouTube videos or playlists concurrently, using the transcript cache"""
+        from .youtube_service import YouTubeIngestor
 
         try:
-            video_id_match = re.search(r'?:v=|\/)([0-9A-Za-z_-]{11}).*', url)
-            if not video_id_match:
-                return []
-            video_id = video_id_match.group(1)
-            title = self.get_youtube_title(url, video_id)
-
-            # Get transcript
-            transcript_list = YouTubeTranscriptApi.get_transcript(video_id)
-            if not transcript_list:
-                logger.error(f"No transcript found for video {video_id}")
-                return []
-            full_transcript = " ".join([entry["text"] for entry in transcript_list])
-
-            doc = Document(
-                page_content = full_transcript,
-                metadata = {
-                    "source": url,
-                    "title": title,
-                    "type": "youtube_transcript"
-                }
-            )
-
-            split_docs = self.text_splitter.split_documents([doc])
+            if self.youtube_ingestor is None:
+                self.youtube_ingestor = YouTubeIngestor()
+            ingestor = self.youtube_ingestor
+            with span("ingest.extract", file_type="youtube"):
+                entries = ingestor.resolve(urls)
+            with span("ingest.split", file_type="youtube"):
+                split_docs = []
+                for entry in entries:
+                    split_docs.extend(ingestor.to_documents(entry, self.chunk_size, self.chunk_overlap))
             return split_docs
         except Exception as e:
             logger.error(f"Error loading YouTube video: {str(e)}")
             return []
-        
-    def get_youtube_title(self, url: str, video_id: str) -> str:
-        """Get YouTube video title using multiple fallback methods"""
-        
-        # Method 1: Try using pytube
-        try:
-            yt = YouTube(url)
-            return yt.title
-        except Exception:
-            # Method 2: Use requests to get page metadata
-            try:
-                response = requests.get(f"https://www.youtube.com/watch?v={video_id}")
-                if response.status_code == 200:
-                    title_match = re.search(r'<title>(.*?)</title>', response.text)
-                    if title_match:
-                        title = title_match.group(1)
-                        # Clean up title (remove " - YouTube" suffix)
-                        title = re.sub(r'\s*-\s*YouTube\s*$', '', title)
-                        return title
-            except Exception:
-                pass
-        
-        # Fallback: Use video ID as title
-        return f"YouTube Video {video_id}"
-    
+
     def clean_text(self, text: str) -> str:
         """Enhanced text cleaning for PDF and URL content"""
         text = re.sub(r'^\s*Page \d+\s*$', '', text, flags=re.MULTILINE)
@@ -115,30 +132,77 @@ class DocumentProcessor:
         text = re.sub(r'(?<=[a-z])(?=[A-Z])', ' ', text)
         return text.strip()
     
-    def process_documents(self, documents: str, type: str) -> List[Document]:
-        """Process documents based on their type"""
+    def stream_pages(self, source: str, type: str, content_hash: Optional[str] = None) -> Iterator[Document]:
+        """Pages of a source in order, for the streaming ingest pipeline.
+
+        PDF pages come from the extracted-text cache or are parsed one at a
+        time (and cached), with headers and footers learned from the first
+        pages. YouTube yields transcript chunks, already split.
+        """
+        match type:
+            case "pdf":
+                return stream_strip_repeated_lines(self.text_cache.pages(source, "pdf", content_hash))
+            case "url":
+                return (
+                    Document(page_content=str(doc.page_content), metadata={"source": source})
+                    for doc in iter_pages("url", source)
+                )
+            case "youtube":
+                return iter(self.load_youtube(source))
+            case _:
+                return iter([])
+
+    def split_page(self, page: Document) -> List[Document]:
+        """Chunks of one page; timestamped transcript chunks are kept as they are"""
+        if page.metadata.get("type") == "youtube_transcript":
+            return [page]
+        return self.text_splitter.split_documents([page])
+
+    def clean_chunks(self, chunks: List[Document]) -> List[Document]:
+        """Clean chunk texts in place, dropping chunks left empty"""
+        cleaned = []
+        for doc in chunks:
+            doc.page_content = self.clean_text(doc.page_content)
+            if doc.page_content.strip():
+                cleaned.append(doc)
+        return cleaned
+
+    @profiled("ingest.process_documents")
+    def process_documents(self, documents: str, type: str, dedup_index: Optional[SimHashIndex] = None) -> List[Document]:
+        """Process documents based on their type.
+
+        Cleaned chunks are fingerprinted and near-duplicates (within the file or
+        against `dedup_index`, the user's corpus) are marked in their metadata.
+        The file's dedup ratio is kept in `self.last_dedup_ratio`.
+        """
         docs = []
         processed_docs = []
 
         try:
-            match type:
-                case ("pdf"):
-                    docs = self.load_pdf(documents)
-                case ("url"):
-                    docs = self.load_url(documents)
-                case ("youtube"):
-                    docs = self.load_youtube(documents) 
-                case _:
-                    docs = []
-
-            with concurrent.futures.ThreadPoolExecutor() as executor:
-                def process_doc(doc):
-                    cleaned_content = self.clean_text(doc.page_content)
-                    doc.page_content = cleaned_content
-                    if cleaned_content.strip():
-                        return doc
-                    return None
-                processed_docs = list(filter(None, executor.map(process_doc, docs)))
+            with span("ingest.load", file_type=type):
+                match type:
+                    case ("pdf"):
+                        docs = self.load_pdf(documents)
+                    case ("url"):
+                        docs = self.load_url(documents)
+                    case ("youtube"):
+                        docs = self.load_youtube(documents) 
+                    case _:
+                        docs = []
+
+            with span("ingest.clean", file_type=type):
+                with concurrent.futures.ThreadPoolExecutor() as executor:
+                    def process_doc(doc):
+                        cleaned_content = self.clean_text(doc.page_content)
+                        doc.page_content = cleaned_content
+                        if cleaned_content.strip():
+                            return doc
+                        return None
+                    processed_docs = list(filter(None, executor.map(process_doc, docs)))
+
+            with span("ingest.dedupe", file_type=type):
+                self.last_dedup_ratio = Deduplicator(dedup_index).dedupe(processed_docs)
+            logger.info(f"Dedup ratio for {documents}: {self.last_dedup_ratio:.1%}")
 
             return processed_docs
         except Exception as e:
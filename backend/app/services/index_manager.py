@@ -0,0 +1,584 @@
+import concurrent.futures
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Callable, Dict, Hashable, List, Optional, Tuple
+from dotenv import load_dotenv
+
+import numpy as np
+from langchain_core.documents import Document
+
+from .index_segments import SegmentStore
+from .metrics_service import registry, span
+from .rag_service import InstrumentedEmbeddings, Retriever
+
+# Load environment variables
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Index residency settings
+INDEX_MEMORY_BUDGET_MB = int(os.getenv("INDEX_MEMORY_BUDGET_MB", "1024"))
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "deepseek-r1:8b")
+# Share indexes between worker processes as memory-mapped segments
+INDEX_SEGMENTS_ENABLED = os.getenv("INDEX_SEGMENTS_ENABLED", "true").lower() == "true"
+# How often a resident tenant checks the segment manifest for a newer version
+INDEX_MANIFEST_CHECK_SECONDS = float(os.getenv("INDEX_MANIFEST_CHECK_SECONDS", "1.0"))
+# Share of tombstoned (deleted) rows above which a tenant's index is compacted in the background
+INDEX_COMPACT_TOMBSTONE_RATIO = float(os.getenv("INDEX_COMPACT_TOMBSTONE_RATIO", "0.2"))
+
+index_loads = registry.counter("deepnote_index_loads_total", "Tenant indexes loaded into memory")
+index_evictions = registry.counter("deepnote_index_evictions_total", "Tenant indexes evicted from memory")
+index_load_seconds = registry.histogram(
+    "deepnote_index_load_seconds", "Time to load a tenant index",
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+)
+index_resident_tenants = registry.gauge("deepnote_index_resident_tenants", "Tenant indexes currently in memory")
+index_resident_bytes = registry.gauge("deepnote_index_resident_bytes", "Approximate memory held by resident indexes")
+index_deleted_files = registry.counter("deepnote_index_deleted_files_total", "Files tombstoned in tenant indexes")
+index_compactions = registry.counter("deepnote_index_compactions_total", "Tenant index compactions, by result")
+index_compaction_seconds = registry.histogram(
+    "deepnote_index_compaction_seconds", "Time to compact a tenant index",
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+)
+
+
+class ReadWriteLock:
+    """Many concurrent readers or one writer; waiting writers block new readers"""
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._readers = 0
+        self._writer = False
+        self._waiting_writers = 0
+
+    @contextmanager
+    def read(self):
+        with self._condition:
+            while self._writer or self._waiting_writers:
+                self._condition.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._readers -= 1
+                if not self._readers:
+                    self._condition.notify_all()
+
+    @contextmanager
+    def write(self):
+        with self._condition:
+            self._waiting_writers += 1
+            while self._writer or self._readers:
+                self._condition.wait()
+            self._waiting_writers -= 1
+            self._writer = True
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._writer = False
+                self._condition.notify_all()
+
+
+class TenantIndex:
+    """A tenant's resident retriever with its lock and residency statistics"""
+    def __init__(self, key: Hashable, retriever: Retriever, load_seconds: float, version: Optional[str] = None):
+        self.key = key
+        self.retriever = retriever
+        # Segment state (version and deletes) the index was mapped from, None when built in memory
+        self.version = version
+        self.checked_at = time.monotonic()
+        self.lock = ReadWriteLock()
+        self.load_seconds = load_seconds
+        self.loaded_at = time.time()
+        self.last_used = self.loaded_at
+        self.queries = 0
+        self.nbytes = retriever.index.nbytes()
+
+    def stats(self) -> dict:
+        return {
+            "tenant": str(self.key),
+            "version": self.version,
+            "chunks": len(self.retriever.index),
+            "tombstone_ratio": round(self.retriever.index.tombstone_ratio, 4),
+            "bytes": self.nbytes,
+            "load_seconds": round(self.load_seconds, 4),
+            "loaded_at": self.loaded_at,
+            "last_used": self.last_used,
+            "queries": self.queries,
+        }
+
+
+def chunk_documents(chunks, db_file) -> List[Document]:
+    """Index Documents of stored chunks of one file"""
+    return [
+        Document(page_content=chunk.content, metadata={
+            "chunk_id": chunk.id, "file_id": db_file.id, "source": db_file.filename,
+            "chunk_index": chunk.chunk_index,
+        })
+        for chunk in chunks
+    ]
+
+
+class DatabaseIndexLoader:
+    """Builds a user's index from stored chunks, reusing persisted embeddings.
+
+    Chunks without a stored embedding are embedded once and written back, so
+    later loads of the same tenant never call the embedding model.
+    """
+    def __init__(self, session_factory=None, embeddings=None):
+        if session_factory is None:
+            from ..db import SessionLocal as session_factory
+        self.session_factory = session_factory
+        self.embeddings = embeddings or InstrumentedEmbeddings(EMBEDDING_MODEL)
+
+    def __call__(self, user_id: int) -> Retriever:
+        from ..db.repositories.file_repository import FileRepository
+
+        retriever = Retriever(embeddings=self.embeddings)
+        db = self.session_factory()
+        try:
+            rows = FileRepository.get_user_chunks(db, user_id)
+            missing = [chunk for chunk, _ in rows if not chunk.embedding]
+            new_vectors = {}
+            if missing:
+                vectors = self.embeddings.embed_documents([chunk.content for chunk in missing])
+                new_vectors = {chunk.id: vector for chunk, vector in zip(missing, vectors)}
+                FileRepository.store_chunk_embeddings(db, new_vectors)
+
+            # Rows are ordered by file, so each file becomes one contiguous row range
+            start = 0
+            while start < len(rows):
+                db_file = rows[start][1]
+                end = start
+                while end < len(rows) and rows[end][1].id == db_file.id:
+                    end += 1
+                chunks = [chunk for chunk, _ in rows[start:end]]
+                documents = chunk_documents(chunks, db_file)
+                vectors = [new_vectors[chunk.id] if chunk.id in new_vectors else json.loads(chunk.embedding)
+                           for chunk in chunks]
+                retriever.index_documents(documents, file_id=db_file.id, file_type=db_file.file_type,
+                                          user_id=user_id, vectors=vectors)
+                start = end
+
+            # Files whose chunks duplicate other files' chunks match their canonical rows
+            aliases: Dict[int, Tuple[str, List[int]]] = {}
+            for file_id, file_type, canonical_id in FileRepository.get_user_duplicate_refs(db, user_id):
+                aliases.setdefault(file_id, (file_type, []))[1].append(canonical_id)
+            for file_id, (file_type, canonical_ids) in aliases.items():
+                retriever.index.add_aliases(file_id, canonical_ids, file_type, user_id)
+        finally:
+            db.close()
+        return retriever
+
+
+class IndexManager:
+    """Per-tenant indexes loaded lazily and kept resident under a memory budget.
+
+    Tenants (users; notebooks query their user's index with file filters) are
+    loaded on first query and tracked in LRU order. When the resident total
+    exceeds the budget, the least recently used tenants are evicted; queries
+    already holding an evicted index finish on it. Queries take a tenant's read
+    lock and ingestion its write lock, so reads continue concurrently while no
+    update is being applied, and embedding happens outside the lock.
+
+    With a SegmentStore, indexes are published as memory-mapped segments shared
+    by every worker process: a load maps the current segment (building and
+    publishing it from the database only if none exists), ingestion publishes a
+    new version, and resident tenants switch to it when the manifest changes.
+    Mapped pages are not counted against the budget, only per-worker heap.
+    An ingest's micro-batches go to the ingesting worker's resident copy at
+    once and are published together by `publish_file`, which the caller
+    throttles (the file controller publishes at most once per
+    INGEST_PUBLISH_SECONDS), as every publish rewrites the whole segment.
+
+    Deleting a file tombstones its rows (in the manifest with segments), which
+    queries skip at once; once a tenant's tombstone ratio passes
+    `compact_ratio`, a background worker rewrites its index without them.
+    """
+    def __init__(self, loader: Optional[Callable[[Hashable], Retriever]] = None,
+                 memory_budget_bytes: int = INDEX_MEMORY_BUDGET_MB * 1024 * 1024,
+                 segments: Optional[SegmentStore] = None, embeddings=None,
+                 compact_ratio: float = INDEX_COMPACT_TOMBSTONE_RATIO):
+        self.embeddings = embeddings or InstrumentedEmbeddings(EMBEDDING_MODEL)
+        self.loader = loader or DatabaseIndexLoader(embeddings=self.embeddings)
+        self.memory_budget_bytes = memory_budget_bytes
+        self.segments = segments
+        self._tenants: "OrderedDict[Hashable, TenantIndex]" = OrderedDict()
+        self._lock = threading.Lock()
+        # One load lock per tenant so concurrent first queries load only once
+        self._load_locks: Dict[Hashable, threading.Lock] = {}
+        self.loads = 0
+        self.evictions = 0
+        self.compact_ratio = compact_ratio
+        # (tenant, file_id) -> micro-batches held back from the segment until publish_file
+        self._unpublished: Dict[Tuple[Hashable, int], dict] = {}
+        self._compacting = set()
+        self._compactor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="index-compactor")
+
+    def _is_stale(self, tenant: TenantIndex) -> bool:
+        """Whether another process published a newer segment (checked at most once per interval).
+
+        Reads the manifest, so call without holding _lock.
+        """
+        if self.segments is None:
+            return False
+        now = time.monotonic()
+        if now - tenant.checked_at < INDEX_MANIFEST_CHECK_SECONDS:
+            return False
+        tenant.checked_at = now
+        return self.segments.current_state(tenant.key) != tenant.version
+
+    def _load(self, key: Hashable) -> Tuple[Retriever, Optional[str]]:
+        if self.segments is None:
+            return self.loader(key), None
+        opened = self.segments.open(key)
+        if opened is None:
+            with self.segments.lock(key):
+                # Another worker may have published while this one waited
+                opened = self.segments.open(key)
+                if opened is None:
+                    self.segments.publish(key, self.loader(key).index)
+                    opened = self.segments.open(key)
+        version, index = opened
+        retriever = Retriever(embeddings=self.embeddings)
+        retriever.index = index
+        return retriever, version
+
+    def _resident_bytes(self) -> int:
+        return sum(tenant.nbytes for tenant in self._tenants.values())
+
+    def _update_gauges(self):
+        index_resident_tenants.set(len(self._tenants))
+        index_resident_bytes.set(self._resident_bytes())
+
+    def _evict(self, keep: Hashable):
+        """Evict least recently used tenants until the budget is met (caller holds _lock)"""
+        total = self._resident_bytes()
+        for key in list(self._tenants):
+            if total <= self.memory_budget_bytes:
+                break
+            if key == keep:
+                continue
+            tenant = self._tenants.pop(key)
+            total -= tenant.nbytes
+            self.evictions += 1
+            index_evictions.inc()
+            logger.info(f"Evicted index of tenant {key} ({tenant.nbytes} bytes)")
+        if total > self.memory_budget_bytes:
+            logger.warning(f"Index of tenant {keep} alone exceeds the index memory budget")
+
+    def get(self, key: Hashable) -> TenantIndex:
+        """Resident index of a tenant, loading it on first use"""
+        with self._lock:
+            tenant = self._tenants.get(key)
+            if tenant is not None:
+                self._tenants.move_to_end(key)
+        # The manifest is read outside the lock so one tenant's check never blocks the others
+        if tenant is not None and not self._is_stale(tenant):
+            return tenant
+        stale = tenant
+        with self._lock:
+            load_lock = self._load_locks.setdefault(key, threading.Lock())
+
+        with load_lock:
+            with self._lock:
+                tenant = self._tenants.get(key)
+                if tenant is not None and tenant is not stale:
+                    return tenant
+            start = time.perf_counter()
+            with span("index.load"):
+                retriever, version = self._load(key)
+            load_seconds = time.perf_counter() - start
+            tenant = TenantIndex(key, retriever, load_seconds, version)
+            index_loads.inc()
+            index_load_seconds.observe(load_seconds)
+            logger.info(f"Loaded index of tenant {key}: {len(retriever.index)} chunks in {load_seconds:.2f}s")
+
+            with self._lock:
+                self._tenants[key] = tenant
+                self._tenants.move_to_end(key)
+                self.loads += 1
+                self._load_locks.pop(key, None)
+                self._evict(keep=key)
+                self._update_gauges()
+        return tenant
+
+    def query(self, key: Hashable, query: str, k: int = 5, **filters) -> List[Document]:
+        tenant = self.get(key)
+        with tenant.lock.read():
+            tenant.last_used = time.time()
+            tenant.queries += 1
+            return tenant.retriever.retrieve_relevant_docs(query, k=k, **filters)
+
+    def query_many(self, key: Hashable, queries: List[str], k: int = 5, **filters) -> List[List[Document]]:
+        """Retrieve for many queries against one snapshot of a tenant's index"""
+        tenant = self.get(key)
+        with tenant.lock.read():
+            tenant.last_used = time.time()
+            tenant.queries += len(queries)
+            return tenant.retriever.retrieve_many(queries, k=k, **filters)
+
+    @contextmanager
+    def reading(self, key: Hashable):
+        """Hold a tenant's read lock, e.g. for several queries against one snapshot"""
+        tenant = self.get(key)
+        with tenant.lock.read():
+            tenant.last_used = time.time()
+            yield tenant.retriever
+
+    def index_file(self, key: Hashable, documents: List[Document], file_id: int, file_type: Optional[str] = None,
+                   user_id: Optional[int] = None, vectors: Optional[List[List[float]]] = None,
+                   duplicate_of: Optional[List[int]] = None, publish: bool = True):
+        """Add a newly ingested file, or the next micro-batch of one, to a tenant's index.
+
+        With segments, the current segment gets the chunks and is republished;
+        without, only a resident index is updated. With `publish=False` (an
+        ingest's micro-batches) the resident index is updated either way and
+        the segment only by the next `publish_file`. Tenants with nothing
+        loaded or published pick the file up from the database on their next
+        load. Chunks whose ids the index already holds (committed before a
+        concurrent load read the database) are skipped. `duplicate_of` lists
+        chunk ids of other files that the file's near-duplicate chunks
+        reference; filters on the file match their rows.
+        """
+        duplicate_of = duplicate_of or []
+        if self.segments is not None and not publish:
+            if vectors is None and documents:
+                # Embedded once here, for both the resident copy and the later publish
+                vectors = self.embeddings.embed_documents([doc.page_content for doc in documents])
+            with self._lock:
+                held = self._unpublished.setdefault((key, file_id), {
+                    "documents": [], "vectors": [], "duplicate_of": [], "file_type": file_type, "user_id": user_id,
+                })
+                if documents:
+                    held["documents"].extend(documents)
+                    held["vectors"].append(np.array(vectors, dtype=np.float32))
+                held["duplicate_of"].extend(duplicate_of)
+        elif self.segments is not None:
+            with self.segments.lock(key):
+                opened = self.segments.open(key)
+                if opened is None:
+                    return
+                _, index = opened
+                documents, vectors = self._new_chunks(index, documents, vectors)
+                if not documents and not duplicate_of:
+                    return
+                retriever = Retriever(embeddings=self.embeddings)
+                retriever.index = index
+                retriever.index_documents(documents, file_id=file_id, file_type=file_type,
+                                          user_id=user_id, vectors=vectors)
+                index.add_aliases(file_id, duplicate_of, file_type, user_id)
+                self.segments.publish(key, index)
+            # Resident copies notice the new manifest and remap on their next query
+            return
+
+        with self._lock:
+            tenant = self._tenants.get(key)
+        if tenant is None:
+            return
+        documents, vectors = self._new_chunks(tenant.retriever.index, documents, vectors)
+        if not documents and not duplicate_of:
+            return
+        prepared = tenant.retriever.prepare_documents(documents, vectors)
+        with tenant.lock.write():
+            if documents:
+                tenant.retriever.index.add_file(*prepared, file_id=file_id, file_type=file_type, user_id=user_id)
+            tenant.retriever.index.add_aliases(file_id, duplicate_of, file_type, user_id)
+            tenant.nbytes = tenant.retriever.index.nbytes()
+        with self._lock:
+            if key in self._tenants:
+                self._evict(keep=key)
+            self._update_gauges()
+
+    def publish_file(self, key: Hashable, file_id: int):
+        """Publish a file's micro-batches indexed with `publish=False` since the last call as one segment version"""
+        with self._lock:
+            held = self._unpublished.pop((key, file_id), None)
+        if held is None:
+            return
+        vectors = np.concatenate(held["vectors"]) if held["vectors"] else None
+        self.index_file(key, held["documents"], file_id, held["file_type"], held["user_id"], vectors,
+                        held["duplicate_of"])
+
+    def replace_file(self, key: Hashable, documents: List[Document], file_id: int, file_type: Optional[str] = None,
+                     user_id: Optional[int] = None, vectors: Optional[List[List[float]]] = None):
+        """Swap all of a file's rows for `documents`, e.g. after a re-crawl changed, dropped or renumbered chunks.
+
+        The old rows are tombstoned without recording the file as deleted, so
+        the new rows stay live (a file deleted meanwhile still tombstones
+        them on arrival). With segments one new version is published; without,
+        only a resident index is updated, as with `index_file`.
+        """
+        if vectors is None and documents:
+            vectors = self.embeddings.embed_documents([doc.page_content for doc in documents])
+        if self.segments is not None:
+            with self.segments.lock(key):
+                opened = self.segments.open(key)
+                if opened is None:
+                    return
+                _, index = opened
+                index.delete_file(file_id, replacing=True)
+                if documents:
+                    retriever = Retriever(embeddings=self.embeddings)
+                    retriever.index = index
+                    retriever.index_documents(documents, file_id=file_id, file_type=file_type,
+                                              user_id=user_id, vectors=vectors)
+                self.segments.publish(key, index)
+            # Resident copies notice the new manifest and remap on their next query
+            ratio = index.tombstone_ratio
+        else:
+            with self._lock:
+                tenant = self._tenants.get(key)
+            if tenant is None:
+                return
+            prepared = tenant.retriever.prepare_documents(documents, vectors)
+            with tenant.lock.write():
+                tenant.retriever.index.delete_file(file_id, replacing=True)
+                if documents:
+                    tenant.retriever.index.add_file(*prepared, file_id=file_id, file_type=file_type, user_id=user_id)
+                tenant.nbytes = tenant.retriever.index.nbytes()
+                ratio = tenant.retriever.index.tombstone_ratio
+            with self._lock:
+                if key in self._tenants:
+                    self._evict(keep=key)
+                self._update_gauges()
+        logger.info(f"Replaced file {file_id} in index of tenant {key} with {len(documents)} chunks")
+        if ratio >= self.compact_ratio:
+            self.schedule_compaction(key)
+
+    @staticmethod
+    def _new_chunks(index, documents: List[Document], vectors: Optional[List[List[float]]]):
+        """Documents (and their vectors) whose chunk ids are not in the index yet"""
+        chunk_ids = [doc.metadata.get("chunk_id", -1) for doc in documents]
+        present = index.contains_chunks(chunk_ids) & (np.asarray(chunk_ids, dtype=np.int64) >= 0)
+        if not present.any():
+            return documents, vectors
+        keep = np.flatnonzero(~present)
+        return [documents[i] for i in keep], [vectors[i] for i in keep] if vectors is not None else None
+
+    def delete_file(self, key: Hashable, file_id: int):
+        """Tombstone a file in a tenant's index, without rebuilding or rewriting it.
+
+        With segments only the manifest is rewritten; other workers pick the
+        delete up with their next manifest check. Micro-batches of the file
+        held for `publish_file` are dropped.
+        """
+        deleted = 0
+        state = previous_state = None
+        with self._lock:
+            self._unpublished.pop((key, file_id), None)
+        if self.segments is not None:
+            with self.segments.lock(key):
+                previous_state = self.segments.current_state(key)
+                state = self.segments.delete_files(key, [file_id])
+        with self._lock:
+            tenant = self._tenants.get(key)
+        if tenant is not None:
+            with tenant.lock.write():
+                deleted = tenant.retriever.index.delete_file(file_id)
+                if state is not None and tenant.version is not None and tenant.version == previous_state:
+                    # Already applied here, so the manifest change needs no remap; a copy that
+                    # missed earlier publishes stays stale and remaps on its next query
+                    tenant.version = state
+                ratio = tenant.retriever.index.tombstone_ratio
+        index_deleted_files.inc()
+        logger.info(f"Tombstoned file {file_id} in index of tenant {key} ({deleted} resident rows)")
+        if tenant is not None and ratio >= self.compact_ratio:
+            self.schedule_compaction(key)
+        elif tenant is None and state is not None:
+            # Not resident here: the manifest alone cannot tell the ratio, so let the compactor check
+            self.schedule_compaction(key)
+
+    def schedule_compaction(self, key: Hashable) -> bool:
+        """Compact a tenant's index in the background unless a compaction is already running"""
+        with self._lock:
+            if key in self._compacting:
+                return False
+            self._compacting.add(key)
+        self._compactor.submit(self._compact, key)
+        return True
+
+    def _compact(self, key: Hashable):
+        start = time.perf_counter()
+        try:
+            compacted = self.compact(key)
+            index_compactions.inc(result="compacted" if compacted else "skipped")
+            if compacted:
+                index_compaction_seconds.observe(time.perf_counter() - start)
+        except Exception as e:
+            logger.error(f"Error compacting index of tenant {key}: {str(e)}")
+            index_compactions.inc(result="error")
+        finally:
+            with self._lock:
+                self._compacting.discard(key)
+
+    def compact(self, key: Hashable, min_ratio: Optional[float] = None) -> bool:
+        """Rewrite a tenant's index without tombstoned rows if their share reaches min_ratio"""
+        min_ratio = self.compact_ratio if min_ratio is None else min_ratio
+        if self.segments is not None:
+            # Holding the tenant lock keeps ingestion from publishing over the compacted segment
+            with self.segments.lock(key):
+                opened = self.segments.open(key)
+                if opened is None or not opened[1].catalog.deleted or opened[1].tombstone_ratio < min_ratio:
+                    return False
+                _, index = opened
+                with span("index.compact"):
+                    compacted = index.compact()
+                self.segments.publish(key, compacted)
+            logger.info(f"Compacted index of tenant {key}: {len(index)} -> {len(compacted)} rows")
+            # Resident copies notice the new manifest and remap on their next query
+            return True
+
+        with self._lock:
+            tenant = self._tenants.get(key)
+        if tenant is None:
+            return False
+        # Built under the read lock so queries continue; ingestion waits and cannot be lost
+        with tenant.lock.read():
+            index = tenant.retriever.index
+            if not index.catalog.deleted or index.tombstone_ratio < min_ratio:
+                return False
+            rows, deleted = len(index), index.catalog.deleted_rows
+            with span("index.compact"):
+                compacted = index.compact()
+        with tenant.lock.write():
+            if tenant.retriever.index is not index or len(index) != rows or index.catalog.deleted_rows != deleted:
+                # Changed between the locks; the next delete schedules another compaction
+                return False
+            tenant.retriever.index = compacted
+            tenant.nbytes = compacted.nbytes()
+        logger.info(f"Compacted index of tenant {key}: {rows} -> {len(compacted)} rows")
+        with self._lock:
+            self._update_gauges()
+        return True
+
+    def stats(self) -> dict:
+        with self._lock:
+            tenants = [tenant.stats() for tenant in reversed(self._tenants.values())]
+            return {
+                "memory_budget_bytes": self.memory_budget_bytes,
+                "resident_bytes": self._resident_bytes(),
+                "resident_tenants": len(tenants),
+                "loads": self.loads,
+                "evictions": self.evictions,
+                "tenants": tenants,
+            }
+
+
+_index_manager: Optional[IndexManager] = None
+_index_manager_lock = threading.Lock()
+
+
+def get_index_manager() -> IndexManager:
+    """Process-wide index manager, created on first use"""
+    global _index_manager
+    with _index_manager_lock:
+        if _index_manager is None:
+            _index_manager = IndexManager(segments=SegmentStore() if INDEX_SEGMENTS_ENABLED else None)
+        return _index_manager
@@ -0,0 +1,287 @@
+import json
+import logging
+import os
+import re
+import shutil
+import tempfile
+import time
+from contextlib import contextmanager
+from typing import Hashable, Optional, Tuple
+from uuid import uuid4
+from dotenv import load_dotenv
+
+import numpy as np
+
+from .chunk_store import ChunkStore
+from .index_service import BM25Index, DocumentTable, HybridIndex, VectorIndex
+from .metrics_service import registry, span
+
+try:
+    import fcntl
+except ImportError:  # Windows: publishing falls back to no cross-process lock
+    fcntl = None
+
+# Load environment variables
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Index segment settings
+INDEX_SEGMENTS_DIR = os.getenv("INDEX_SEGMENTS_DIR", os.path.join("cache", "indexes"))
+INDEX_SEGMENTS_KEEP = int(os.getenv("INDEX_SEGMENTS_KEEP", "2"))
+
+SEGMENT_FORMAT = 1
+MANIFEST = "MANIFEST.json"
+
+segment_publishes = registry.counter("deepnote_index_segment_publishes_total", "Index segments published")
+segment_opens = registry.counter("deepnote_index_segment_opens_total", "Index segments memory-mapped")
+
+
+def write_segment(index: HybridIndex, directory: str):
+    """Write an index as an immutable segment directory.
+
+    Layout: vectors.npy (normalized float32 matrix), BM25 postings as
+    terms.txt + offsets/rows/tfs/lengths .npy, chunk texts and JSON metadata as
+    ChunkStore arenas, chunk_ids.npy (database chunk id per row), files.json
+    (the FileCatalog row ranges), aliases.json (rows answering for other files'
+    near-duplicate chunks), deleted.json (tombstoned row ranges and files) and
+    segment.json. The files
+    are written to a temporary directory renamed into place, so a segment is
+    either complete or absent.
+    """
+    parent = os.path.dirname(directory)
+    os.makedirs(parent, exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(dir=parent, prefix=".tmp-")
+    try:
+        matrix = index.vectors.matrix
+        np.save(os.path.join(tmp_dir, "vectors.npy"), np.ascontiguousarray(matrix, dtype=np.float32))
+
+        bm25 = index.bm25
+        terms = bm25.terms()
+        postings = [bm25.postings(term) for term in terms]
+        offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(rows) for rows, _ in postings])
+        rows = np.concatenate([rows for rows, _ in postings]).astype(np.int32) if postings else np.empty(0, np.int32)
+        tfs = np.concatenate([tfs for _, tfs in postings]).astype(np.float32) if postings else np.empty(0, np.float32)
+        with open(os.path.join(tmp_dir, "terms.txt"), "w", encoding="utf-8") as f:
+            f.write("\n".join(terms))
+        np.save(os.path.join(tmp_dir, "term_offsets.npy"), offsets)
+        np.save(os.path.join(tmp_dir, "postings_rows.npy"), rows)
+        np.save(os.path.join(tmp_dir, "postings_tfs.npy"), tfs)
+        np.save(os.path.join(tmp_dir, "doc_lengths.npy"), np.asarray(bm25.doc_lengths, dtype=np.float32))
+
+        # One "page" per row: chunk text and metadata are read back by row from mmapped arenas
+        texts = ChunkStore()
+        metadata = ChunkStore()
+        for row, doc in enumerate(index.documents):
+            texts.add_chunk(texts.add_page(doc.page_content, row), 0, len(doc.page_content))
+            meta = json.dumps(doc.metadata, default=str)
+            metadata.add_chunk(metadata.add_page(meta, row), 0, len(meta))
+        texts.save(os.path.join(tmp_dir, "texts"))
+        metadata.save(os.path.join(tmp_dir, "metadata"))
+        np.save(os.path.join(tmp_dir, "chunk_ids.npy"), index.documents.chunk_ids)
+
+        with open(os.path.join(tmp_dir, "files.json"), "w", encoding="utf-8") as f:
+            json.dump([list(entry) for entry in index.catalog.entries()], f)
+        with open(os.path.join(tmp_dir, "aliases.json"), "w", encoding="utf-8") as f:
+            json.dump([[file_id, rows, file_type, user_id]
+                       for file_id, rows, file_type, user_id in index.catalog.alias_entries()], f)
+        with open(os.path.join(tmp_dir, "deleted.json"), "w", encoding="utf-8") as f:
+            json.dump({
+                "ranges": [list(rows) for rows in index.catalog.deleted],
+                "files": sorted(index.catalog.deleted_files),
+                "tombstoned": sorted(index.catalog.tombstoned_files),
+            }, f)
+        with open(os.path.join(tmp_dir, "segment.json"), "w", encoding="utf-8") as f:
+            json.dump({
+                "format": SEGMENT_FORMAT,
+                "rows": len(index),
+                "dim": int(matrix.shape[1]) if matrix.ndim == 2 else 0,
+                "terms": len(terms),
+                "k1": bm25.k1,
+                "b": bm25.b,
+                "created_at": time.time(),
+            }, f)
+        os.rename(tmp_dir, directory)
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+
+def open_segment(directory: str) -> HybridIndex:
+    """Open a segment with its arrays and text arenas memory-mapped rather than loaded"""
+    with open(os.path.join(directory, "segment.json"), encoding="utf-8") as f:
+        info = json.load(f)
+    if info.get("format") != SEGMENT_FORMAT:
+        raise ValueError(f"Unsupported index segment format in {directory}: {info.get('format')}")
+
+    def load(name: str) -> np.ndarray:
+        path = os.path.join(directory, name)
+        try:
+            return np.load(path, mmap_mode="r")
+        except ValueError:
+            # Zero-length arrays cannot be memory-mapped
+            return np.load(path)
+
+    index = HybridIndex()
+    if info["rows"]:
+        index.vectors = VectorIndex.from_matrix(load("vectors.npy"))
+    with open(os.path.join(directory, "terms.txt"), encoding="utf-8") as f:
+        terms = f.read().split("\n") if info["terms"] else []
+    index.bm25 = BM25Index.from_arrays(
+        terms, load("term_offsets.npy"), load("postings_rows.npy"), load("postings_tfs.npy"),
+        load("doc_lengths.npy"), k1=info["k1"], b=info["b"],
+    )
+    index.documents = DocumentTable(
+        ChunkStore.load(os.path.join(directory, "texts")),
+        ChunkStore.load(os.path.join(directory, "metadata")),
+        # Segments written before chunk ids were recorded leave them unknown
+        load("chunk_ids.npy") if os.path.exists(os.path.join(directory, "chunk_ids.npy")) else None,
+    )
+    with open(os.path.join(directory, "files.json"), encoding="utf-8") as f:
+        for file_id, start, end, file_type, user_id in json.load(f):
+            index.catalog.add(file_id, start, end, file_type, user_id)
+    if os.path.exists(os.path.join(directory, "aliases.json")):
+        with open(os.path.join(directory, "aliases.json"), encoding="utf-8") as f:
+            for file_id, rows, file_type, user_id in json.load(f):
+                index.catalog.add_aliases(file_id, rows, file_type, user_id)
+    if os.path.exists(os.path.join(directory, "deleted.json")):
+        with open(os.path.join(directory, "deleted.json"), encoding="utf-8") as f:
+            deleted = json.load(f)
+        index.catalog.deleted = [tuple(rows) for rows in deleted["ranges"]]
+        index.catalog.deleted_files = set(deleted["files"])
+        index.catalog.tombstoned_files = set(deleted.get("tombstoned", []))
+    index.catalog.grow(info["rows"])
+    segment_opens.inc()
+    return index
+
+
+class SegmentStore:
+    """Versioned index segments per tenant, shared by all worker processes.
+
+    Each tenant directory holds immutable segments/<version>/ directories and a
+    MANIFEST.json naming the current one. Publishing writes a new segment and
+    swaps the manifest with an atomic rename, so workers either see the old or
+    the new version and switch by memory-mapping the new files; pages of a
+    segment are shared between workers through the OS page cache.
+
+    Deleted files are recorded in the manifest (`deleted_files`) rather than
+    by writing a new segment: opening a segment tombstones them, and the next
+    publish (an ingest or a compaction) carries their rows as tombstones or
+    drops them.
+    """
+    def __init__(self, root: str = INDEX_SEGMENTS_DIR, keep: int = INDEX_SEGMENTS_KEEP):
+        self.root = root
+        self.keep = keep
+
+    def _tenant_dir(self, tenant: Hashable) -> str:
+        return os.path.join(self.root, re.sub(r"[^0-9A-Za-z_.-]", "_", str(tenant)))
+
+    def _manifest(self, tenant: Hashable) -> Optional[dict]:
+        try:
+            with open(os.path.join(self._tenant_dir(tenant), MANIFEST), encoding="utf-8") as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return manifest if "version" in manifest else None
+
+    def _write_manifest(self, tenant: Hashable, manifest: dict):
+        tenant_dir = self._tenant_dir(tenant)
+        fd, tmp_path = tempfile.mkstemp(dir=tenant_dir, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, os.path.join(tenant_dir, MANIFEST))
+
+    @staticmethod
+    def _state(manifest: dict) -> str:
+        deleted = manifest.get("deleted_files") or []
+        return f"{manifest['version']}+{len(deleted)}" if deleted else manifest["version"]
+
+    def current_version(self, tenant: Hashable) -> Optional[str]:
+        """Version of the tenant's current segment"""
+        manifest = self._manifest(tenant)
+        return manifest["version"] if manifest else None
+
+    def current_state(self, tenant: Hashable) -> Optional[str]:
+        """Current segment version plus its deletes; changes whenever what a query sees changes"""
+        manifest = self._manifest(tenant)
+        return self._state(manifest) if manifest else None
+
+    def open(self, tenant: Hashable) -> Optional[Tuple[str, HybridIndex]]:
+        """(state, index) of the tenant's current segment with deletes applied, or None if nothing is published"""
+        manifest = self._manifest(tenant)
+        if manifest is None:
+            return None
+        version = manifest["version"]
+        with span("index.segment_open"):
+            try:
+                index = open_segment(os.path.join(self._tenant_dir(tenant), "segments", version))
+            except FileNotFoundError:
+                # Removed by a concurrent cleanup after a newer publish; the caller retries on next use
+                logger.warning(f"Index segment {version} of tenant {tenant} disappeared")
+                return None
+        for file_id in manifest.get("deleted_files") or []:
+            index.delete_file(file_id)
+        return self._state(manifest), index
+
+    def delete_files(self, tenant: Hashable, file_ids) -> Optional[str]:
+        """Tombstone files in the current segment by rewriting only the manifest; returns the new state.
+
+        Call under `lock(tenant)`.
+        """
+        manifest = self._manifest(tenant)
+        if manifest is None:
+            return None
+        deleted = manifest.get("deleted_files") or []
+        manifest["deleted_files"] = deleted + [file_id for file_id in file_ids if file_id not in deleted]
+        self._write_manifest(tenant, manifest)
+        return self._state(manifest)
+
+    @contextmanager
+    def lock(self, tenant: Hashable):
+        """Serialize read-modify-publish cycles of one tenant across processes"""
+        tenant_dir = self._tenant_dir(tenant)
+        os.makedirs(tenant_dir, exist_ok=True)
+        with open(os.path.join(tenant_dir, ".lock"), "w") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def publish(self, tenant: Hashable, index: HybridIndex) -> str:
+        """Write the index as a new segment and make it current"""
+        tenant_dir = self._tenant_dir(tenant)
+        version = f"{time.time_ns():020d}-{uuid4().hex[:8]}"
+        with span("index.segment_publish"):
+            write_segment(index, os.path.join(tenant_dir, "segments", version))
+            # Deletes applied to the index are now part of the segment itself
+            self._write_manifest(tenant, {"version": version, "rows": len(index), "published_at": time.time()})
+        segment_publishes.inc()
+        self.cleanup(tenant)
+        return version
+
+    def unpublish(self, tenant: Hashable):
+        """Remove the manifest so the tenant is rebuilt from the database on next load"""
+        try:
+            os.remove(os.path.join(self._tenant_dir(tenant), MANIFEST))
+        except FileNotFoundError:
+            pass
+
+    def cleanup(self, tenant: Hashable):
+        """Delete all but the newest `keep` segments.
+
+        Workers that still map a deleted segment keep reading it: on POSIX the
+        files stay alive until the last mapping is closed.
+        """
+        segments_dir = os.path.join(self._tenant_dir(tenant), "segments")
+        try:
+            versions = sorted(name for name in os.listdir(segments_dir) if not name.startswith("."))
+        except FileNotFoundError:
+            return
+        current = self.current_version(tenant)
+        for version in versions[:-self.keep] if self.keep else versions:
+            if version != current:
+                shutil.rmtree(os.path.join(segments_dir, version), ignore_errors=True)
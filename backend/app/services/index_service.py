@@ -0,0 +1,683 @@
+import json
+import math
+from collections import Counter, OrderedDict
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+from .chunk_store import ChunkStore
+from .metrics_service import span
+
+# Above this share of selected rows a query scores every row in one pass and
+# masks with the selection bitmap; below it only the selected ranges are scored
+DENSE_SELECTIVITY = 0.3
+# Range-by-range slicing is used for up to this many ranges, fancy indexing beyond
+MAX_SLICED_RANGES = 64
+# Constant of reciprocal rank fusion, as in LangChain's EnsembleRetriever
+RRF_C = 60
+# Batched vector search scores queries in blocks of at most this many (query, row) pairs
+MAX_BATCH_SCORES = 1 << 24
+
+
+class Selection:
+    """Rows a query is restricted to, as sorted, non-overlapping [start, end) ranges"""
+    def __init__(self, ranges: np.ndarray, total: int):
+        self.ranges = ranges
+        self.total = total
+        self.count = int((ranges[:, 1] - ranges[:, 0]).sum()) if len(ranges) else 0
+        self._rows = None
+        self._mask = None
+
+    @property
+    def is_dense(self) -> bool:
+        return self.total > 0 and self.count / self.total >= DENSE_SELECTIVITY
+
+    def rows(self) -> np.ndarray:
+        if self._rows is None:
+            starts, ends = self.ranges[:, 0], self.ranges[:, 1]
+            lengths = ends - starts
+            self._rows = np.arange(self.count, dtype=np.int64) + np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+        return self._rows
+
+    def mask(self) -> np.ndarray:
+        """Bitmap over all rows of the index"""
+        if self._mask is None:
+            self._mask = np.zeros(self.total, dtype=bool)
+            for start, end in self.ranges:
+                self._mask[start:end] = True
+        return self._mask
+
+
+class FileCatalog:
+    """Row ranges and attributes of every file in an index.
+
+    Chunks of a file are appended together, or in a few micro-batches while
+    it is streamed in, so each file is one or a few contiguous row ranges and
+    any filter on file id, type or user resolves to a handful of ranges.
+    Resolved selections (with their bitmaps) are cached per filter, since
+    notebook queries repeat the same file set.
+
+    Chunks that near-duplicate a chunk of another file have no rows of their
+    own (they are never embedded); the file instead has `aliases`, the rows of
+    the canonical chunks, so filtering on the file still matches its content.
+    Aliases of a file that is deleted are dropped without tombstoning the
+    rows, and aliased rows that are tombstoned stop matching.
+
+    Deleting a file only moves its ranges to `deleted` (tombstones): filtered
+    selections no longer match it, and unfiltered queries are restricted to
+    the live rows, until the index is compacted. Rows added later for a
+    deleted file (a micro-batch still in flight) are tombstoned on arrival.
+    Compaction forgets the deleted files whose rows it removed
+    (`tombstoned_files`); an ingest that finds its file deleted tombstones
+    anything it indexed after that itself.
+    """
+    def __init__(self, cache_size: int = 256):
+        self.files: Dict[int, Tuple[List[Tuple[int, int]], Optional[str], Optional[int]]] = {}
+        self.aliases: Dict[int, Tuple[List[int], Optional[str], Optional[int]]] = {}
+        self.deleted: List[Tuple[int, int]] = []
+        self.deleted_files = set()
+        self.tombstoned_files = set()
+        self.total = 0
+        self.cache_size = cache_size
+        self._selections: "OrderedDict[tuple, Selection]" = OrderedDict()
+
+    def add(self, file_id: int, start: int, end: int, file_type: Optional[str] = None, user_id: Optional[int] = None):
+        """Record rows [start, end) of a file, extending its last range when they follow on"""
+        entry = self.files.get(file_id)
+        if file_id in self.deleted_files:
+            self.deleted.append((start, end))
+            self.tombstoned_files.add(file_id)
+        elif entry is None:
+            self.files[file_id] = ([(start, end)], file_type, user_id)
+        elif entry[0][-1][1] == start:
+            entry[0][-1] = (entry[0][-1][0], end)
+        else:
+            entry[0].append((start, end))
+        self.total = max(self.total, end)
+        self._selections.clear()
+
+    def add_aliases(self, file_id: int, rows: Iterable[int], file_type: Optional[str] = None,
+                    user_id: Optional[int] = None):
+        """Let a file's filter match rows of other files that its duplicate chunks point at"""
+        if file_id in self.deleted_files:
+            return
+        entry = self.aliases.setdefault(file_id, ([], file_type, user_id))
+        entry[0].extend(int(row) for row in rows)
+        self._selections.clear()
+
+    def alias_entries(self) -> Iterator[Tuple[int, List[int], Optional[str], Optional[int]]]:
+        """(file_id, aliased rows, file_type, user_id) of every file with aliases"""
+        for file_id, (rows, file_type, user_id) in self.aliases.items():
+            yield file_id, rows, file_type, user_id
+
+    def remove(self, file_id: int, replacing: bool = False) -> int:
+        """Tombstone a file's rows, returning how many there were.
+
+        With `replacing` the file is not recorded as deleted, so rows added
+        for it afterwards (its re-indexed chunks) stay live.
+        """
+        if not replacing:
+            self.deleted_files.add(file_id)
+        if self.aliases.pop(file_id, None) is not None:
+            self._selections.clear()
+        entry = self.files.pop(file_id, None)
+        if entry is None:
+            return 0
+        self.deleted.extend(entry[0])
+        if not replacing:
+            self.tombstoned_files.add(file_id)
+        self._selections.clear()
+        return sum(end - start for start, end in entry[0])
+
+    @property
+    def deleted_rows(self) -> int:
+        return sum(end - start for start, end in self.deleted)
+
+    def tombstones(self) -> np.ndarray:
+        """Bitmap of deleted rows"""
+        mask = np.zeros(self.total, dtype=bool)
+        for start, end in self.deleted:
+            mask[start:end] = True
+        return mask
+
+    def entries(self) -> Iterator[Tuple[int, int, int, Optional[str], Optional[int]]]:
+        """(file_id, start, end, file_type, user_id) of every row range"""
+        for file_id, (ranges, file_type, user_id) in self.files.items():
+            for start, end in ranges:
+                yield file_id, start, end, file_type, user_id
+
+    def grow(self, total: int):
+        """Account for rows added without a file"""
+        if total != self.total:
+            self.total = total
+            self._selections.clear()
+
+    def select(self, file_ids: Optional[Iterable[int]] = None, file_types: Optional[Iterable[str]] = None,
+               user_id: Optional[int] = None) -> Optional[Selection]:
+        """Selection matching all given filters, or None when nothing is filtered or deleted"""
+        unfiltered = file_ids is None and file_types is None and user_id is None
+        if unfiltered and not self.deleted:
+            return None
+        key = (
+            frozenset(file_ids) if file_ids is not None else None,
+            frozenset(file_types) if file_types is not None else None,
+            user_id,
+        )
+        selection = self._selections.get(key)
+        if selection is not None:
+            self._selections.move_to_end(key)
+            return selection
+
+        if unfiltered:
+            # Everything but the tombstones, including rows that belong to no file
+            ranges, start = [], 0
+            for deleted_start, deleted_end in sorted(self.deleted):
+                if deleted_start > start:
+                    ranges.append((start, deleted_start))
+                start = max(start, deleted_end)
+            if start < self.total:
+                ranges.append((start, self.total))
+            return self._cache(key, ranges)
+
+        wanted_ids, wanted_types, _ = key
+
+        def wanted(file_id, file_type, owner) -> bool:
+            return ((wanted_ids is None or file_id in wanted_ids)
+                    and (wanted_types is None or file_type in wanted_types)
+                    and (user_id is None or owner == user_id))
+
+        ranges = [
+            (start, end)
+            for file_id, start, end, file_type, owner in self.entries()
+            if wanted(file_id, file_type, owner) and end > start
+        ]
+        aliased = [rows for file_id, rows, file_type, owner in self.alias_entries() if wanted(file_id, file_type, owner)]
+        if aliased:
+            rows = np.unique(np.concatenate([np.asarray(rows, dtype=np.int64) for rows in aliased]))
+            if self.deleted:
+                rows = rows[~self.tombstones()[rows]]
+            ranges.extend((row, row + 1) for row in rows.tolist())
+        return self._cache(key, sorted(ranges))
+
+    def _cache(self, key: tuple, ranges: List[Tuple[int, int]]) -> Selection:
+        """Selection of sorted ranges (merging adjacent and overlapping ones), cached under a filter key"""
+        merged: List[List[int]] = []
+        for start, end in ranges:
+            if merged and merged[-1][1] >= start:
+                merged[-1][1] = max(merged[-1][1], end)
+            else:
+                merged.append([start, end])
+
+        selection = Selection(np.array(merged, dtype=np.int64).reshape(-1, 2), self.total)
+        self._selections[key] = selection
+        if len(self._selections) > self.cache_size:
+            self._selections.popitem(last=False)
+        return selection
+
+
+def heap_nbytes(array: np.ndarray) -> int:
+    """Bytes an array holds on the heap; memory-mapped arrays live in the shared page cache"""
+    return 0 if isinstance(array, np.memmap) else array.nbytes
+
+
+def top_k(rows: np.ndarray, scores: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Best k (row, score) pairs, highest score first"""
+    if len(scores) > k:
+        best = np.argpartition(-scores, k - 1)[:k]
+    else:
+        best = np.arange(len(scores))
+    best = best[np.argsort(-scores[best], kind="stable")]
+    return rows[best], scores[best]
+
+
+def top_k_rows(scores: np.ndarray, k: int) -> np.ndarray:
+    """Column positions of the best k scores in every row of a (queries x rows) matrix, best first"""
+    if scores.shape[1] > k:
+        best = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    else:
+        best = np.broadcast_to(np.arange(scores.shape[1]), scores.shape)
+    order = np.argsort(-np.take_along_axis(scores, best, axis=1), axis=1, kind="stable")
+    return np.take_along_axis(best, order, axis=1)
+
+
+class VectorIndex:
+    """Cosine similarity search over a float32 matrix of normalized embeddings"""
+    def __init__(self):
+        self._blocks: List[np.ndarray] = []
+        self._matrix: Optional[np.ndarray] = None
+
+    @classmethod
+    def from_matrix(cls, matrix: np.ndarray) -> "VectorIndex":
+        """Index over an already normalized (possibly memory-mapped) matrix"""
+        index = cls()
+        index._matrix = matrix
+        return index
+
+    def __len__(self) -> int:
+        return sum(len(block) for block in self._blocks) if self._matrix is None else len(self._matrix)
+
+    def add(self, vectors: Sequence[Sequence[float]]):
+        block = np.asarray(vectors, dtype=np.float32)
+        if block.size == 0:
+            return
+        norms = np.linalg.norm(block, axis=1, keepdims=True)
+        block /= np.where(norms == 0, 1, norms)
+        if self._matrix is not None:
+            self._blocks = [self._matrix]
+            self._matrix = None
+        self._blocks.append(block)
+
+    @property
+    def matrix(self) -> np.ndarray:
+        if self._matrix is None:
+            self._matrix = np.vstack(self._blocks) if self._blocks else np.empty((0, 0), dtype=np.float32)
+            self._blocks = []
+        return self._matrix
+
+    def nbytes(self) -> int:
+        if self._matrix is not None:
+            return heap_nbytes(self._matrix)
+        return sum(block.nbytes for block in self._blocks)
+
+    def scores(self, query: Sequence[float], selection: Optional[Selection] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """(rows, cosine scores) of every row in the selection"""
+        matrix = self.matrix
+        q = np.asarray(query, dtype=np.float32)
+        q /= np.linalg.norm(q) or 1.0
+
+        if selection is None:
+            return np.arange(len(matrix)), matrix @ q
+        if selection.count == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        if selection.is_dense:
+            rows = selection.rows()
+            return rows, (matrix @ q)[rows]
+        if len(selection.ranges) <= MAX_SLICED_RANGES:
+            # Contiguous slices are views, so only the selected rows are read
+            scores = np.concatenate([matrix[start:end] @ q for start, end in selection.ranges])
+            return selection.rows(), scores
+        rows = selection.rows()
+        return rows, matrix[rows] @ q
+
+    def search(self, query: Sequence[float], k: int = 5, selection: Optional[Selection] = None):
+        return top_k(*self.scores(query, selection), k)
+
+    def search_many(self, queries: Sequence[Sequence[float]], k: int = 5,
+                    selection: Optional[Selection] = None, with_scores: bool = False) -> list:
+        """Top-k rows of many queries, scored with one matrix-matrix product per block of queries.
+
+        The selected rows are gathered once for all queries instead of once per
+        query; blocks keep the score matrix under MAX_BATCH_SCORES entries.
+        With `with_scores`, each result is a (rows, cosine scores) pair.
+        """
+        if not len(queries):
+            return []
+        matrix = self.matrix
+        q = np.asarray(queries, dtype=np.float32).reshape(len(queries), -1)
+        norms = np.linalg.norm(q, axis=1, keepdims=True)
+        q /= np.where(norms == 0, 1, norms)
+
+        if not len(matrix) or (selection is not None and selection.count == 0):
+            empty = np.empty(0, dtype=np.int64)
+            return [(empty, np.empty(0, dtype=np.float32)) if with_scores else empty for _ in range(len(q))]
+        rows = None
+        candidates = matrix
+        if selection is not None:
+            rows = selection.rows()
+            if not selection.is_dense:
+                candidates = (np.concatenate([matrix[start:end] for start, end in selection.ranges])
+                              if len(selection.ranges) <= MAX_SLICED_RANGES else matrix[rows])
+
+        results = []
+        block = max(1, MAX_BATCH_SCORES // len(candidates))
+        for start in range(0, len(q), block):
+            scores = q[start:start + block] @ candidates.T
+            if rows is not None and candidates is matrix:
+                scores = scores[:, rows]
+            best = top_k_rows(scores, k)
+            best_rows = rows[best] if rows is not None else best
+            if with_scores:
+                results.extend(zip(best_rows, np.take_along_axis(scores, best, axis=1)))
+            else:
+                results.extend(best_rows)
+        return results
+
+
+class BM25Index:
+    """Okapi BM25 over postings lists whose row ids are kept in ascending order.
+
+    Postings either live in memory or come from a memory-mapped segment (see
+    index_segments); rows added on top of a segment are kept in memory and
+    override the segment's postings for the terms they touch.
+    """
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._pending: Dict[str, Tuple[List[int], List[int]]] = {}
+        self._postings: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        # Segment postings: term -> (start, end) into the concatenated row and tf arrays
+        self._base_terms: Dict[str, Tuple[int, int]] = {}
+        self._base_rows = np.empty(0, dtype=np.int32)
+        self._base_tfs = np.empty(0, dtype=np.float32)
+        self._base_lengths = np.empty(0, dtype=np.float32)
+        self._lengths: List[int] = []
+        self.doc_lengths = np.empty(0, dtype=np.float32)
+        self.avg_length = 0.0
+
+    @classmethod
+    def from_arrays(cls, terms: List[str], offsets: np.ndarray, rows: np.ndarray, tfs: np.ndarray,
+                    doc_lengths: np.ndarray, k1: float = 1.5, b: float = 0.75) -> "BM25Index":
+        """Index over (possibly memory-mapped) concatenated postings; offsets has len(terms) + 1 entries"""
+        index = cls(k1, b)
+        index._base_terms = {term: (int(offsets[i]), int(offsets[i + 1])) for i, term in enumerate(terms)}
+        index._base_rows = rows
+        index._base_tfs = tfs
+        index._base_lengths = doc_lengths
+        index.doc_lengths = doc_lengths
+        index.avg_length = float(doc_lengths.mean()) if len(doc_lengths) else 0.0
+        return index
+
+    def __len__(self) -> int:
+        return len(self._base_lengths) + len(self._lengths)
+
+    def add(self, token_lists: Iterable[List[str]]):
+        for tokens in token_lists:
+            row = len(self)
+            self._lengths.append(len(tokens))
+            for term, tf in Counter(tokens).items():
+                rows, tfs = self._pending.setdefault(term, ([], []))
+                rows.append(row)
+                tfs.append(tf)
+
+    def postings(self, term: str) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """(rows, term frequencies) of a term"""
+        postings = self._postings.get(term)
+        if postings is not None:
+            return postings
+        bounds = self._base_terms.get(term)
+        if bounds is not None:
+            return self._base_rows[bounds[0]:bounds[1]], self._base_tfs[bounds[0]:bounds[1]]
+        return None
+
+    def terms(self) -> List[str]:
+        self._freeze()
+        return sorted(set(self._base_terms) | set(self._postings))
+
+    def _freeze(self):
+        if not self._pending and len(self.doc_lengths) == len(self):
+            return
+        for term, (rows, tfs) in self._pending.items():
+            new_rows = np.asarray(rows, dtype=np.int64)
+            new_tfs = np.asarray(tfs, dtype=np.float32)
+            existing = self.postings(term)
+            if existing is not None:
+                # New rows are always larger, so appending keeps the postings sorted
+                new_rows = np.concatenate([existing[0], new_rows])
+                new_tfs = np.concatenate([existing[1], new_tfs])
+            self._postings[term] = (new_rows, new_tfs)
+        self._pending = {}
+        if self._lengths:
+            self.doc_lengths = np.concatenate([self._base_lengths, np.asarray(self._lengths, dtype=np.float32)])
+        else:
+            self.doc_lengths = self._base_lengths
+        self.avg_length = float(self.doc_lengths.mean()) if len(self.doc_lengths) else 0.0
+
+    def compacted(self, keep: np.ndarray, remap: np.ndarray) -> "BM25Index":
+        """Index over the rows in `keep` only, renumbered through `remap` (-1 for dropped rows)"""
+        self._freeze()
+        index = BM25Index(self.k1, self.b)
+        for term in self.terms():
+            rows, tfs = self.postings(term)
+            new_rows = remap[rows]
+            live = new_rows >= 0
+            if live.any():
+                # Renumbering preserves order, so the postings stay sorted
+                index._postings[term] = (new_rows[live], np.asarray(tfs[live], dtype=np.float32))
+        index._base_lengths = np.asarray(self.doc_lengths[keep], dtype=np.float32)
+        index.doc_lengths = index._base_lengths
+        index.avg_length = float(index.doc_lengths.mean()) if len(index.doc_lengths) else 0.0
+        return index
+
+    def nbytes(self) -> int:
+        """Approximate heap size; memory-mapped segment arrays are shared and not counted"""
+        self._freeze()
+        postings = sum(heap_nbytes(rows) + heap_nbytes(tfs) + len(term) + 100
+                       for term, (rows, tfs) in self._postings.items())
+        base_terms = sum(len(term) + 100 for term in self._base_terms)
+        return postings + base_terms + heap_nbytes(self.doc_lengths) + len(self._lengths) * 8
+
+    def _restrict(self, rows: np.ndarray, selection: Selection) -> np.ndarray:
+        """Positions of the postings entries that fall inside the selection"""
+        if selection.is_dense:
+            return np.flatnonzero(selection.mask()[rows])
+        lo = np.searchsorted(rows, selection.ranges[:, 0], side="left")
+        hi = np.searchsorted(rows, selection.ranges[:, 1], side="left")
+        lengths = hi - lo
+        # Concatenated aranges lo[i]..hi[i] without a Python loop
+        offsets = np.repeat(lo - np.cumsum(lengths) + lengths, lengths)
+        return np.arange(int(lengths.sum())) + offsets
+
+    def _term_scores(self, term: str, selection: Optional[Selection]) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """(rows, BM25 score contributions at query tf 1) of one term within the selection"""
+        postings = self.postings(term)
+        if postings is None:
+            return None
+        rows, tfs = postings
+        idf = math.log(1 + (len(self.doc_lengths) - len(rows) + 0.5) / (len(rows) + 0.5))
+        if selection is not None:
+            keep = self._restrict(rows, selection)
+            rows, tfs = rows[keep], tfs[keep]
+        if not len(rows):
+            return None
+        norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[rows] / self.avg_length)
+        return rows, idf * tfs * (self.k1 + 1) / (tfs + norm)
+
+    @staticmethod
+    def _combine(terms: List[str], term_scores) -> Tuple[np.ndarray, np.ndarray]:
+        matched_rows = []
+        matched_scores = []
+        for term, query_tf in Counter(terms).items():
+            scored = term_scores(term)
+            if scored is not None:
+                matched_rows.append(scored[0])
+                matched_scores.append(query_tf * scored[1])
+        if not matched_rows:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        rows, inverse = np.unique(np.concatenate(matched_rows), return_inverse=True)
+        return rows, np.bincount(inverse, weights=np.concatenate(matched_scores)).astype(np.float32)
+
+    def scores(self, terms: List[str], selection: Optional[Selection] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """(rows, BM25 scores) of the selected rows that match at least one term"""
+        self._freeze()
+        return self._combine(terms, lambda term: self._term_scores(term, selection))
+
+    def search(self, terms: List[str], k: int = 5, selection: Optional[Selection] = None):
+        return top_k(*self.scores(terms, selection), k)
+
+    def search_many(self, term_lists: List[List[str]], k: int = 5,
+                    selection: Optional[Selection] = None) -> List[np.ndarray]:
+        """Top-k rows of many queries; each distinct term's postings are restricted and scored once"""
+        self._freeze()
+        cache: Dict[str, Optional[Tuple[np.ndarray, np.ndarray]]] = {}
+
+        def term_scores(term: str):
+            if term not in cache:
+                cache[term] = self._term_scores(term, selection)
+            return cache[term]
+
+        return [top_k(*self._combine(terms, term_scores), k)[0] for terms in term_lists]
+
+
+def weighted_rrf(rankings: List[List[Document]], weights: Sequence[float], c: int = RRF_C) -> List[Document]:
+    """Weighted reciprocal rank fusion, deduplicating documents by content like EnsembleRetriever"""
+    scores: Dict[str, float] = {}
+    documents: Dict[str, Document] = {}
+    for ranking, weight in zip(rankings, weights):
+        for rank, doc in enumerate(ranking, start=1):
+            scores[doc.page_content] = scores.get(doc.page_content, 0.0) + weight / (rank + c)
+            documents.setdefault(doc.page_content, doc)
+    return [documents[key] for key in sorted(scores, key=scores.get, reverse=True)]
+
+
+class DocumentTable:
+    """Chunk Documents by row.
+
+    Rows come from an optional segment, whose texts and JSON metadata are
+    memory-mapped ChunkStores, followed by Documents appended in memory. The
+    database chunk id of every row (-1 if unknown) is kept as an array so
+    ingestion can skip chunks an index already holds.
+    """
+    def __init__(self, texts: Optional[ChunkStore] = None, metadata: Optional[ChunkStore] = None,
+                 chunk_ids: Optional[np.ndarray] = None):
+        self.texts = texts
+        self.metadata = metadata
+        self._base_count = len(texts) if texts is not None else 0
+        self._base_chunk_ids = chunk_ids if chunk_ids is not None else np.full(self._base_count, -1, dtype=np.int64)
+        self._documents: List[Document] = []
+        self._chunk_ids: List[int] = []
+
+    def __len__(self) -> int:
+        return self._base_count + len(self._documents)
+
+    def __getitem__(self, row: int) -> Document:
+        if row < self._base_count:
+            return Document(
+                page_content=self.texts.raw_chunk_text(row),
+                metadata=json.loads(self.metadata.raw_chunk_text(row)),
+            )
+        return self._documents[row - self._base_count]
+
+    def __iter__(self) -> Iterator[Document]:
+        for row in range(len(self)):
+            yield self[row]
+
+    def extend(self, documents: Iterable[Document], chunk_ids: Optional[Iterable[int]] = None):
+        if chunk_ids is not None:
+            for doc, chunk_id in zip(documents, chunk_ids):
+                self._documents.append(doc)
+                self._chunk_ids.append(int(chunk_id))
+            return
+        for doc in documents:
+            self._documents.append(doc)
+            self._chunk_ids.append(doc.metadata.get("chunk_id", -1))
+
+    @property
+    def chunk_ids(self) -> np.ndarray:
+        if not self._chunk_ids:
+            return self._base_chunk_ids
+        return np.concatenate([self._base_chunk_ids, np.asarray(self._chunk_ids, dtype=np.int64)])
+
+    def nbytes(self) -> int:
+        return sum(len(doc.page_content) + 208 for doc in self._documents) + heap_nbytes(self._base_chunk_ids)
+
+
+class HybridIndex:
+    """Chunks with a vector index and a BM25 index over the same rows.
+
+    Filters on file id, file type and user are resolved through the FileCatalog
+    and applied inside both scoring loops, so a restricted query only scores
+    the rows it may return.
+    """
+    def __init__(self):
+        self.documents = DocumentTable()
+        self.catalog = FileCatalog()
+        self.vectors = VectorIndex()
+        self.bm25 = BM25Index()
+
+    def __len__(self) -> int:
+        return len(self.documents)
+
+    def add_file(self, documents: List[Document], vectors: Sequence[Sequence[float]], token_lists: List[List[str]],
+                 file_id: Optional[int] = None, file_type: Optional[str] = None, user_id: Optional[int] = None):
+        if not (len(documents) == len(vectors) == len(token_lists)):
+            raise ValueError("documents, vectors and token lists must have the same length")
+        start = len(self.documents)
+        self.documents.extend(documents)
+        self.vectors.add(vectors)
+        self.bm25.add(token_lists)
+        if file_id is not None:
+            self.catalog.add(file_id, start, len(self.documents), file_type, user_id)
+        else:
+            self.catalog.grow(len(self.documents))
+
+    def add_aliases(self, file_id: int, chunk_ids: Sequence[int], file_type: Optional[str] = None,
+                    user_id: Optional[int] = None) -> int:
+        """Make the rows of the given canonical chunk ids match filters on a file, returning how many were found"""
+        rows = np.flatnonzero(np.isin(self.documents.chunk_ids, np.asarray(chunk_ids, dtype=np.int64)))
+        if len(rows):
+            self.catalog.add_aliases(file_id, rows, file_type, user_id)
+        return len(rows)
+
+    def delete_file(self, file_id: int, replacing: bool = False) -> int:
+        """Tombstone a file's rows; queries skip them at once and compaction drops them"""
+        return self.catalog.remove(file_id, replacing)
+
+    @property
+    def tombstone_ratio(self) -> float:
+        return self.catalog.deleted_rows / len(self) if len(self) else 0.0
+
+    def compact(self) -> "HybridIndex":
+        """Copy of the index without tombstoned rows, with rows and file ranges renumbered"""
+        keep = np.flatnonzero(~self.catalog.tombstones()[:len(self)])
+        remap = np.full(len(self), -1, dtype=np.int64)
+        remap[keep] = np.arange(len(keep))
+
+        index = HybridIndex()
+        chunk_ids = self.documents.chunk_ids
+        index.documents.extend((self.documents[row] for row in keep), chunk_ids[keep])
+        matrix = self.vectors.matrix
+        if len(matrix):
+            index.vectors = VectorIndex.from_matrix(np.ascontiguousarray(matrix[keep]))
+        index.bm25 = self.bm25.compacted(keep, remap)
+        # Deleted files whose rows are dropped here are forgotten (an ingest still running re-tombstones
+        # its own late rows); files deleted before any of their rows arrived stay listed
+        index.catalog.deleted_files = self.catalog.deleted_files - self.catalog.tombstoned_files
+        # Rows of a live range are all kept, so each range maps onto a contiguous range
+        for file_id, start, end, file_type, user_id in self.catalog.entries():
+            if end > start:
+                new_start = int(remap[start])
+                index.catalog.add(file_id, new_start, new_start + end - start, file_type, user_id)
+        for file_id, rows, file_type, user_id in self.catalog.alias_entries():
+            new_rows = remap[np.asarray(rows, dtype=np.int64)]
+            index.catalog.add_aliases(file_id, new_rows[new_rows >= 0], file_type, user_id)
+        index.catalog.grow(len(keep))
+        return index
+
+    def contains_chunks(self, chunk_ids: Sequence[int]) -> np.ndarray:
+        """Mask of the given database chunk ids that already have a row"""
+        return np.isin(np.asarray(chunk_ids, dtype=np.int64), self.documents.chunk_ids)
+
+    def nbytes(self) -> int:
+        """Approximate resident size, used to keep tenants under the index memory budget"""
+        return self.documents.nbytes() + self.vectors.nbytes() + self.bm25.nbytes()
+
+    def select(self, **filters) -> Optional[Selection]:
+        return self.catalog.select(**filters)
+
+    def vector_search(self, query_vector: Sequence[float], k: int = 5,
+                      selection: Optional[Selection] = None, with_scores: bool = False):
+        """Nearest chunks, or (chunks, cosine scores) with `with_scores`"""
+        with span("index.vector_search", filtered=str(selection is not None).lower()):
+            rows, scores = self.vectors.search(query_vector, k, selection)
+        documents = [self.documents[row] for row in rows]
+        return (documents, scores.tolist()) if with_scores else documents
+
+    def bm25_search(self, terms: List[str], k: int = 5, selection: Optional[Selection] = None) -> List[Document]:
+        with span("index.bm25_search", filtered=str(selection is not None).lower()):
+            rows, _ = self.bm25.search(terms, k, selection)
+        return [self.documents[row] for row in rows]
+
+    def vector_search_many(self, query_vectors: Sequence[Sequence[float]], k: int = 5,
+                           selection: Optional[Selection] = None, with_scores: bool = False) -> list:
+        with span("index.vector_search_batch", filtered=str(selection is not None).lower()):
+            results = self.vectors.search_many(query_vectors, k, selection, with_scores=with_scores)
+        if with_scores:
+            return [([self.documents[row] for row in rows], scores.tolist()) for rows, scores in results]
+        return [[self.documents[row] for row in rows] for rows in results]
+
+    def bm25_search_many(self, term_lists: List[List[str]], k: int = 5,
+                         selection: Optional[Selection] = None) -> List[List[Document]]:
+        with span("index.bm25_search_batch", filtered=str(selection is not None).lower()):
+            results = self.bm25.search_many(term_lists, k, selection)
+        return [[self.documents[row] for row in rows] for rows in results]
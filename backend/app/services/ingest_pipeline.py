@@ -0,0 +1,210 @@
+import contextvars
+import logging
+import os
+import queue
+import threading
+import time
+from typing import Callable, Iterable, Iterator, List, Optional
+from dotenv import load_dotenv
+
+from langchain_core.documents import Document
+
+from .dedup_service import Deduplicator, SimHashIndex, is_duplicate
+from .metrics_service import registry, span
+from .profiling_service import profiled
+
+# Load environment variables
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Streaming ingestion settings
+INGEST_QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", "8"))
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "32"))
+# Minimum interval between index publishes of one file's micro-batches
+INGEST_PUBLISH_SECONDS = float(os.getenv("INGEST_PUBLISH_SECONDS", "2.0"))
+
+ingest_batches = registry.counter("deepnote_ingest_batches_total", "Chunk micro-batches stored by streaming ingestion")
+ingest_first_batch_seconds = registry.histogram(
+    "deepnote_ingest_first_batch_seconds", "Time from the start of ingestion until the first chunks are stored",
+    buckets=(0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+)
+
+_DONE = object()
+
+# Receives each micro-batch of chunks with their vectors (None for duplicates)
+StoreBatch = Callable[[List[Document], List[Optional[List[float]]]], None]
+
+
+class IngestStats:
+    """Counters of one pipeline run"""
+    def __init__(self):
+        self.pages = 0
+        self.chunks = 0
+        self.duplicates = 0
+        self.batches = 0
+        self.dedup_ratio = 0.0
+        self.first_batch_seconds: Optional[float] = None
+        self.seconds = 0.0
+        self.cancelled = False
+
+
+class IngestPipeline:
+    """Streams a source through extract, split, clean/dedupe, embed and store stages.
+
+    Every stage but the last runs in its own thread and hands items to the
+    next through a bounded queue, so extraction of later pages overlaps with
+    embedding and storing earlier ones, and a slow stage blocks its producers
+    instead of letting pages pile up: peak memory depends on the queue and
+    batch sizes, not on the size of the file. Chunks reach `store` in
+    micro-batches of `batch_size`, in the calling thread, so they can be
+    committed and made searchable while the rest of the file is processed.
+    An error in any stage stops all of them and is raised from `run`;
+    `cancel` (e.g. from `store`, once the file is deleted) stops them too.
+    """
+    def __init__(self, processor, store: StoreBatch, embeddings=None, dedup_index: Optional[SimHashIndex] = None,
+                 batch_size: int = INGEST_BATCH_SIZE, queue_size: int = INGEST_QUEUE_SIZE):
+        self.processor = processor
+        self.store = store
+        self.embeddings = embeddings
+        self.deduplicator = Deduplicator(dedup_index)
+        self.batch_size = batch_size
+        self.queue_size = queue_size
+        self._cancelled = threading.Event()
+        self._errors: List[BaseException] = []
+
+    def cancel(self):
+        """Stop every stage; `run` returns the stats of the batches stored so far, marked cancelled"""
+        self._cancelled.set()
+
+    def _put(self, outbox: queue.Queue, item) -> bool:
+        """Put with backpressure; False once the pipeline is cancelled"""
+        while not self._cancelled.is_set():
+            try:
+                outbox.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _drain(self, inbox: queue.Queue) -> Iterator:
+        while not self._cancelled.is_set():
+            try:
+                item = inbox.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            if item is _DONE:
+                return
+            yield item
+
+    @profiled("ingest.stage")
+    def _feed(self, items: Iterable, outbox: queue.Queue):
+        """Thread body: move a stage's output into the next stage's queue"""
+        try:
+            for item in items:
+                if not self._put(outbox, item):
+                    return
+        except BaseException as e:
+            self._errors.append(e)
+            self._cancelled.set()
+        finally:
+            self._put(outbox, _DONE)
+
+    def _extract(self, pages: Iterable[Document], file_type: str, stats: IngestStats) -> Iterator[Document]:
+        pages = iter(pages)
+        while True:
+            with span("ingest.extract", file_type=file_type):
+                page = next(pages, None)
+            if page is None:
+                return
+            stats.pages += 1
+            yield page
+
+    def _split(self, pages: Iterable[Document], file_type: str) -> Iterator[List[Document]]:
+        for page in pages:
+            with span("ingest.split", file_type=file_type):
+                chunks = self.processor.split_page(page)
+            if chunks:
+                yield chunks
+
+    def _clean(self, chunk_lists: Iterable[List[Document]], file_type: str) -> Iterator[List[Document]]:
+        for chunks in chunk_lists:
+            with span("ingest.clean", file_type=file_type):
+                chunks = self.processor.clean_chunks(chunks)
+            with span("ingest.dedupe", file_type=file_type):
+                for doc in chunks:
+                    self.deduplicator.mark(doc)
+            if chunks:
+                yield chunks
+
+    def _embed(self, chunk_lists: Iterable[List[Document]], file_type: str) -> Iterator[tuple]:
+        batch: List[Document] = []
+        for chunks in chunk_lists:
+            batch.extend(chunks)
+            while len(batch) >= self.batch_size:
+                yield self._embed_batch(batch[:self.batch_size], file_type)
+                batch = batch[self.batch_size:]
+        if batch:
+            yield self._embed_batch(batch, file_type)
+
+    def _embed_batch(self, batch: List[Document], file_type: str) -> tuple:
+        """(chunks, vectors) with vectors only for canonical chunks; duplicates are never embedded"""
+        vectors: List[Optional[List[float]]] = [None] * len(batch)
+        if self.embeddings is not None:
+            positions = [i for i, doc in enumerate(batch) if not is_duplicate(doc)]
+            if positions:
+                with span("ingest.embed", file_type=file_type):
+                    embedded = self.embeddings.embed_documents([batch[i].page_content for i in positions])
+                for i, vector in zip(positions, embedded):
+                    vectors[i] = vector
+        return batch, vectors
+
+    @profiled("ingest.run")
+    def run(self, pages: Iterable[Document], file_type: str) -> IngestStats:
+        """Ingest a page stream, returning once every chunk has been stored"""
+        stats = IngestStats()
+        start = time.perf_counter()
+        self._cancelled.clear()
+        self._errors = []
+        self.deduplicator.reset()
+
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in range(4)]
+        stages = [
+            self._extract(pages, file_type, stats),
+            self._split(self._drain(queues[0]), file_type),
+            self._clean(self._drain(queues[1]), file_type),
+            self._embed(self._drain(queues[2]), file_type),
+        ]
+        threads = [
+            # Stage threads run in the caller's context, so a profiled request profiles them too
+            threading.Thread(target=contextvars.copy_context().run, args=(self._feed, stage, outbox),
+                             name=f"ingest-{name}", daemon=True)
+            for name, stage, outbox in zip(("extract", "split", "clean", "embed"), stages, queues)
+        ]
+        for thread in threads:
+            thread.start()
+
+        try:
+            for batch, vectors in self._drain(queues[3]):
+                with span("ingest.store", file_type=file_type):
+                    self.store(batch, vectors)
+                stats.batches += 1
+                stats.chunks += len(batch)
+                ingest_batches.inc()
+                if stats.first_batch_seconds is None:
+                    stats.first_batch_seconds = time.perf_counter() - start
+                    ingest_first_batch_seconds.observe(stats.first_batch_seconds)
+        except BaseException as e:
+            self._errors.append(e)
+            self._cancelled.set()
+        finally:
+            for thread in threads:
+                thread.join()
+
+        if self._errors:
+            raise self._errors[0]
+        stats.cancelled = self._cancelled.is_set()
+        stats.duplicates = self.deduplicator.duplicates
+        stats.dedup_ratio = self.deduplicator.finish()
+        stats.seconds = time.perf_counter() - start
+        return stats
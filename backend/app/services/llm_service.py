@@ -1,11 +1,61 @@
+import logging
+import os
 import re
-from typing import List
-
+import threading
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+from dotenv import load_dotenv
 
 from langchain_core.documents import Document
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_ollama.llms import OllamaLLM
-from langchain_text_splitters import TextSplitter
+
+from .metrics_service import registry, span, record_llm_generation
+from .profiling_service import profiled
+
+# Load environment variables
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Model cascade settings
+# Easy questions go to the fast model, the rest to the reasoning model; no fast model disables routing.
+# Off by default, as the fast model has to be pulled on the model server first
+LLM_REASONING_MODEL = os.getenv("LLM_REASONING_MODEL", "deepseek-r1:8b")
+LLM_FAST_MODEL = os.getenv("LLM_FAST_MODEL", "llama3.2:3b")
+LLM_ROUTING_ENABLED = os.getenv("LLM_ROUTING_ENABLED", "false").lower() == "true"
+# A model the server reported missing is retried after this long
+LLM_MISSING_MODEL_RETRY_SECONDS = float(os.getenv("LLM_MISSING_MODEL_RETRY_SECONDS", "300"))
+# Streamed chunks (about one token each) of <think> before the fast model answers instead; 0 disables the cap
+LLM_THINK_TOKEN_CAP = int(os.getenv("LLM_THINK_TOKEN_CAP", "0"))
+# A question is easy when its best semantic match is close and clearly ahead of the runner-up
+LLM_ROUTE_MIN_SIMILARITY = float(os.getenv("LLM_ROUTE_MIN_SIMILARITY", "0.5"))
+LLM_ROUTE_MIN_MARGIN = float(os.getenv("LLM_ROUTE_MIN_MARGIN", "0.02"))
+LLM_ROUTE_MAX_QUERY_WORDS = int(os.getenv("LLM_ROUTE_MAX_QUERY_WORDS", "20"))
+
+llm_routes = registry.counter("deepnote_llm_routes_total", "Questions routed to each model, by model and reason")
+llm_route_saved_seconds = registry.counter(
+    "deepnote_llm_route_saved_seconds_total",
+    "Estimated answer latency saved by routing questions away from the reasoning model"
+)
+
+# Questions asking for explanation, comparison or calculation need reasoning (English and Indonesian)
+REASONING_CUES = re.compile(
+    r"\b(why|how|explain|compare|comparison|difference|differ|versus|vs|calculate|compute|derive|prove|"
+    r"analy[sz]e|evaluate|implications?|step[- ]by[- ]step|pros and cons|"
+    r"mengapa|kenapa|bagaimana|jelaskan|bandingkan|perbedaan|hitung|buktikan|analisis)\b",
+    re.IGNORECASE,
+)
+
+THINK_OPEN, THINK_CLOSE = "<think>", "</think>"
+
+
+def is_missing_model(error: Exception) -> bool:
+    """Whether a model server error means the requested model is not pulled"""
+    if getattr(error, "status_code", None) == 404:
+        return True
+    message = str(error).lower()
+    return "model" in message and "not found" in message
+
 
 answer_template = """
 CONTEXT:
@@ -23,18 +73,229 @@ INSTRUCTIONS:
 Response should be clear and direct, citing specific parts of the context.
 """
 
+class RouteDecision:
+    """Which model answers a question, and why"""
+    def __init__(self, model: str, reason: str, features: dict):
+        self.model = model
+        self.reason = reason
+        self.features = features
+
+    def __repr__(self) -> str:
+        features = ", ".join(f"{key}={value}" for key, value in self.features.items())
+        return f"{self.model} ({self.reason}; {features})"
+
+
+class QueryRouter:
+    """Cheap difficulty classifier over query features and retrieval score margins.
+
+    Questions with reasoning cues (why/how/compare/calculate...), several
+    parts or many words go to the reasoning model. So do questions whose
+    best semantic match is weak, or barely ahead of the next one, since the
+    answer then has to be assembled from several chunks. Everything else is
+    a lookup the fast model answers from the top chunks.
+    """
+    def __init__(self, fast_model: Optional[str], reasoning_model: str,
+                 min_similarity: float = LLM_ROUTE_MIN_SIMILARITY, min_margin: float = LLM_ROUTE_MIN_MARGIN,
+                 max_query_words: int = LLM_ROUTE_MAX_QUERY_WORDS):
+        self.fast_model = fast_model
+        self.reasoning_model = reasoning_model
+        self.min_similarity = min_similarity
+        self.min_margin = min_margin
+        self.max_query_words = max_query_words
+
+    def features(self, question: str, similarities: Optional[Sequence[float]] = None) -> dict:
+        features = {
+            "words": len(question.split()),
+            "parts": max(1, question.count("?")),
+            "cue": bool(REASONING_CUES.search(question)),
+        }
+        if similarities:
+            features["similarity"] = round(float(similarities[0]), 4)
+            features["margin"] = round(float(similarities[0] - similarities[1]) if len(similarities) > 1 else 1.0, 4)
+        return features
+
+    def route(self, question: str, documents: List[Document],
+              similarities: Optional[Sequence[float]] = None) -> RouteDecision:
+        features = self.features(question, similarities)
+        if not self.fast_model:
+            return RouteDecision(self.reasoning_model, "routing_disabled", features)
+        if not documents:
+            # Nothing to reason over; the answer is "insufficient context" either way
+            return RouteDecision(self.fast_model, "no_context", features)
+        if features["cue"]:
+            return RouteDecision(self.reasoning_model, "reasoning_cue", features)
+        if features["parts"] > 1:
+            return RouteDecision(self.reasoning_model, "multi_part", features)
+        if features["words"] > self.max_query_words:
+            return RouteDecision(self.reasoning_model, "long_query", features)
+        if "similarity" not in features:
+            return RouteDecision(self.reasoning_model, "no_scores", features)
+        if features["similarity"] < self.min_similarity:
+            return RouteDecision(self.reasoning_model, "weak_match", features)
+        if features["margin"] < self.min_margin:
+            return RouteDecision(self.reasoning_model, "ambiguous_match", features)
+        return RouteDecision(self.fast_model, "easy", features)
+
+
 class LLMService:
-    def __init__(self, model_name = "deepseek-r1:8b"):
-        self.answer_prompt = ChatPromptTemplate(answer_template)
-        self.llm = OllamaLLM(model=model_name)
-        
-    def answer_question(self, question: str, documents: List[Document]) -> str:
+    """Answers questions with a cascade of a fast model and a reasoning model.
+
+    `models` maps model names to prebuilt runnables (e.g. stubs in tests);
+    other models are Ollama clients created on first use. When the server
+    does not have the fast model, the reasoning model answers instead and
+    the fast model is skipped for LLM_MISSING_MODEL_RETRY_SECONDS.
+    """
+    def __init__(self, model_name: str = LLM_REASONING_MODEL,
+                 fast_model_name: Optional[str] = LLM_FAST_MODEL if LLM_ROUTING_ENABLED else None,
+                 think_token_cap: int = LLM_THINK_TOKEN_CAP, models: Optional[Dict[str, object]] = None,
+                 router: Optional[QueryRouter] = None):
+        self.model_name = model_name
+        self.fast_model_name = fast_model_name or None
+        self.think_token_cap = think_token_cap
+        if think_token_cap and not self.fast_model_name:
+            logger.warning("LLM_THINK_TOKEN_CAP needs a fast model to finish capped answers; ignoring it")
+            self.think_token_cap = 0
+        self.router = router or QueryRouter(self.fast_model_name, model_name)
+        self.answer_prompt = ChatPromptTemplate.from_template(answer_template)
+        self._models: Dict[str, object] = dict(models or {})
+        self._models_lock = threading.Lock()
+        # Moving average of answer latency per model, to estimate the time routing saves
+        self._latency: Dict[str, float] = {}
+        # Model name -> when the server reported it missing
+        self._missing: Dict[str, float] = {}
+
+    def model(self, name: str):
+        """Client of a model, created on first use to keep imports off the startup path"""
+        with self._models_lock:
+            if name not in self._models:
+                from langchain_ollama.llms import OllamaLLM
+
+                self._models[name] = OllamaLLM(model=name)
+            return self._models[name]
+
+    @property
+    def llm(self):
+        """The reasoning model"""
+        return self.model(self.model_name)
+
+    def available(self, name: Optional[str]) -> str:
+        """`name`, or the reasoning model if there is none or the server recently reported it missing"""
+        if not name:
+            return self.model_name
+        missing_at = self._missing.get(name)
+        if missing_at is not None and time.monotonic() - missing_at < LLM_MISSING_MODEL_RETRY_SECONDS:
+            return self.model_name
+        return name
+
+    def run(self, prompt, inputs: dict, model: Optional[str], stage: str = "llm.generate",
+            think_token_cap: int = 0) -> Tuple[str, str]:
+        """Generate with `prompt` on a model, or on the reasoning model if the server lacks it; returns (output, model)"""
+        model = self.available(model)
+        with span("llm.prompt_build"):
+            chain = prompt | self.model(model)
+        try:
+            return self.generate(chain, inputs, stage=stage, model=model, think_token_cap=think_token_cap), model
+        except Exception as e:
+            if model == self.model_name or not is_missing_model(e):
+                raise
+            logger.warning(f"Model {model} is not available ({str(e)}); answering with {self.model_name}")
+            self._missing[model] = time.monotonic()
+            llm_routes.inc(model=self.model_name, reason="model_missing")
+            return self.run(prompt, inputs, self.model_name, stage)
+
+    @profiled("llm.generate")
+    def generate(self, chain, inputs: dict, stage: str = "llm.generate", model: Optional[str] = None,
+                 think_token_cap: int = 0) -> str:
+        """Stream a chain's output, recording time-to-first-token and tokens/sec.
+
+        With `think_token_cap`, the stream is closed once a <think> section
+        runs longer than the cap, and the partial output ends in an
+        unterminated <think> section. Tags split across chunks are found by
+        scanning each chunk together with the end of the previous ones.
+        """
+        model = model or self.model_name
+        with span(stage, model=model):
+            start_time = time.perf_counter()
+            first_token_time = None
+            chunks = []
+            think_tokens = 0
+            thinking = False
+            # End of the output so far, long enough to hold all but the last character of a tag
+            tail = ""
+            stream = chain.stream(inputs)
+            try:
+                for chunk in stream:
+                    if first_token_time is None:
+                        first_token_time = time.perf_counter() - start_time
+                    chunks.append(chunk)
+                    if think_token_cap:
+                        text = tail + chunk
+                        opened, closed = text.rfind(THINK_OPEN), text.rfind(THINK_CLOSE)
+                        if opened != closed:
+                            # The later of the two tags decides
+                            thinking = opened > closed
+                        tail = text[-(len(THINK_CLOSE) - 1):]
+                        think_tokens += thinking
+                        if think_tokens > think_token_cap:
+                            break
+            finally:
+                # Closing the stream cancels the request to the model server
+                close = getattr(stream, "close", None)
+                if close is not None:
+                    close()
+            duration = time.perf_counter() - start_time
+        # Ollama streams roughly one token per chunk
+        record_llm_generation(model, first_token_time, duration, len(chunks))
+        return "".join(chunks)
+
+    def _observe_latency(self, model: str, seconds: float):
+        previous = self._latency.get(model)
+        self._latency[model] = seconds if previous is None else 0.8 * previous + 0.2 * seconds
+
+    def answer(self, prompt, inputs: dict, question: str, documents: List[Document],
+               similarities: Optional[Sequence[float]] = None, stage: str = "llm.answer") -> Tuple[str, str, RouteDecision]:
+        """Route a question, generate its answer with `prompt`, and return (answer, thinking, decision)"""
+        decision = self.router.route(question, documents, similarities)
+        llm_routes.inc(model=decision.model, reason=decision.reason)
+        logger.info(f"Routed question to {decision}")
+        start = time.perf_counter()
+        fast_model = self.available(self.fast_model_name)
+        # Capped reasoning needs a fast model to finish the answer
+        cap = self.think_token_cap if decision.model == self.model_name != fast_model else 0
+        output, model = self.run(prompt, inputs, decision.model, stage=stage, think_token_cap=cap)
+        if model != decision.model:
+            decision = RouteDecision(model, "model_missing", decision.features)
+        if cap and THINK_OPEN in output and THINK_CLOSE not in output:
+            # Reasoning ran past the cap: let the fast model answer, keeping the partial reasoning
+            logger.info(f"Reasoning exceeded {cap} think tokens; answering with {fast_model}")
+            llm_routes.inc(model=fast_model, reason="think_cap")
+            partial = output
+            output, _ = self.run(prompt, inputs, fast_model, stage=stage)
+            _, thinking = self.clean_thinking(partial + THINK_CLOSE)
+            answer, _ = self.clean_thinking(output)
+        else:
+            answer, thinking = self.clean_thinking(output)
+        seconds = time.perf_counter() - start
+        self._observe_latency(decision.model, seconds)
+
+        reasoning_latency = self._latency.get(self.model_name)
+        if decision.model != self.model_name and reasoning_latency is not None:
+            saved = max(0.0, reasoning_latency - seconds)
+            llm_route_saved_seconds.inc(saved)
+            logger.info(f"Answered with {decision.model} in {seconds:.2f}s, about {saved:.2f}s "
+                        f"faster than {self.model_name}")
+        else:
+            logger.info(f"Answered with {decision.model} in {seconds:.2f}s")
+        return answer, thinking, decision
+
+    def answer_question(self, question: str, documents: List[Document],
+                        similarities: Optional[Sequence[float]] = None) -> Tuple[str, str]:
         """Generate answer using retrieved documents"""
         context = "\n\n".join([doc.page_content for doc in documents])
-        chain = self.answer_prompt | self.llm
-        summary = chain.invoke({"question": question, "context": context})
-        clean_content, thinking = self.clean_thinking(summary)
-        return clean_content, thinking
+        answer, thinking, _ = self.answer(
+            self.answer_prompt, {"question": question, "context": context}, question, documents, similarities
+        )
+        return answer, thinking
     
 
     def clean_thinking(self, text: str) -> str:
@@ -81,7 +342,7 @@ class LLMService:
         Make the summary informative yet brief.
         """)
         
-        chain = summary_prompt | self.llm
-        result = chain.invoke({"text": combined_text})
+        # Summaries need no reasoning
+        result, _ = self.run(summary_prompt, {"text": combined_text}, self.fast_model_name, stage="llm.summary")
         clean_content, _ = self.clean_thinking(result)
         return clean_content
@@ -0,0 +1,297 @@
+import os
+import time
+import threading
+import contextvars
+import functools
+from bisect import bisect_left
+from typing import Dict, List, Optional, Tuple
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Metrics settings
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() in ("1", "true", "yes")
+# Bearer token a Prometheus scraper may present on /metrics instead of a user JWT
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+# Spans recorded while serving the current request (used for Server-Timing)
+_request_timings: contextvars.ContextVar[Optional[List[Tuple[str, float]]]] = contextvars.ContextVar(
+    "request_timings", default=None
+)
+
+
+def _label_key(labels: Dict[str, str]) -> Tuple[Tuple[str, str], ...]:
+    return tuple(sorted(labels.items()))
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(key: Tuple[Tuple[str, str], ...], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(key)
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    body = ",".join(f'{k}="{_escape(v)}"' for k, v in pairs)
+    return "{" + body + "}"
+
+
+class Counter:
+    """Monotonically increasing counter"""
+    def __init__(self, name: str, description: str):
+        self.name = name
+        self.description = description
+        self._values: Dict[Tuple[Tuple[str, str], ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(_label_key(labels), 0.0)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in self._values.items():
+                lines.append(f"{self.name}{_format_labels(key)} {value}")
+        return lines
+
+
+class Gauge:
+    """Value that can go up and down"""
+    def __init__(self, name: str, description: str):
+        self.name = name
+        self.description = description
+        self._values: Dict[Tuple[Tuple[str, str], ...], float] = {}
+        self._lock = threading.Lock()
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[_label_key(labels)] = value
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def remove(self, **labels):
+        with self._lock:
+            self._values.pop(_label_key(labels), None)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} gauge"]
+        with self._lock:
+            for key, value in self._values.items():
+                lines.append(f"{self.name}{_format_labels(key)} {value}")
+        return lines
+
+
+class Histogram:
+    """Cumulative bucketed histogram compatible with the Prometheus text format"""
+    def __init__(self, name: str, description: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.description = description
+        self.buckets = tuple(sorted(buckets))
+        # label key -> [bucket counts..., +Inf count, sum]
+        self._values: Dict[Tuple[Tuple[str, str], ...], List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = _label_key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = [0.0] * (len(self.buckets) + 2)
+                self._values[key] = state
+            state[index] += 1
+            state[-1] += value
+
+    def count(self, **labels) -> int:
+        state = self._values.get(_label_key(labels))
+        return int(sum(state[:-1])) if state else 0
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, state in self._values.items():
+                cumulative = 0.0
+                for bound, count in zip(self.buckets, state):
+                    cumulative += count
+                    lines.append(f"{self.name}_bucket{_format_labels(key, ('le', repr(bound)))} {cumulative}")
+                cumulative += state[len(self.buckets)]
+                lines.append(f"{self.name}_bucket{_format_labels(key, ('le', '+Inf'))} {cumulative}")
+                lines.append(f"{self.name}_sum{_format_labels(key)} {state[-1]}")
+                lines.append(f"{self.name}_count{_format_labels(key)} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """Process-wide registry of metrics exposed on /metrics"""
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name: str, description: str, **kwargs):
+        metric = self._metrics.get(name)
+        if metric is None:
+            with self._lock:
+                metric = self._metrics.get(name)
+                if metric is None:
+                    metric = cls(name, description, **kwargs)
+                    self._metrics[name] = metric
+        return metric
+
+    def counter(self, name: str, description: str) -> Counter:
+        return self._get_or_create(Counter, name, description)
+
+    def gauge(self, name: str, description: str) -> Gauge:
+        return self._get_or_create(Gauge, name, description)
+
+    def histogram(self, name: str, description: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        return self._get_or_create(Histogram, name, description, buckets=buckets)
+
+    def render(self) -> str:
+        """Render all metrics in the Prometheus text exposition format"""
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+stage_duration = registry.histogram(
+    "deepnote_stage_duration_seconds", "Duration of instrumented pipeline stages"
+)
+llm_time_to_first_token = registry.histogram(
+    "deepnote_llm_time_to_first_token_seconds", "Time until the first token was streamed by the LLM"
+)
+llm_tokens_per_second = registry.histogram(
+    "deepnote_llm_tokens_per_second", "LLM generation throughput",
+    buckets=(1, 2, 5, 10, 20, 40, 80, 160, 320)
+)
+llm_tokens = registry.counter("deepnote_llm_tokens_total", "Tokens generated by the LLM")
+http_request_duration = registry.histogram(
+    "deepnote_http_request_duration_seconds", "Total HTTP request duration"
+)
+
+
+class _NullSpan:
+    """Shared no-op span returned when metrics are disabled"""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Span:
+    """Monotonic timer that records into the stage histogram and the request's Server-Timing"""
+    __slots__ = ("name", "labels", "start", "duration")
+
+    def __init__(self, name: str, labels: Dict[str, str]):
+        self.name = name
+        self.labels = labels
+        self.start = 0.0
+        self.duration = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.duration = time.perf_counter() - self.start
+        stage_duration.observe(self.duration, stage=self.name, **self.labels)
+        timings = _request_timings.get()
+        if timings is not None:
+            timings.append((self.name, self.duration))
+        return False
+
+
+def span(name: str, **labels):
+    """Time a block of code as a named stage, e.g. `with span("retriever.query"): ...`"""
+    if not METRICS_ENABLED:
+        return _NULL_SPAN
+    return Span(name, labels)
+
+
+def timed(name: str):
+    """Decorator form of `span`"""
+    def decorator(func):
+        if not METRICS_ENABLED:
+            return func
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with Span(name, {}):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def start_request_timing():
+    """Start collecting spans for the current request, returns a token for `stop_request_timing`"""
+    if not METRICS_ENABLED:
+        return None
+    return _request_timings.set([])
+
+
+def stop_request_timing(token) -> List[Tuple[str, float]]:
+    """Stop collecting spans for the current request and return them"""
+    if token is None:
+        return []
+    timings = _request_timings.get() or []
+    _request_timings.reset(token)
+    return timings
+
+
+def current_request_timings() -> List[Tuple[str, float]]:
+    """Spans recorded so far for the current request"""
+    return _request_timings.get() or []
+
+
+def format_server_timing(timings: List[Tuple[str, float]], total: Optional[float] = None) -> str:
+    """Format spans as a Server-Timing header value (durations in milliseconds)"""
+    # Aggregate repeated stages so the header stays short
+    aggregated: Dict[str, float] = {}
+    for name, duration in timings:
+        aggregated[name] = aggregated.get(name, 0.0) + duration
+    if total is not None:
+        aggregated["total"] = total
+    return ", ".join(
+        f"{name.replace('.', '-').replace(' ', '_')};dur={duration * 1000:.2f}"
+        for name, duration in aggregated.items()
+    )
+
+
+def record_llm_generation(model: str, time_to_first_token: Optional[float], duration: float, tokens: int):
+    """Record time-to-first-token and throughput of a streamed LLM generation"""
+    if not METRICS_ENABLED:
+        return
+    if time_to_first_token is not None:
+        llm_time_to_first_token.observe(time_to_first_token, model=model)
+        timings = _request_timings.get()
+        if timings is not None:
+            timings.append(("llm.ttft", time_to_first_token))
+    llm_tokens.inc(tokens, model=model)
+    generation_time = duration - (time_to_first_token or 0.0)
+    if tokens and generation_time > 0:
+        llm_tokens_per_second.observe(tokens / generation_time, model=model)
+
+
+def render_metrics() -> str:
+    """Render the Prometheus exposition text for the /metrics endpoint"""
+    return registry.render()
@@ -1 +1,391 @@
-class no
\ No newline at end of file
+import concurrent.futures
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Callable, List, Optional, Tuple
+from dotenv import load_dotenv
+
+from langchain_core.prompts import ChatPromptTemplate
+
+from .metrics_service import registry, span
+
+# Load environment variables
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Conversation memory settings
+# Recent turns are kept verbatim up to NOTEBOOK_WINDOW_TOKENS; older ones only survive in
+# the rolling summary, capped at NOTEBOOK_SUMMARY_TOKENS, so prompts stay the same size
+NOTEBOOK_WINDOW_TOKENS = int(os.getenv("NOTEBOOK_WINDOW_TOKENS", "1500"))
+NOTEBOOK_SUMMARY_TOKENS = int(os.getenv("NOTEBOOK_SUMMARY_TOKENS", "400"))
+# Most recent entries read to fill the window
+NOTEBOOK_WINDOW_MAX_ENTRIES = int(os.getenv("NOTEBOOK_WINDOW_MAX_ENTRIES", "50"))
+NOTEBOOK_SUMMARY_CACHE_SIZE = int(os.getenv("NOTEBOOK_SUMMARY_CACHE_SIZE", "1024"))
+NOTEBOOK_SUMMARY_WORKERS = int(os.getenv("NOTEBOOK_SUMMARY_WORKERS", "2"))
+
+notebook_prompt_tokens = registry.histogram(
+    "deepnote_notebook_prompt_tokens", "Estimated tokens of conversation memory (summary and window) per prompt",
+    buckets=(100, 250, 500, 1000, 1500, 2000, 3000, 4000, 8000)
+)
+notebook_summary_refreshes = registry.counter(
+    "deepnote_notebook_summary_refreshes_total", "Rolling summary refreshes of notebook conversations, by result"
+)
+notebook_summary_cache = registry.counter(
+    "deepnote_notebook_summary_cache_requests_total", "Notebook summary cache lookups by result"
+)
+
+ROLES = {"query": "User", "response": "Assistant", "text": "Note"}
+
+summary_template = """
+CURRENT SUMMARY:
+{summary}
+
+NEW CONVERSATION TURNS:
+{turns}
+
+TASK:
+Update the summary so it also covers the new turns. Keep the questions asked, the facts
+and conclusions established, and any preferences or open points the user mentioned.
+Drop small talk and repetition. Write at most {max_words} words of plain prose.
+"""
+
+conversation_template = """
+CONVERSATION SUMMARY:
+{summary}
+
+RECENT CONVERSATION:
+{history}
+
+CONTEXT:
+{context}
+
+QUESTION:
+{question}
+
+INSTRUCTIONS:
+1. Use the conversation to resolve what the question refers to
+2. Answer using only facts from the context; if it is insufficient, say "Insufficient context to answer this question"
+3. Highlight any specific terminology or important definitions used
+
+Response should be clear and direct, citing specific parts of the context.
+"""
+
+# (current summary, entries to fold in) -> updated summary
+Summarizer = Callable[[str, list], str]
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about four characters per token), good enough for budgeting"""
+    return (len(text) + 3) // 4
+
+
+def truncate_tokens(text: str, max_tokens: int) -> str:
+    """Cut text to about max_tokens, at a word boundary when there is one"""
+    limit = max_tokens * 4
+    if len(text) <= limit:
+        return text
+    cut = text[:limit - 4]
+    space = cut.rfind(" ")
+    return (cut[:space] if space > limit // 2 else cut) + " ..."
+
+
+def format_turn(entry) -> str:
+    return f"{ROLES.get(entry.entry_type, 'Note')}: {entry.content}"
+
+
+class ConversationSummarizer:
+    """Folds new turns into a rolling summary with the LLM"""
+    def __init__(self, llm_service, max_tokens: int = NOTEBOOK_SUMMARY_TOKENS):
+        self.llm_service = llm_service
+        self.max_tokens = max_tokens
+        self.prompt = ChatPromptTemplate.from_template(summary_template)
+
+    def __call__(self, summary: str, entries: list) -> str:
+        result, _ = self.llm_service.run(self.prompt, {
+            "summary": summary or "(none yet)",
+            "turns": "\n".join(format_turn(entry) for entry in entries),
+            # Words run a little over one token each
+            "max_words": max(1, self.max_tokens * 3 // 4),
+        }, self.llm_service.fast_model_name, stage="llm.notebook_summary")
+        clean_content, _ = self.llm_service.clean_thinking(result)
+        return clean_content
+
+
+class _Turn:
+    """Stand-in for an entry whose content was truncated to fit a budget"""
+    def __init__(self, id: int, entry_type: str, content: str):
+        self.id = id
+        self.entry_type = entry_type
+        self.content = content
+
+
+class ConversationMemory:
+    """What a prompt remembers of a notebook: a rolling summary and a window of recent turns"""
+    def __init__(self, summary: str, summary_entry_id: Optional[int], window: list, pending: int):
+        self.summary = summary
+        self.summary_entry_id = summary_entry_id
+        # Recent turns, preceded by older ones the summary does not cover yet
+        self.window = window
+        # Entries older than the token window that the summary does not cover yet
+        self.pending = pending
+
+    @property
+    def history(self) -> str:
+        return "\n".join(format_turn(entry) for entry in self.window)
+
+    @property
+    def tokens(self) -> int:
+        return estimate_tokens(self.summary) + estimate_tokens(self.history)
+
+    def stats(self) -> dict:
+        return {
+            "summary": self.summary,
+            "summary_entry_id": self.summary_entry_id,
+            "summary_tokens": estimate_tokens(self.summary),
+            "window_entries": len(self.window),
+            "window_tokens": estimate_tokens(self.history),
+            "pending_entries": self.pending,
+        }
+
+
+class NotebookMemory:
+    """Bounded conversation memory of notebooks.
+
+    The newest turns that fit in `window_tokens` go into prompts verbatim;
+    everything older is represented by a rolling summary stored on the
+    notebook and cached in process (LRU). When turns fall out of the window,
+    a background worker folds them into the summary incrementally: the
+    summarizer sees the previous summary and only the new turns, never the
+    whole history, so neither summarizing nor prompting grows with the
+    length of the conversation. Until a refresh lands, prompts use the
+    previous summary plus the turns it does not cover yet (up to another
+    `window_tokens`); at most one refresh per notebook runs at a time.
+    """
+    def __init__(self, summarizer: Optional[Summarizer] = None, session_factory=None,
+                 window_tokens: int = NOTEBOOK_WINDOW_TOKENS, summary_tokens: int = NOTEBOOK_SUMMARY_TOKENS,
+                 max_window_entries: int = NOTEBOOK_WINDOW_MAX_ENTRIES,
+                 cache_size: int = NOTEBOOK_SUMMARY_CACHE_SIZE, workers: int = NOTEBOOK_SUMMARY_WORKERS):
+        if session_factory is None:
+            from ..db import SessionLocal as session_factory
+        self._summarizer = summarizer
+        self.session_factory = session_factory
+        self.window_tokens = window_tokens
+        self.summary_tokens = summary_tokens
+        self.max_window_entries = max_window_entries
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[int, Tuple[str, Optional[int]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._refreshing = set()
+        # Notebooks that gained entries while their refresh was running
+        self._stale = set()
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="notebook-summary"
+        )
+
+    @property
+    def summarizer(self) -> Summarizer:
+        if self._summarizer is None:
+            from .llm_service import LLMService
+
+            self._summarizer = ConversationSummarizer(LLMService(), self.summary_tokens)
+        return self._summarizer
+
+    def summary(self, db, notebook_id: int) -> Tuple[str, Optional[int]]:
+        """(summary, id of the last entry it covers) from the cache, or the notebook row"""
+        with self._lock:
+            cached = self._cache.get(notebook_id)
+            if cached is not None:
+                self._cache.move_to_end(notebook_id)
+                notebook_summary_cache.inc(result="hit")
+                return cached
+        notebook_summary_cache.inc(result="miss")
+        return self._load_summary(db, notebook_id)
+
+    def _load_summary(self, db, notebook_id: int) -> Tuple[str, Optional[int]]:
+        from ..db.repositories.notebook_repository import NotebookRepository
+
+        notebook = NotebookRepository.get_notebook(db, notebook_id)
+        cached = (notebook.summary or "", notebook.summary_entry_id) if notebook else ("", None)
+        self._remember(notebook_id, cached)
+        return cached
+
+    def _remember(self, notebook_id: int, value: Tuple[str, Optional[int]]):
+        with self._lock:
+            current = self._cache.get(notebook_id)
+            # A slower reader must not replace a newer summary
+            if current is not None and (current[1] or 0) > (value[1] or 0):
+                return
+            self._cache[notebook_id] = value
+            self._cache.move_to_end(notebook_id)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def _window(self, db, notebook_id: int) -> list:
+        """Newest entries within the token budget, oldest first; the newest is kept (truncated) even if too long"""
+        from ..db.repositories.notebook_repository import NotebookRepository
+
+        window = []
+        used = 0
+        for entry in NotebookRepository.get_recent_entries(db, notebook_id, self.max_window_entries):
+            tokens = estimate_tokens(format_turn(entry))
+            if used + tokens > self.window_tokens:
+                if not window:
+                    window.append(_Turn(entry.id, entry.entry_type, truncate_tokens(entry.content, self.window_tokens)))
+                break
+            window.append(entry)
+            used += tokens
+        window.reverse()
+        return window
+
+    def _state(self, db, notebook_id: int) -> Tuple[str, Optional[int], list, int]:
+        """(summary, its last entry id, window, entries between the two)"""
+        from ..db.repositories.notebook_repository import NotebookRepository
+
+        summary, summary_entry_id = self.summary(db, notebook_id)
+        window = self._window(db, notebook_id)
+        pending = 0
+        if window:
+            pending = NotebookRepository.count_entries(
+                db, notebook_id, after_id=summary_entry_id, before_id=window[0].id
+            )
+        return summary, summary_entry_id, window, pending
+
+    def _unsummarized(self, db, notebook_id: int, after_id: Optional[int], before_id: int) -> list:
+        """Newest entries between the summary and the window within another window's budget, oldest first"""
+        from ..db.repositories.notebook_repository import NotebookRepository
+
+        carried = []
+        used = 0
+        for entry in NotebookRepository.get_recent_entries(
+            db, notebook_id, self.max_window_entries, after_id=after_id, before_id=before_id
+        ):
+            used += estimate_tokens(format_turn(entry))
+            if used > self.window_tokens:
+                break
+            carried.append(entry)
+        carried.reverse()
+        return carried
+
+    def build(self, db, notebook_id: int, exclude_entry_id: Optional[int] = None) -> ConversationMemory:
+        """What a prompt would remember, without recording metrics or scheduling a refresh.
+
+        `exclude_entry_id` leaves out an entry already in the prompt, like the question being asked.
+        """
+        with span("notebook.memory"):
+            summary, summary_entry_id, window, pending = self._state(db, notebook_id)
+            if pending:
+                # Turns that left the window stay in prompts until the summary covers them
+                window = self._unsummarized(db, notebook_id, summary_entry_id, window[0].id) + window
+            window = [entry for entry in window if entry.id != exclude_entry_id]
+        return ConversationMemory(truncate_tokens(summary, self.summary_tokens), summary_entry_id, window, pending)
+
+    def context(self, db, notebook_id: int, exclude_entry_id: Optional[int] = None) -> ConversationMemory:
+        """Memory for a prompt, recording its size and scheduling a summary refresh when turns have left the window"""
+        memory = self.build(db, notebook_id, exclude_entry_id)
+        notebook_prompt_tokens.observe(memory.tokens)
+        if memory.pending:
+            self.schedule_refresh(notebook_id)
+        return memory
+
+    def update(self, db, notebook_id: int) -> bool:
+        """After entries were added, schedule a summary refresh if turns have left the window"""
+        with span("notebook.memory"):
+            pending = self._state(db, notebook_id)[3]
+        return self.schedule_refresh(notebook_id) if pending else False
+
+    def schedule_refresh(self, notebook_id: int) -> bool:
+        """Refresh a notebook's summary in the background unless a refresh is already running"""
+        with self._lock:
+            if notebook_id in self._refreshing:
+                self._stale.add(notebook_id)
+                return False
+            self._refreshing.add(notebook_id)
+        self._executor.submit(self._refresh, notebook_id)
+        return True
+
+    def _refresh(self, notebook_id: int):
+        while True:
+            try:
+                self.refresh(notebook_id)
+                notebook_summary_refreshes.inc(result="updated")
+            except Exception as e:
+                logger.error(f"Error refreshing summary of notebook {notebook_id}: {str(e)}")
+                notebook_summary_refreshes.inc(result="error")
+                with self._lock:
+                    self._stale.discard(notebook_id)
+            with self._lock:
+                if notebook_id not in self._stale:
+                    self._refreshing.discard(notebook_id)
+                    return
+                self._stale.discard(notebook_id)
+
+    def refresh(self, notebook_id: int) -> Tuple[str, Optional[int]]:
+        """Fold every entry older than the window into the summary, a window's worth of tokens per call"""
+        from ..db.repositories.notebook_repository import NotebookRepository
+
+        db = self.session_factory()
+        try:
+            # From the database: another worker process may have moved the summary on
+            summary, summary_entry_id = self._load_summary(db, notebook_id)
+            window = self._window(db, notebook_id)
+            if not window:
+                return summary, summary_entry_id
+            while True:
+                # Summarizer inputs stay bounded however far behind the summary is
+                pending = NotebookRepository.get_entries(
+                    db, notebook_id, after_id=summary_entry_id, before_id=window[0].id, limit=self.max_window_entries
+                )
+                if not pending:
+                    break
+                batch, used = [], 0
+                for entry in pending:
+                    tokens = estimate_tokens(format_turn(entry))
+                    if batch and used + tokens > self.window_tokens:
+                        break
+                    batch.append(entry if tokens <= self.window_tokens else _Turn(
+                        entry.id, entry.entry_type, truncate_tokens(entry.content, self.window_tokens)
+                    ))
+                    used += tokens
+                with span("notebook.summarize"):
+                    summary = truncate_tokens(self.summarizer(summary, batch), self.summary_tokens)
+                summary_entry_id = batch[-1].id
+                NotebookRepository.set_summary(db, notebook_id, summary, summary_entry_id)
+                self._remember(notebook_id, (summary, summary_entry_id))
+            return summary, summary_entry_id
+        finally:
+            db.close()
+
+    def forget(self, notebook_id: int):
+        with self._lock:
+            self._cache.pop(notebook_id, None)
+
+    def shutdown(self, wait: bool = True):
+        self._executor.shutdown(wait=wait)
+
+
+_notebook_memory: Optional[NotebookMemory] = None
+_notebook_memory_lock = threading.Lock()
+
+
+def get_notebook_memory() -> NotebookMemory:
+    """Process-wide notebook memory, created on first use"""
+    global _notebook_memory
+    with _notebook_memory_lock:
+        if _notebook_memory is None:
+            _notebook_memory = NotebookMemory()
+        return _notebook_memory
+
+
+def build_conversation_prompt() -> ChatPromptTemplate:
+    return ChatPromptTemplate.from_template(conversation_template)
+
+
+def conversation_inputs(memory: ConversationMemory, question: str, documents: List) -> dict:
+    return {
+        "summary": memory.summary or "(none)",
+        "history": memory.history or "(none)",
+        "context": "\n\n".join(doc.page_content for doc in documents),
+        "question": question,
+    }
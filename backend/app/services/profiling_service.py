@@ -0,0 +1,301 @@
+import contextvars
+import cProfile
+import functools
+import json
+import logging
+import os
+import pstats
+import re
+import threading
+import time
+import tracemalloc
+from typing import List, Optional
+from dotenv import load_dotenv
+
+from .metrics_service import registry
+
+# Load environment variables
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Per-request profiling settings
+# Off by default: the middleware is not installed and service hooks are not wrapped
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "false").lower() in ("1", "true", "yes")
+# Requests sending this token in the X-Profile-Token header are profiled; it also guards the downloads
+PROFILING_ADMIN_TOKEN = os.getenv("PROFILING_ADMIN_TOKEN", "")
+# Share of all requests profiled without the header
+PROFILING_SAMPLE_RATE = float(os.getenv("PROFILING_SAMPLE_RATE", "0.0"))
+PROFILING_DIR = os.getenv("PROFILING_DIR", "profiles")
+# Artifacts of the most recent profiled requests kept on disk
+PROFILING_MAX_ARTIFACTS = int(os.getenv("PROFILING_MAX_ARTIFACTS", "50"))
+# Stack depth recorded per allocation, and rows kept in the summaries. While a request is
+# profiled, tracemalloc traces every allocation in the process, so deeper stacks slow it more
+PROFILING_TRACEMALLOC_FRAMES = int(os.getenv("PROFILING_TRACEMALLOC_FRAMES", "10"))
+PROFILING_TOP = int(os.getenv("PROFILING_TOP", "25"))
+
+profiled_requests = registry.counter("deepnote_profiled_requests_total", "Profiled requests, by trigger and result")
+
+# Profile of the request being served; None (the usual case) disables the hooks
+_current_profile: contextvars.ContextVar[Optional["RequestProfile"]] = contextvars.ContextVar(
+    "current_profile", default=None
+)
+# Stages already profiling on this thread; nested stages are covered by the outer profiler
+_local = threading.local()
+# One request is profiled at a time. tracemalloc is process-wide: while it runs, every
+# allocation of every thread is traced, so concurrent requests in this worker slow down
+# too and their allocations appear in the profiled request's snapshot
+_active = threading.Lock()
+
+PROFILE_ID = re.compile(r"^[0-9a-f-]{8,64}$")
+
+
+class _Stage:
+    """CPU profile of one service call on the current thread"""
+    __slots__ = ("profile", "name", "profiler", "start")
+
+    def __init__(self, profile: "RequestProfile", name: str):
+        self.profile = profile
+        self.name = name
+        self.profiler = None
+        self.start = 0.0
+
+    def __enter__(self):
+        if getattr(_local, "profiling", False):
+            return self
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Another thread's profiler holds the interpreter-wide hook (Python 3.12+)
+            self.profile.skipped_stages += 1
+            return self
+        _local.profiling = True
+        self.profiler = profiler
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.profiler is not None:
+            self.profiler.disable()
+            _local.profiling = False
+            self.profile.add_stage(self.name, time.perf_counter() - self.start, self.profiler)
+        return False
+
+
+class RequestProfile:
+    """CPU profiles of a request's service calls and an allocation snapshot of the whole request.
+
+    The CPU profiles only cover the request's own calls; the allocation
+    snapshot covers the whole worker process while the request runs.
+    """
+    def __init__(self, profile_id: str, method: str, path: str, trigger: str):
+        self.id = profile_id
+        self.method = method
+        self.path = path
+        self.trigger = trigger
+        self.started_at = time.time()
+        self.start = time.perf_counter()
+        self.seconds = 0.0
+        self.status: Optional[int] = None
+        self.stages: List[dict] = []
+        self.skipped_stages = 0
+        self.stats: Optional[pstats.Stats] = None
+        self.snapshot: Optional[tracemalloc.Snapshot] = None
+        self.peak_bytes = 0
+        self._lock = threading.Lock()
+        self._started_tracing = False
+
+    def begin(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(PROFILING_TRACEMALLOC_FRAMES)
+            self._started_tracing = True
+        tracemalloc.reset_peak()
+
+    def finish(self, status: Optional[int]):
+        self.seconds = time.perf_counter() - self.start
+        self.status = status
+        # Memory still held when the request ends, e.g. caches it filled
+        self.snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        ))
+        self.peak_bytes = tracemalloc.get_traced_memory()[1]
+        if self._started_tracing:
+            tracemalloc.stop()
+
+    def add_stage(self, name: str, seconds: float, profiler: cProfile.Profile):
+        with self._lock:
+            self.stages.append({"stage": name, "seconds": round(seconds, 6), "thread": threading.current_thread().name})
+            if self.stats is None:
+                self.stats = pstats.Stats(profiler)
+            else:
+                self.stats.add(profiler)
+
+    def top_functions(self) -> List[dict]:
+        if self.stats is None:
+            return []
+        functions = []
+        for (filename, line, function), (_, calls, own, cumulative, _) in self.stats.stats.items():
+            functions.append({
+                "function": f"{filename}:{line}({function})",
+                "calls": calls,
+                "own_seconds": round(own, 6),
+                "cumulative_seconds": round(cumulative, 6),
+            })
+        functions.sort(key=lambda row: row["cumulative_seconds"], reverse=True)
+        return functions[:PROFILING_TOP]
+
+    def top_allocations(self) -> List[dict]:
+        if self.snapshot is None:
+            return []
+        return [
+            {"line": str(stat.traceback[0]), "bytes": stat.size, "blocks": stat.count}
+            for stat in self.snapshot.statistics("lineno")[:PROFILING_TOP]
+        ]
+
+    def summary(self) -> dict:
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "trigger": self.trigger,
+            "status": self.status,
+            "started_at": self.started_at,
+            "seconds": round(self.seconds, 6),
+            "stages": self.stages,
+            "skipped_stages": self.skipped_stages,
+            "peak_traced_bytes": self.peak_bytes,
+            "top_functions": self.top_functions(),
+            "top_allocations": self.top_allocations(),
+        }
+
+
+class ProfileStore:
+    """Profile artifacts on disk: <id>.json summary, <id>.prof (pstats) and <id>.tracemalloc snapshot"""
+    KINDS = {"summary": ".json", "cpu": ".prof", "memory": ".tracemalloc"}
+
+    def __init__(self, directory: str = PROFILING_DIR, max_artifacts: int = PROFILING_MAX_ARTIFACTS):
+        self.directory = directory
+        self.max_artifacts = max_artifacts
+        self._lock = threading.Lock()
+
+    def path(self, profile_id: str, kind: str = "summary") -> Optional[str]:
+        if not PROFILE_ID.match(profile_id) or kind not in self.KINDS:
+            return None
+        path = os.path.join(self.directory, profile_id + self.KINDS[kind])
+        return path if os.path.exists(path) else None
+
+    def save(self, profile: RequestProfile):
+        os.makedirs(self.directory, exist_ok=True)
+        base = os.path.join(self.directory, profile.id)
+        if profile.stats is not None:
+            profile.stats.dump_stats(base + ".prof")
+        if profile.snapshot is not None:
+            profile.snapshot.dump(base + ".tracemalloc")
+        # The summary goes last; its presence marks a complete profile
+        with open(base + ".json.tmp", "w") as f:
+            json.dump(profile.summary(), f)
+        os.replace(base + ".json.tmp", base + ".json")
+        self._prune()
+
+    def _prune(self):
+        with self._lock:
+            summaries = sorted(
+                (entry for entry in os.scandir(self.directory) if entry.name.endswith(".json")),
+                key=lambda entry: entry.stat().st_mtime,
+            )
+            for entry in summaries[:max(0, len(summaries) - self.max_artifacts)]:
+                profile_id = entry.name[:-len(".json")]
+                for suffix in self.KINDS.values():
+                    try:
+                        os.remove(os.path.join(self.directory, profile_id + suffix))
+                    except FileNotFoundError:
+                        pass
+
+    def list(self) -> List[dict]:
+        """Profiles newest first, without their function and allocation tables"""
+        if not os.path.isdir(self.directory):
+            return []
+        profiles = []
+        for entry in os.scandir(self.directory):
+            if not entry.name.endswith(".json"):
+                continue
+            try:
+                with open(entry.path) as f:
+                    summary = json.load(f)
+            except (OSError, ValueError):
+                continue
+            profiles.append({
+                key: summary.get(key)
+                for key in ("id", "method", "path", "trigger", "status", "started_at", "seconds", "peak_traced_bytes")
+            })
+        profiles.sort(key=lambda summary: summary["started_at"] or 0, reverse=True)
+        return profiles
+
+    def get(self, profile_id: str) -> Optional[dict]:
+        path = self.path(profile_id)
+        if path is None:
+            return None
+        with open(path) as f:
+            return json.load(f)
+
+
+def start_request_profile(profile_id: str, method: str, path: str, trigger: str):
+    """Start profiling the current request; returns a token for `stop_request_profile`, or None if busy"""
+    if not _active.acquire(blocking=False):
+        profiled_requests.inc(trigger=trigger, result="busy")
+        return None
+    profile = RequestProfile(profile_id, method, path, trigger)
+    try:
+        profile.begin()
+    except BaseException:
+        _active.release()
+        raise
+    return profile, _current_profile.set(profile)
+
+
+def stop_request_profile(token, status: Optional[int]) -> Optional[RequestProfile]:
+    """Stop profiling the current request and return its finished profile"""
+    if token is None:
+        return None
+    profile, context_token = token
+    _current_profile.reset(context_token)
+    try:
+        profile.finish(status)
+    finally:
+        _active.release()
+    profiled_requests.inc(trigger=profile.trigger, result="profiled")
+    return profile
+
+
+def profiled(name: str):
+    """Decorator profiling a service call when the current request is profiled.
+
+    Returns the function itself unless PROFILING_ENABLED, so disabled
+    profiling costs nothing; enabled, an unprofiled request pays one
+    context variable lookup.
+    """
+    def decorator(func):
+        if not PROFILING_ENABLED:
+            return func
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            profile = _current_profile.get()
+            if profile is None:
+                return func(*args, **kwargs)
+            with _Stage(profile, name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+_profile_store: Optional[ProfileStore] = None
+
+
+def get_profile_store() -> ProfileStore:
+    global _profile_store
+    if _profile_store is None:
+        _profile_store = ProfileStore()
+    return _profile_store
@@ -1,48 +1,210 @@
-from nltk.tokenize import word_tokenize as word_tokenizer
-from typing import List
+from typing import Any, Callable, List, Optional, Sequence, Union
 
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
 from langchain_core.documents import Document
-from langchain_community.retrievers import BM25Retriever
-from langchain_core.vectorstores import InMemoryVectorStore
-from langchain_ollama import OllamaEmbeddings
-from langchain.retrievers import EnsembleRetriever
+from langchain_core.embeddings import Embeddings
+from langchain_core.retrievers import BaseRetriever
+
+from .analyzer import Analyzer, get_analyzer
+from .chunk_store import ChunkStore
+from .dedup_service import is_duplicate
+from .index_service import HybridIndex, weighted_rrf
+from .metrics_service import span
+from .profiling_service import profiled
+
+
+class InstrumentedEmbeddings(Embeddings):
+    """Lazily created embeddings client that times every embedding call"""
+    def __init__(self, model_name: str):
+        self.model_name = model_name
+        self._embeddings = None
+
+    @property
+    def embeddings(self) -> Embeddings:
+        if self._embeddings is None:
+            from langchain_ollama import OllamaEmbeddings
+
+            self._embeddings = OllamaEmbeddings(model=self.model_name)
+        return self._embeddings
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        with span("embedding.documents", model=self.model_name):
+            return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        with span("embedding.query", model=self.model_name):
+            return self.embeddings.embed_query(text)
+
+
+def as_documents(documents: Union[List[Document], ChunkStore, List[ChunkStore]]) -> List[Document]:
+    """Convert chunk stores to Documents at the LangChain boundary, dropping near-duplicates"""
+    if isinstance(documents, ChunkStore):
+        return documents.to_documents()
+    if documents and isinstance(documents[0], ChunkStore):
+        return [doc for store in documents for doc in store.to_documents()]
+    # Duplicates are answered by the chunk they reference, so they are never embedded
+    return [doc for doc in documents if not is_duplicate(doc)]
+
+
+class FullTextRetriever(BaseRetriever):
+    """Lexical retriever backed by the database's full-text index over file_chunks.
+
+    Nothing is held in memory and nothing needs rebuilding on restart; each
+    query runs a ranked top-k search filtered by user and/or files.
+    """
+    session_factory: Callable[[], Any]
+    analyzer: Any = None
+    user_id: Optional[int] = None
+    file_ids: Optional[Sequence[int]] = None
+    k: int = 5
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        return self.search(query, user_id=self.user_id, file_ids=self.file_ids)
+
+    def search(self, query: str, k: Optional[int] = None, user_id: Optional[int] = None,
+               file_ids: Optional[Sequence[int]] = None, file_types: Optional[Sequence[str]] = None) -> List[Document]:
+        from ..db.repositories.file_repository import FileRepository
+
+        analyzer = self.analyzer or get_analyzer()
+        # Stopwords are dropped but terms are not stemmed, matching the tsvector config
+        terms = list(dict.fromkeys(term for term in analyzer.tokenize(query) if term not in analyzer.stopwords))
+        db = self.session_factory()
+        try:
+            rows = FileRepository.search_chunks(
+                db, terms, user_id=user_id, file_ids=file_ids, file_types=file_types, k=k or self.k
+            )
+        finally:
+            db.close()
+        return [
+            Document(
+                page_content=row.content,
+                metadata={
+                    "chunk_id": row.id,
+                    "file_id": row.file_id,
+                    "chunk_index": row.chunk_index,
+                    "source": row.filename,
+                    "score": float(row.score),
+                },
+            )
+            for row in rows
+        ]
 
 
 class Retriever:
-    def __init__(self, model_name="deepseek-r1:8b"):
-        self.embeddings = OllamaEmbeddings(model=model_name)
-        self.vector_store = None
-        self.bm25_retriever_obj = None
-        self.semantic_retriever_obj = None
-        self.ensemble_retriever_obj = None
-
-    def semantic_retriever(self, documents: List[Document]):
-        """Index Processed Documents in Vector Store"""
-        self.vector_store = InMemoryVectorStore(self.embeddings)
-        self.vector_store.add_documents(documents)
-        self.semantic_retriever_obj = self.vector_store.as_retriever(search_kwargs={"k": 5})
-
-        return self.semantic_retriever_obj
-    
-    def bm25_retriever(self, documents: List[Document]):
-        self.bm25_retriever_obj = BM25Retriever.from_documents(documents, preprocess_func = word_tokenizer)
-        return self.bm25_retriever_obj
-    
-    def create_hybrid_retriever(self, semantic_weight=0.5, bm25_weight=0.5):
-        if self.vector_store is None or self.bm25_retriever_obj is None:
-            return None
-        
-        self.ensemble_retriever_obj = EnsembleRetriever(
-            retrievers=[self.semantic_retriever_obj, self.bm25_retriever_obj],
-            weight=[semantic_weight, bm25_weight]
+    """Hybrid semantic + lexical retrieval over chunks indexed file by file.
+
+    Queries can be restricted to files, file types or a user; the restriction
+    is applied inside the vector and BM25 scoring loops (see HybridIndex).
+    """
+    def __init__(self, model_name="deepseek-r1:8b", analyzer: Optional[Analyzer] = None,
+                 embeddings: Optional[Embeddings] = None):
+        self.embeddings = embeddings or InstrumentedEmbeddings(model_name)
+        # The same analyzer tokenizes indexed chunks and queries
+        self.analyzer = analyzer or get_analyzer()
+        self.index = HybridIndex()
+        # Optional database full-text search replacing the in-memory BM25 index
+        self.full_text_retriever_obj = None
+        self.semantic_weight = 0.5
+        self.bm25_weight = 0.5
+        self.k = 5
+
+    def prepare_documents(self, documents: Union[List[Document], ChunkStore, List[ChunkStore]],
+                          vectors: Optional[List[List[float]]] = None) -> tuple:
+        """Embed (unless vectors are given) and tokenize chunks without touching the index"""
+        documents = as_documents(documents)
+        texts = [doc.page_content for doc in documents]
+        if vectors is None:
+            with span("retriever.index_vectors"):
+                vectors = self.embeddings.embed_documents(texts) if texts else []
+        with span("retriever.index_bm25"):
+            token_lists = [self.analyzer(text) for text in texts]
+        return documents, vectors, token_lists
+
+    @profiled("retriever.index")
+    def index_documents(self, documents: Union[List[Document], ChunkStore, List[ChunkStore]],
+                        file_id: Optional[int] = None, file_type: Optional[str] = None,
+                        user_id: Optional[int] = None, vectors: Optional[List[List[float]]] = None):
+        """Embed and index one file's chunks as a contiguous block of rows"""
+        documents, vectors, token_lists = self.prepare_documents(documents, vectors)
+        if documents:
+            self.index.add_file(documents, vectors, token_lists, file_id=file_id, file_type=file_type, user_id=user_id)
+
+    def full_text_retriever(self, session_factory=None, user_id: Optional[int] = None,
+                            file_ids: Optional[Sequence[int]] = None, k: int = 5):
+        """Use the database full-text index as the lexical retriever instead of BM25"""
+        if session_factory is None:
+            from ..db import SessionLocal as session_factory
+
+        self.full_text_retriever_obj = FullTextRetriever(
+            session_factory=session_factory, analyzer=self.analyzer, user_id=user_id, file_ids=file_ids, k=k
         )
-        return self.ensemble_retriever_obj
-    
-    
-    def retrieve_relevant_docs(self, query: str, k: int = 5) -> List[Document]:
-        """Retrieve relevant documents with similarity search"""
-        if self.ensemble_retriever_obj:
-            return self.enesmble_retriever_obj.get_relevant_documents(query)
-        else:
-            return []
-        
\ No newline at end of file
+        return self.full_text_retriever_obj
+
+    def create_hybrid_retriever(self, semantic_weight=0.5, bm25_weight=0.5):
+        """Set the weights of the semantic and lexical rankings in reciprocal rank fusion"""
+        self.semantic_weight = semantic_weight
+        self.bm25_weight = bm25_weight
+        return self
+
+    @profiled("retriever.query")
+    def retrieve_relevant_docs(self, query: str, k: int = 5, file_ids: Optional[Sequence[int]] = None,
+                               file_types: Optional[Sequence[str]] = None,
+                               user_id: Optional[int] = None, with_scores: bool = False):
+        """Retrieve relevant documents, optionally restricted to files, file types or a user.
+
+        With `with_scores`, returns (documents, similarities): the cosine scores
+        of the semantic top-k, best first, e.g. for judging how clear a match is.
+        """
+        if not len(self.index) and self.full_text_retriever_obj is None:
+            return ([], []) if with_scores else []
+        with span("retriever.query"):
+            selection = self.index.select(file_ids=file_ids, file_types=file_types, user_id=user_id)
+            semantic, similarities = [], []
+            if len(self.index):
+                semantic, similarities = self.index.vector_search(
+                    self.embeddings.embed_query(query), k, selection, with_scores=True
+                )
+            if self.full_text_retriever_obj is not None:
+                lexical = self.full_text_retriever_obj.search(
+                    query, k=k, user_id=user_id, file_ids=file_ids, file_types=file_types
+                )
+            else:
+                lexical = self.index.bm25_search(self.analyzer(query), k, selection)
+            documents = weighted_rrf([semantic, lexical], [self.semantic_weight, self.bm25_weight])[:k]
+        return (documents, similarities) if with_scores else documents
+
+    @profiled("retriever.query_batch")
+    def retrieve_many(self, queries: List[str], k: int = 5, file_ids: Optional[Sequence[int]] = None,
+                      file_types: Optional[Sequence[str]] = None,
+                      user_id: Optional[int] = None, with_scores: bool = False) -> list:
+        """retrieve_relevant_docs for many queries, sharing the work between them.
+
+        All queries are embedded in one call and scored with one matrix product
+        per block, the filter is resolved once, and BM25 scores each distinct
+        query term once.
+        """
+        if not queries or (not len(self.index) and self.full_text_retriever_obj is None):
+            return [([], []) if with_scores else [] for _ in queries]
+        with span("retriever.query_batch"):
+            selection = self.index.select(file_ids=file_ids, file_types=file_types, user_id=user_id)
+            semantic = [[] for _ in queries]
+            similarities = [[] for _ in queries]
+            if len(self.index):
+                # Ollama embeds queries and documents alike, so one embed_documents call serves all queries
+                results = self.index.vector_search_many(
+                    self.embeddings.embed_documents(queries), k, selection, with_scores=True
+                )
+                semantic = [documents for documents, _ in results]
+                similarities = [scores for _, scores in results]
+            if self.full_text_retriever_obj is not None:
+                lexical = [
+                    self.full_text_retriever_obj.search(
+                        query, k=k, user_id=user_id, file_ids=file_ids, file_types=file_types
+                    )
+                    for query in queries
+                ]
+            else:
+                lexical = self.index.bm25_search_many([self.analyzer(query) for query in queries], k, selection)
+            weights = [self.semantic_weight, self.bm25_weight]
+            fused = [weighted_rrf(list(rankings), weights)[:k] for rankings in zip(semantic, lexical)]
+        return list(zip(fused, similarities)) if with_scores else fused
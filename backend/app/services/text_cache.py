@@ -0,0 +1,104 @@
+import gzip
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import time
+from typing import Iterable, Iterator, Optional
+from dotenv import load_dotenv
+
+from langchain_core.documents import Document
+
+from .extractors import iter_pages
+from .metrics_service import registry
+
+# Load environment variables
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Extracted-text cache settings
+EXTRACTED_TEXT_CACHE_DIR = os.getenv("EXTRACTED_TEXT_CACHE_DIR", os.path.join("cache", "extracted"))
+EXTRACTED_TEXT_CACHE_ENABLED = os.getenv("EXTRACTED_TEXT_CACHE_ENABLED", "true").lower() == "true"
+
+CACHE_FORMAT = 1
+# Metadata that names the file rather than its content; filled in from the source on read
+SOURCE_KEYS = ("source", "file_path")
+
+text_cache_requests = registry.counter(
+    "deepnote_text_cache_requests_total", "Extracted-text cache lookups by result"
+)
+
+
+def content_hash(file_path: str, block_size: int = 1 << 20) -> str:
+    """SHA-256 of a file's bytes, read in blocks"""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class ExtractedTextCache:
+    """Raw extracted pages per file content hash, so re-chunking never re-parses a file.
+
+    Each entry is a gzip-compressed JSON-lines file: a header line, then one
+    line per page with its page number, raw text and metadata. Paths are not
+    stored, so identical files uploaded twice share an entry. Entries are
+    written while the pages stream through and renamed into place only once
+    the last page is written, so a reader sees a complete entry or none.
+    """
+    def __init__(self, directory: str = EXTRACTED_TEXT_CACHE_DIR, enabled: bool = EXTRACTED_TEXT_CACHE_ENABLED,
+                 compresslevel: int = 6):
+        self.directory = directory
+        self.enabled = enabled
+        self.compresslevel = compresslevel
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.jsonl.gz")
+
+    def contains(self, key: str) -> bool:
+        return os.path.exists(self._path(key))
+
+    def read(self, key: str, source: str) -> Iterator[Document]:
+        """Cached pages of an entry, as Documents attributed to `source`"""
+        with gzip.open(self._path(key), "rt", encoding="utf-8") as f:
+            header = json.loads(f.readline())
+            if header.get("format") != CACHE_FORMAT:
+                raise ValueError(f"Unsupported extracted-text cache format for {key}: {header.get('format')}")
+            for line in f:
+                page = json.loads(line)
+                metadata = {"source": source, "file_path": source, **page["metadata"]}
+                yield Document(page_content=page["text"], metadata=metadata)
+
+    def write_through(self, key: str, file_type: str, pages: Iterable[Document]) -> Iterator[Document]:
+        """Yield pages while writing them to a new entry, kept only if every page was written"""
+        directory = os.path.dirname(self._path(key))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with gzip.open(os.fdopen(fd, "wb"), "wt", encoding="utf-8", compresslevel=self.compresslevel) as f:
+                f.write(json.dumps({"format": CACHE_FORMAT, "file_type": file_type, "created_at": time.time()}) + "\n")
+                for page in pages:
+                    metadata = {k: v for k, v in page.metadata.items() if k not in SOURCE_KEYS}
+                    f.write(json.dumps({
+                        "page": metadata.get("page"), "text": page.page_content, "metadata": metadata,
+                    }, default=str) + "\n")
+                    yield page
+            os.replace(tmp_path, self._path(key))
+        finally:
+            # Extraction failed or the consumer stopped early
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def pages(self, file_path: str, file_type: str = "pdf", key: Optional[str] = None) -> Iterator[Document]:
+        """Pages of a file from the cache, extracting (and caching) them on a miss"""
+        if not self.enabled:
+            return iter_pages(file_type, file_path)
+        key = key or content_hash(file_path)
+        if self.contains(key):
+            text_cache_requests.inc(result="hit")
+            return self.read(key, file_path)
+        text_cache_requests.inc(result="miss")
+        return self.write_through(key, file_type, iter_pages(file_type, file_path))
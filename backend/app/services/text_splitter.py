@@ -0,0 +1,114 @@
+from collections import deque
+from typing import Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from langchain_core.documents import Document
+
+DEFAULT_SEPARATORS = ["\n\n", "\n", ".", "!", "?", ",", " "]
+
+
+class TextSplitter:
+    """Offset-based equivalent of LangChain's RecursiveCharacterTextSplitter.
+
+    Uses the same separator priority, chunk_size/chunk_overlap merge rules and
+    keep-separator-at-start behaviour, but works on (start, end) ranges of the
+    original text instead of re-splitting and re-joining substrings. Chunks
+    are produced lazily and always carry their exact start offset.
+    """
+    def __init__(self, chunk_size: int = 1000, chunk_overlap: int = 200,
+                 separators: Optional[Sequence[str]] = None):
+        if chunk_overlap > chunk_size:
+            raise ValueError(f"chunk_overlap ({chunk_overlap}) is larger than chunk_size ({chunk_size})")
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.separators = list(separators or DEFAULT_SEPARATORS)
+
+    def iter_spans(self, text: str) -> Iterator[Tuple[int, int]]:
+        """Yield (start, end) offsets of each chunk, whitespace-stripped"""
+        yield from self._split(text, 0, len(text), self.separators)
+
+    def split_text(self, text: str) -> List[str]:
+        return [text[start:end] for start, end in self.iter_spans(text)]
+
+    def iter_documents(self, documents: Iterable[Document]) -> Iterator[Document]:
+        """Yield chunk Documents with `start_index` metadata, one page at a time"""
+        for doc in documents:
+            text = doc.page_content
+            for start, end in self.iter_spans(text):
+                yield Document(page_content=text[start:end], metadata={**doc.metadata, "start_index": start})
+
+    def split_documents(self, documents: Iterable[Document]) -> List[Document]:
+        return list(self.iter_documents(documents))
+
+    def _pieces(self, text: str, start: int, end: int, separator: str) -> List[Tuple[int, int]]:
+        """Split a range on a separator, keeping each separator at the start of the next piece"""
+        if separator == "":
+            return [(i, i + 1) for i in range(start, end)]
+        pieces = []
+        piece_start = start
+        position = text.find(separator, start, end)
+        while position != -1:
+            if position > piece_start:
+                pieces.append((piece_start, position))
+            piece_start = position
+            position = text.find(separator, position + len(separator), end)
+        if end > piece_start:
+            pieces.append((piece_start, end))
+        return pieces
+
+    def _split(self, text: str, start: int, end: int, separators: List[str]) -> Iterator[Tuple[int, int]]:
+        # Pick the first separator present in this range
+        separator = separators[-1]
+        remaining: List[str] = []
+        for i, candidate in enumerate(separators):
+            if candidate == "":
+                separator = candidate
+                break
+            if text.find(candidate, start, end) != -1:
+                separator = candidate
+                remaining = separators[i + 1:]
+                break
+
+        good: List[Tuple[int, int]] = []
+        for piece_start, piece_end in self._pieces(text, start, end, separator):
+            if piece_end - piece_start < self.chunk_size:
+                good.append((piece_start, piece_end))
+                continue
+            if good:
+                yield from self._merge(text, good)
+                good = []
+            if not remaining:
+                # Oversized pieces with no finer separator are kept verbatim, like LangChain does
+                yield piece_start, piece_end
+            else:
+                yield from self._split(text, piece_start, piece_end, remaining)
+        if good:
+            yield from self._merge(text, good)
+
+    def _merge(self, text: str, pieces: List[Tuple[int, int]]) -> Iterator[Tuple[int, int]]:
+        """Merge contiguous pieces into chunks of at most chunk_size with chunk_overlap"""
+        current: deque = deque()
+        total = 0
+        for piece_start, piece_end in pieces:
+            length = piece_end - piece_start
+            if total + length > self.chunk_size and current:
+                span = self._strip(text, current[0][0], current[-1][1])
+                if span:
+                    yield span
+                # Drop pieces from the front until only the overlap remains
+                while total > self.chunk_overlap or (total + length > self.chunk_size and total > 0):
+                    first_start, first_end = current.popleft()
+                    total -= first_end - first_start
+            current.append((piece_start, piece_end))
+            total += length
+        if current:
+            span = self._strip(text, current[0][0], current[-1][1])
+            if span:
+                yield span
+
+    @staticmethod
+    def _strip(text: str, start: int, end: int) -> Optional[Tuple[int, int]]:
+        while start < end and text[start].isspace():
+            start += 1
+        while end > start and text[end - 1].isspace():
+            end -= 1
+        return (start, end) if end > start else None
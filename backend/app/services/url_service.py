@@ -0,0 +1,211 @@
+import asyncio
+import concurrent.futures
+import logging
+import os
+import re
+import tempfile
+from typing import Awaitable, Callable, Dict, List, Tuple, TypeVar
+from urllib.parse import urlparse
+
+from langchain_core.documents import Document
+from dotenv import load_dotenv
+
+from .metrics_service import span
+
+# Load environment variables
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# HTTP fetch settings
+FETCH_TIMEOUT_SECONDS = float(os.getenv("URL_FETCH_TIMEOUT_SECONDS", "15"))
+MAX_CONNECTIONS = int(os.getenv("URL_MAX_CONNECTIONS", "32"))
+PER_HOST_LIMIT = int(os.getenv("URL_PER_HOST_LIMIT", "4"))
+USER_AGENT = os.getenv("URL_USER_AGENT", "DeepnoteBot/0.1 (+https://github.com/RamadhaRanuh/Deepnote)")
+
+# Pages with less readable text than this are candidates for browser rendering
+MIN_TEXT_CHARS = int(os.getenv("URL_MIN_TEXT_CHARS", "200"))
+
+# Non-HTML content types whose body is text worth indexing as is
+_TEXT_TYPES = ("text/", "application/json")
+
+# Elements that never hold the main content
+_BOILERPLATE_TAGS = ["script", "style", "noscript", "template", "svg", "nav", "footer", "header", "aside", "form", "iframe"]
+
+# Markers of client-side rendered apps with an empty server response
+_JS_APP_MARKERS = re.compile(
+    r'id=["\'](?:root|app|__next|__nuxt|svelte)["\']\s*>\s*</div>|ng-app|data-reactroot|'
+    r'enable javascript|requires javascript|javascript is (?:disabled|required)',
+    re.IGNORECASE,
+)
+
+
+def extract_main_content(html: str) -> Tuple[str, str]:
+    """Extract (title, main text) from an HTML page"""
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, "lxml")
+    title = soup.title.get_text(strip=True) if soup.title else ""
+
+    for tag in soup(_BOILERPLATE_TAGS):
+        tag.decompose()
+
+    # Prefer semantic containers, then the block holding the most paragraph text
+    root = soup.find("article") or soup.find("main") or soup.find(attrs={"role": "main"})
+    if root is None:
+        best_score = 0
+        for candidate in soup.find_all(["div", "section"]):
+            score = sum(len(p.get_text(strip=True)) for p in candidate.find_all("p", recursive=False))
+            if score > best_score:
+                root, best_score = candidate, score
+    if root is None:
+        root = soup.body or soup
+
+    text = root.get_text(separator="\n", strip=True)
+    return title, text
+
+
+def needs_browser(html: str, text: str) -> bool:
+    """Detect pages whose content is only produced by JavaScript"""
+    if len(text) >= MIN_TEXT_CHARS:
+        return False
+    script_count = html.lower().count("<script")
+    return bool(_JS_APP_MARKERS.search(html)) or script_count >= 5 or not text
+
+
+class URLExtractor:
+    """Async HTTP-first page extractor with pooled connections and per-host limits.
+
+    Static pages are fetched with a shared httpx client and parsed with lxml.
+    Pages that turn out to need JavaScript are handed to the browser fallback.
+
+        async with URLExtractor() as extractor:
+            documents = await extractor.extract_many(urls)
+    """
+    def __init__(self, per_host_limit: int = PER_HOST_LIMIT, max_connections: int = MAX_CONNECTIONS,
+                 timeout: float = FETCH_TIMEOUT_SECONDS, browser_fallback: bool = True):
+        self.per_host_limit = per_host_limit
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self.browser_fallback = browser_fallback
+        self._client = None
+        self._host_limits: Dict[str, asyncio.Semaphore] = {}
+
+    async def __aenter__(self):
+        import httpx
+
+        self._client = httpx.AsyncClient(
+            timeout=self.timeout,
+            follow_redirects=True,
+            headers={"User-Agent": USER_AGENT},
+            limits=httpx.Limits(max_connections=self.max_connections, max_keepalive_connections=self.max_connections),
+        )
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self._client.aclose()
+        self._client = None
+
+    def _host_limit(self, url: str) -> asyncio.Semaphore:
+        host = urlparse(url).netloc
+        semaphore = self._host_limits.get(host)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.per_host_limit)
+            self._host_limits[host] = semaphore
+        return semaphore
+
+    async def fetch(self, url: str):
+        """GET a URL within its host's concurrency limit"""
+        async with self._host_limit(url):
+            with span("url.fetch"):
+                response = await self._client.get(url)
+        response.raise_for_status()
+        return response
+
+    async def extract(self, url: str) -> List[Document]:
+        """Fetch and extract a single page, falling back to a browser for JS-only pages.
+
+        HTTP errors and network failures return no documents; only a page
+        that was fetched and turned out to need JavaScript is rendered.
+        """
+        import httpx
+
+        try:
+            response = await self.fetch(url)
+        except httpx.HTTPError as e:
+            logger.error(f"Error fetching URL {url}: {str(e)}")
+            return []
+
+        content_type = response.headers.get("content-type", "").split(";")[0].strip().lower()
+        if content_type == "application/pdf":
+            return await asyncio.to_thread(_extract_pdf_bytes, url, response.content)
+        if content_type and "html" not in content_type and "xml" not in content_type:
+            if not content_type.startswith(_TEXT_TYPES):
+                logger.warning(f"Skipping URL {url}: unsupported content type {content_type}")
+                return []
+            # Plain text and similar responses need no parsing
+            return [Document(page_content=response.text, metadata={"source": url})]
+
+        html = response.text
+        with span("url.parse"):
+            title, text = await asyncio.to_thread(extract_main_content, html)
+
+        if self.browser_fallback and needs_browser(html, text):
+            logger.info(f"Page needs JavaScript, rendering in browser: {url}")
+            return await self._render(url)
+
+        return [Document(page_content=text, metadata={"source": url, "title": title})]
+
+    async def extract_many(self, urls: List[str]) -> List[Document]:
+        """Extract several URLs concurrently, preserving input order"""
+        results = await asyncio.gather(*(self.extract(url) for url in urls))
+        return [doc for docs in results for doc in docs]
+
+    async def _render(self, url: str) -> List[Document]:
+        from .extractors import extract_url_with_browser
+
+        with span("url.render"):
+            return await asyncio.to_thread(extract_url_with_browser, url)
+
+
+def _extract_pdf_bytes(url: str, content: bytes) -> List[Document]:
+    """Extract the pages of a PDF served at a URL"""
+    from .extractors import get_extractor
+
+    with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as f:
+        f.write(content)
+    try:
+        pages = get_extractor("pdf")(f.name)
+    finally:
+        os.unlink(f.name)
+    for page in pages:
+        page.metadata["source"] = url
+        page.metadata.pop("file_path", None)
+    return pages
+
+
+def run_sync(coroutine: Callable[[], Awaitable[T]]) -> T:
+    """Run a coroutine to completion from synchronous code.
+
+    asyncio.run() refuses to start inside a running event loop (e.g. when
+    called from an async FastAPI handler), so in that case the coroutine
+    runs on a fresh loop in a helper thread.
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coroutine())
+    with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+        return executor.submit(lambda: asyncio.run(coroutine())).result()
+
+
+async def extract_urls_async(urls: List[str], browser_fallback: bool = True) -> List[Document]:
+    async with URLExtractor(browser_fallback=browser_fallback) as extractor:
+        return await extractor.extract_many(urls)
+
+
+def extract_urls(urls: List[str], browser_fallback: bool = True) -> List[Document]:
+    """Synchronous entry point for background tasks and worker threads; async callers should await extract_urls_async"""
+    return run_sync(lambda: extract_urls_async(urls, browser_fallback=browser_fallback))
@@ -0,0 +1,211 @@
+import concurrent.futures
+import json
+import logging
+import os
+import re
+import tempfile
+from typing import Dict, List, Optional
+from dotenv import load_dotenv
+
+from langchain_core.documents import Document
+
+from .metrics_service import registry, span
+
+# Load environment variables
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# YouTube ingestion settings
+YOUTUBE_CACHE_DIR = os.getenv("YOUTUBE_CACHE_DIR", os.path.join("cache", "youtube"))
+YOUTUBE_MAX_WORKERS = int(os.getenv("YOUTUBE_MAX_WORKERS", "4"))
+
+VIDEO_ID_PATTERN = re.compile(r'(?:v=|\/|youtu\.be\/)([0-9A-Za-z_-]{11})(?:[?&#/]|$)')
+PLAYLIST_PATTERN = re.compile(r'[?&]list=([0-9A-Za-z_-]+)')
+
+youtube_cache_requests = registry.counter(
+    "deepnote_youtube_cache_requests_total", "YouTube transcript cache lookups by result"
+)
+
+
+def extract_video_id(url: str) -> Optional[str]:
+    match = VIDEO_ID_PATTERN.search(url)
+    return match.group(1) if match else None
+
+
+class YouTubeProvider:
+    """Network access to YouTube. Swap for a stub to ingest without network calls."""
+    def get_transcript(self, video_id: str) -> List[dict]:
+        """Transcript entries as {"text", "start", "duration"}"""
+        from .extractors import get_extractor
+
+        return get_extractor("youtube")(video_id)
+
+    def get_title(self, url: str, video_id: str) -> str:
+        """Get YouTube video title using multiple fallback methods"""
+        from .extractors import fetch_youtube_title_pytube
+
+        # Method 1: Try using pytube
+        try:
+            return fetch_youtube_title_pytube(url)
+        except Exception:
+            pass
+
+        # Method 2: Use requests to get page metadata
+        try:
+            import requests
+
+            response = requests.get(f"https://www.youtube.com/watch?v={video_id}", timeout=10)
+            if response.status_code == 200:
+                title_match = re.search(r'<title>(.*?)</title>', response.text)
+                if title_match:
+                    # Clean up title (remove " - YouTube" suffix)
+                    return re.sub(r'\s*-\s*YouTube\s*$', '', title_match.group(1))
+        except Exception:
+            pass
+
+        # Fallback: Use video ID as title
+        return f"YouTube Video {video_id}"
+
+    def expand_playlist(self, url: str) -> List[str]:
+        """Video URLs of a playlist"""
+        from pytube import Playlist
+
+        return list(Playlist(url).video_urls)
+
+
+class TranscriptCache:
+    """On-disk cache of titles and transcripts keyed by video id"""
+    def __init__(self, directory: str = YOUTUBE_CACHE_DIR):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, video_id: str) -> str:
+        return os.path.join(self.directory, f"{video_id}.json")
+
+    def get(self, video_id: str) -> Optional[dict]:
+        try:
+            with open(self._path(video_id), encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            youtube_cache_requests.inc(result="miss")
+            return None
+        youtube_cache_requests.inc(result="hit")
+        return entry
+
+    def put(self, video_id: str, entry: dict):
+        # Write to a temporary file first so readers never see a partial entry
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(entry, f)
+        os.replace(tmp_path, self._path(video_id))
+
+
+def chunk_transcript(entries: List[dict], chunk_size: int = 1000, chunk_overlap: int = 200) -> List[dict]:
+    """Group consecutive transcript entries into chunks that keep their timestamps"""
+    chunks = []
+    start = 0
+    while start < len(entries):
+        end = start
+        length = 0
+        while end < len(entries) and (length == 0 or length + len(entries[end]["text"]) + 1 <= chunk_size):
+            length += len(entries[end]["text"]) + 1
+            end += 1
+        window = entries[start:end]
+        last = window[-1]
+        chunks.append({
+            "text": " ".join(entry["text"] for entry in window),
+            "start": window[0].get("start", 0.0),
+            "end": last.get("start", 0.0) + last.get("duration", 0.0),
+        })
+        if end >= len(entries):
+            break
+
+        # Step back over entries that fit in the overlap
+        overlap = 0
+        next_start = end
+        while next_start - 1 > start and overlap + len(entries[next_start - 1]["text"]) + 1 <= chunk_overlap:
+            next_start -= 1
+            overlap += len(entries[next_start]["text"]) + 1
+        start = next_start
+    return chunks
+
+
+class YouTubeIngestor:
+    """Resolves many videos or playlists concurrently with an on-disk cache"""
+    def __init__(self, provider: Optional[YouTubeProvider] = None, cache: Optional[TranscriptCache] = None,
+                 max_workers: int = YOUTUBE_MAX_WORKERS):
+        self.provider = provider or YouTubeProvider()
+        self.cache = cache or TranscriptCache()
+        self.max_workers = max_workers
+
+    def expand(self, urls: List[str]) -> Dict[str, str]:
+        """Map video ids to URLs, expanding playlist links"""
+        videos: Dict[str, str] = {}
+        for url in urls:
+            video_id = extract_video_id(url)
+            if video_id is None and PLAYLIST_PATTERN.search(url):
+                try:
+                    for video_url in self.provider.expand_playlist(url):
+                        playlist_video_id = extract_video_id(video_url)
+                        if playlist_video_id:
+                            videos.setdefault(playlist_video_id, video_url)
+                except Exception as e:
+                    logger.error(f"Error expanding playlist {url}: {str(e)}")
+            elif video_id:
+                videos.setdefault(video_id, url)
+            else:
+                logger.error(f"Could not find a video id in: {url}")
+        return videos
+
+    def fetch(self, video_id: str, url: str) -> Optional[dict]:
+        """Title and transcript of one video, from the cache when possible"""
+        entry = self.cache.get(video_id)
+        if entry is not None:
+            return entry
+
+        with span("youtube.fetch"):
+            try:
+                transcript = self.provider.get_transcript(video_id)
+            except Exception as e:
+                logger.error(f"Error fetching transcript for video {video_id}: {str(e)}")
+                return None
+            if not transcript:
+                logger.error(f"No transcript found for video {video_id}")
+                return None
+            title = self.provider.get_title(url, video_id)
+
+        entry = {"video_id": video_id, "url": url, "title": title, "transcript": list(transcript)}
+        self.cache.put(video_id, entry)
+        return entry
+
+    def resolve(self, urls: List[str]) -> List[dict]:
+        """Resolve videos concurrently, preserving input order"""
+        videos = self.expand(urls)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            entries = executor.map(lambda item: self.fetch(*item), videos.items())
+            return [entry for entry in entries if entry]
+
+    def to_documents(self, entry: dict, chunk_size: int = 1000, chunk_overlap: int = 200) -> List[Document]:
+        """Timestamped transcript chunks for a resolved video"""
+        documents = []
+        for chunk in chunk_transcript(entry["transcript"], chunk_size, chunk_overlap):
+            start = int(chunk["start"])
+            documents.append(Document(
+                page_content=chunk["text"],
+                metadata={
+                    "source": f"https://www.youtube.com/watch?v={entry['video_id']}&t={start}s",
+                    "video_url": entry["url"],
+                    "title": entry["title"],
+                    "type": "youtube_transcript",
+                    "start": chunk["start"],
+                    "end": chunk["end"],
+                }
+            ))
+        return documents
+
+    def load(self, urls: List[str], chunk_size: int = 1000, chunk_overlap: int = 200) -> List[Document]:
+        documents = []
+        for entry in self.resolve(urls):
+            documents.extend(self.to_documents(entry, chunk_size, chunk_overlap))
+        return documents
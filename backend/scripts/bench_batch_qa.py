@@ -0,0 +1,104 @@
+"""Throughput of batch question answering against answering questions one at a time.
+
+Builds a synthetic index, then answers the same questions sequentially
+(retrieve_relevant_docs and answer_question per question) and through
+LLMController.answer_batch (one embedding call, batched vector and BM25
+scoring, concurrent generations). Embedding and generation are simulated
+with fixed latencies so no model server is needed.
+
+Usage (from the backend directory):
+    python scripts/bench_batch_qa.py --questions 500 --chunks 50000 --embed-ms 20 --llm-ms 200 --concurrency 8
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.documents import Document
+
+from app.controllers.llm_controller import LLMController
+from app.services.index_manager import IndexManager
+from app.services.rag_service import Retriever
+
+
+class SimulatedEmbeddings:
+    """Random vectors after a fixed latency per call, like a remote embedding model"""
+    def __init__(self, delay: float, dim: int):
+        self.delay = delay
+        self.dim = dim
+        self.rng = np.random.default_rng(0)
+
+    def embed_documents(self, texts):
+        time.sleep(self.delay)
+        return self.rng.standard_normal((len(texts), self.dim), dtype=np.float32).tolist()
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+class SimulatedLLMService:
+    """Answers after a fixed latency, like a local model serving requests in parallel"""
+    def __init__(self, delay: float):
+        self.delay = delay
+
+    def answer_question(self, question, documents, similarities=None):
+        time.sleep(self.delay)
+        return f"{len(documents)} sources", ""
+
+
+def build_retriever(chunks: int, dim: int, embeddings) -> Retriever:
+    rng = np.random.default_rng(0)
+    retriever = Retriever(embeddings=embeddings)
+    files = max(1, chunks // 500)
+    for file_id in range(files):
+        term_ids = rng.zipf(1.3, size=(chunks // files, 60)) % 50000
+        texts = [" ".join(f"t{term}" for term in row) for row in term_ids]
+        retriever.index.add_file(
+            [Document(page_content=text, metadata={"file_id": file_id}) for text in texts],
+            rng.standard_normal((len(texts), dim), dtype=np.float32),
+            [text.split() for text in texts],
+            file_id=file_id,
+        )
+    return retriever
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--questions", type=int, default=500)
+    parser.add_argument("--chunks", type=int, default=50000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--embed-ms", type=float, default=20.0)
+    parser.add_argument("--llm-ms", type=float, default=200.0)
+    parser.add_argument("--concurrency", type=int, default=8)
+    args = parser.parse_args()
+
+    embeddings = SimulatedEmbeddings(args.embed_ms / 1000, args.dim)
+    retriever = build_retriever(args.chunks, args.dim, embeddings)
+    llm = SimulatedLLMService(args.llm_ms / 1000)
+    rng = np.random.default_rng(1)
+    questions = [" ".join(f"t{term}" for term in rng.integers(1, 500, size=8)) for _ in range(args.questions)]
+
+    start = time.perf_counter()
+    for question in questions:
+        llm.answer_question(question, retriever.retrieve_relevant_docs(question))
+    sequential = time.perf_counter() - start
+
+    controller = LLMController(llm_service=llm, index_manager=IndexManager(loader=lambda key: retriever))
+    controller.index_manager.get(1)
+    start = time.perf_counter()
+    summary = list(controller.answer_batch(questions, user_id=1, concurrency=args.concurrency))[-1]
+    batch = time.perf_counter() - start
+
+    print(f"{len(retriever.index)} chunks, {args.questions} questions, "
+          f"embed {args.embed_ms:.0f} ms/call, generation {args.llm_ms:.0f} ms\n")
+    print(f"{'mode':10s} {'total s':>8} {'retrieve s':>11} {'questions/s':>12}")
+    print(f"{'sequential':10s} {sequential:>8.2f} {'':>11} {args.questions / sequential:>12.1f}")
+    print(f"{'batch':10s} {batch:>8.2f} {summary['retrieve_seconds']:>11.2f} {args.questions / batch:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""Latency of filtered vector and BM25 search as the filter gets more selective.
+
+Builds a synthetic HybridIndex (random embeddings, Zipf-distributed terms)
+split into many files, then times queries restricted to a growing share of
+the files. Filtering happens inside the scoring loops, so latency should drop
+with the share of rows selected.
+
+Usage (from the backend directory):
+    python scripts/bench_filtered_search.py --chunks 200000 --files 2000 --dim 384
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.documents import Document
+
+from app.services.index_service import HybridIndex
+
+
+def build_index(chunks: int, files: int, dim: int, vocabulary: int, rng) -> HybridIndex:
+    index = HybridIndex()
+    per_file = chunks // files
+    for file_id in range(files):
+        documents = [Document(page_content=f"{file_id}:{i}") for i in range(per_file)]
+        vectors = rng.standard_normal((per_file, dim), dtype=np.float32)
+        term_ids = rng.zipf(1.3, size=(per_file, 60)) % vocabulary
+        token_lists = [[f"t{term}" for term in row] for row in term_ids]
+        index.add_file(documents, vectors, token_lists, file_id=file_id,
+                       file_type="pdf" if file_id % 2 else "url", user_id=file_id % 100)
+    return index
+
+
+def timed(func, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--chunks", type=int, default=200000)
+    parser.add_argument("--files", type=int, default=2000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--vocabulary", type=int, default=50000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    index = build_index(args.chunks, args.files, args.dim, args.vocabulary, rng)
+    query_vector = rng.standard_normal(args.dim, dtype=np.float32)
+    query_terms = [f"t{term}" for term in rng.integers(1, 200, size=6)]
+    # Warm up lazily built matrices and postings
+    index.vector_search(query_vector)
+    index.bm25_search(query_terms)
+
+    print(f"{len(index)} chunks in {args.files} files, dim {args.dim}\n")
+    print(f"{'selected':>10} {'rows':>8} {'vector ms':>10} {'bm25 ms':>9}")
+    for share in (1.0, 0.5, 0.1, 0.01, 0.001):
+        if share == 1.0:
+            selection = None
+            rows = len(index)
+        else:
+            file_ids = rng.choice(args.files, size=max(1, int(args.files * share)), replace=False)
+            selection = index.select(file_ids=file_ids.tolist())
+            rows = selection.count
+        vector_ms = timed(lambda: index.vectors.search(query_vector, 5, selection), args.repeat)
+        bm25_ms = timed(lambda: index.bm25.search(query_terms, 5, selection), args.repeat)
+        print(f"{share:>10.1%} {rows:>8} {vector_ms:>10.2f} {bm25_ms:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""Time to first searchable chunks, total time and peak memory of streaming vs batch ingestion.
+
+The batch path extracts, splits, cleans and dedupes the whole file, then
+embeds and stores it; the streaming IngestPipeline overlaps the stages and
+stores micro-batches as they are ready. Embedding is simulated with a fixed
+latency per call so no model server is needed; storing is a no-op.
+
+Usage (from the backend directory):
+    python scripts/bench_ingest_pipeline.py ../pdf/ind_MAT.pdf --embed-ms 200 --batch-size 32
+"""
+import argparse
+import hashlib
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.file_service import DocumentProcessor
+from app.services.ingest_pipeline import IngestPipeline
+
+
+class SimulatedEmbeddings:
+    """Deterministic vectors after a fixed delay per call, like a remote embedding model"""
+    def __init__(self, delay: float, dim: int = 384):
+        self.delay = delay
+        self.dim = dim
+
+    def embed_documents(self, texts):
+        time.sleep(self.delay)
+        return [list(hashlib.sha256(text.encode()).digest()) * (self.dim // 32) for text in texts]
+
+
+def run_batch(path: str, embeddings, batch_size: int) -> tuple:
+    start = time.perf_counter()
+    documents = DocumentProcessor().process_documents(path, "pdf")
+    for i in range(0, len(documents), batch_size):
+        embeddings.embed_documents([doc.page_content for doc in documents[i:i + batch_size]])
+    # The whole file is stored in one commit, so nothing is searchable before the end
+    total = time.perf_counter() - start
+    return len(documents), total, total
+
+
+def run_streaming(path: str, embeddings, batch_size: int) -> tuple:
+    processor = DocumentProcessor()
+    pipeline = IngestPipeline(processor, lambda batch, vectors: None, embeddings=embeddings, batch_size=batch_size)
+    stats = pipeline.run(processor.stream_pages(path, "pdf"), "pdf")
+    return stats.chunks, stats.first_batch_seconds, stats.seconds
+
+
+def measure(func, *args) -> tuple:
+    tracemalloc.start()
+    result = func(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, peak / 1024 / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("pdf")
+    parser.add_argument("--embed-ms", type=float, default=200.0, help="simulated latency per embedding call")
+    parser.add_argument("--batch-size", type=int, default=32)
+    args = parser.parse_args()
+
+    embeddings = SimulatedEmbeddings(args.embed_ms / 1000)
+    print(f"{'mode':10s} {'chunks':>7} {'first batch s':>14} {'total s':>8} {'peak MB':>8}")
+    for mode, func in (("batch", run_batch), ("streaming", run_streaming)):
+        (chunks, first, total), peak = measure(func, args.pdf, embeddings, args.batch_size)
+        print(f"{mode:10s} {chunks:>7} {first:>14.2f} {total:>8.2f} {peak:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""Benchmark requests/sec through the middleware stack.
+
+Compares the previous BaseHTTPMiddleware based stack with the pure ASGI
+middleware in app.api.middleware, driving the apps in-process so that only
+middleware overhead is measured.
+
+Usage (from the backend directory):
+    python scripts/bench_middleware.py --requests 5000
+"""
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import jwt
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from starlette.middleware.base import BaseHTTPMiddleware
+
+from app.api.middleware.auth_middleware import AuthMiddleware, create_access_token, SECRET_KEY, ALGORITHM
+from app.api.middleware.error_middleware import ErrorMiddleware
+from app.api.middleware.logging_middleware import LoggingMiddleware
+
+
+class LegacyLoggingMiddleware(BaseHTTPMiddleware):
+    async def dispatch(self, request: Request, call_next):
+        request.state.request_id = "bench"
+        response = await call_next(request)
+        response.headers["X-Request-ID"] = "bench"
+        return response
+
+
+class LegacyErrorMiddleware(BaseHTTPMiddleware):
+    async def dispatch(self, request: Request, call_next):
+        try:
+            return await call_next(request)
+        except Exception:
+            return JSONResponse(status_code=500, content={"detail": "error"})
+
+
+class LegacyAuthMiddleware(BaseHTTPMiddleware):
+    async def dispatch(self, request: Request, call_next):
+        token = request.headers.get("Authorization", "").split(" ")[-1]
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        request.state.user = {"id": payload.get("sub")}
+        return await call_next(request)
+
+
+def build_app(middleware):
+    app = FastAPI()
+
+    @app.get("/api/files/")
+    def get_files():
+        return []
+
+    for cls in middleware:
+        app.add_middleware(cls)
+    return app
+
+
+async def run(app, total: int, concurrency: int, token: str) -> float:
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": "/api/files/",
+        "raw_path": b"/api/files/",
+        "query_string": b"",
+        "root_path": "",
+        "headers": [(b"host", b"bench"), (b"authorization", f"Bearer {token}".encode())],
+        "client": ("127.0.0.1", 1234),
+        "server": ("bench", 80),
+    }
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    async def worker(count: int):
+        for _ in range(count):
+            await app(dict(scope), receive, send)
+
+    # Warm up routing and middleware construction
+    await worker(50)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(total // concurrency) for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    return (total // concurrency) * concurrency / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=10)
+    args = parser.parse_args()
+
+    # Keep per-request log lines out of the measurement
+    logging.disable(logging.INFO)
+
+    token = create_access_token({"sub": "1", "email": "bench@example.com"})
+    stacks = {
+        "BaseHTTPMiddleware": [LegacyAuthMiddleware, LegacyErrorMiddleware, LegacyLoggingMiddleware],
+        "pure ASGI": [AuthMiddleware, ErrorMiddleware, LoggingMiddleware],
+    }
+    for name, middleware in stacks.items():
+        rps = asyncio.run(run(build_app(middleware), args.requests, args.concurrency, token))
+        print(f"{name:>20}: {rps:10.0f} req/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""Mean answer latency with and without routing easy questions to the fast model.
+
+Answers a query mix through LLMService twice: once with every question on the
+reasoning model, once with the cascade (QueryRouter) and an optional think
+token cap. Both models are simulated: they stream one token per --token-ms,
+the reasoning model after a <think> section of --think-tokens. Lookups get a
+clear top retrieval match, open questions a weaker, closer one.
+
+Usage (from the backend directory):
+    python scripts/bench_model_routing.py --questions 200 --easy-share 0.6 --think-tokens 300 --token-ms 5
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.documents import Document
+from langchain_core.runnables import RunnableGenerator
+
+from app.services.llm_service import LLMService
+
+LOOKUPS = [
+    "What is the definition of {topic}?",
+    "Who introduced {topic}?",
+    "When was {topic} first described?",
+    "Which chapter covers {topic}?",
+    "Apa itu {topic}?",
+]
+OPEN_QUESTIONS = [
+    "Why does {topic} matter for the results in chapter 3?",
+    "Compare {topic} with the approach in the appendix.",
+    "How would {topic} change if the inputs doubled?",
+    "Jelaskan bagaimana {topic} digunakan dalam contoh tersebut.",
+]
+TOPICS = ["matrix rank", "eigenvalues", "the chain rule", "linear independence", "gradient descent"]
+
+
+def simulated_model(token_seconds: float, think_tokens: int = 0, answer_tokens: int = 40):
+    """Streams a <think> section (if any) and an answer, one token per token_seconds"""
+    def stream(inputs):
+        for _ in inputs:
+            pass
+        tokens = (["<think>"] + ["hmm "] * think_tokens + ["</think>"]) if think_tokens else []
+        for token in tokens + ["word "] * answer_tokens:
+            time.sleep(token_seconds)
+            yield token
+    return RunnableGenerator(stream)
+
+
+def query_mix(count: int, easy_share: float, rng: random.Random) -> list:
+    """(question, documents, similarities, is_easy) tuples"""
+    documents = [Document(page_content=f"chunk {i}", metadata={"chunk_id": i}) for i in range(5)]
+    mix = []
+    for _ in range(count):
+        easy = rng.random() < easy_share
+        template = rng.choice(LOOKUPS if easy else OPEN_QUESTIONS)
+        top = rng.uniform(0.6, 0.85) if easy else rng.uniform(0.35, 0.6)
+        gap = rng.uniform(0.03, 0.15) if easy else rng.uniform(0.0, 0.03)
+        similarities = [top, top - gap] + [top - gap - 0.01 * i for i in range(1, 4)]
+        mix.append((template.format(topic=rng.choice(TOPICS)), documents, similarities, easy))
+    return mix
+
+
+def run(service: LLMService, mix: list) -> tuple:
+    latencies, fast = [], 0
+    for question, documents, similarities, _ in mix:
+        start = time.perf_counter()
+        _, _, decision = service.answer(
+            service.answer_prompt, {"question": question, "context": "..."}, question, documents, similarities
+        )
+        latencies.append(time.perf_counter() - start)
+        fast += decision.model == service.fast_model_name
+    return latencies, fast
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--questions", type=int, default=200)
+    parser.add_argument("--easy-share", type=float, default=0.6, help="share of simple lookups in the mix")
+    parser.add_argument("--think-tokens", type=int, default=300)
+    parser.add_argument("--token-ms", type=float, default=5.0)
+    parser.add_argument("--think-cap", type=int, default=0, help="think token cap of the cascade run")
+    args = parser.parse_args()
+
+    token_seconds = args.token_ms / 1000
+    models = {
+        "reasoning": simulated_model(token_seconds, args.think_tokens),
+        "fast": simulated_model(token_seconds / 2),
+    }
+    mix = query_mix(args.questions, args.easy_share, random.Random(0))
+
+    baseline = LLMService(model_name="reasoning", fast_model_name=None, models=models)
+    cascade = LLMService(model_name="reasoning", fast_model_name="fast", think_token_cap=args.think_cap,
+                         models=models)
+    print(f"{'mode':10s} {'mean s':>7} {'p50 s':>7} {'p95 s':>7} {'fast share':>11}")
+    results = {}
+    for mode, service in (("reasoning", baseline), ("cascade", cascade)):
+        latencies, fast = run(service, mix)
+        results[mode] = statistics.mean(latencies)
+        p95 = statistics.quantiles(latencies, n=20)[-1]
+        print(f"{mode:10s} {results[mode]:>7.3f} {statistics.median(latencies):>7.3f} {p95:>7.3f} "
+              f"{fast / len(mix):>11.1%}")
+    hard_to_fast = sum(
+        1 for question, documents, similarities, easy in mix
+        if not easy and cascade.router.route(question, documents, similarities).model == "fast"
+    )
+    print(f"\nmean latency {results['cascade'] / results['reasoning']:.0%} of reasoning-only; "
+          f"{hard_to_fast} open questions routed to the fast model")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""Benchmark and equivalence check of the text splitter against LangChain.
+
+Extracts the bundled PDFs in ../pdf once, then splits every page with both
+LangChain's RecursiveCharacterTextSplitter and app.services.text_splitter,
+checking that chunks and start offsets are identical and reporting timings.
+Exits non-zero on any difference, except where LangChain's offset search
+found an earlier copy of a repeated chunk (its offsets are guesses refined
+with str.find; ours are exact).
+
+Usage (from the backend directory):
+    python scripts/bench_splitter.py --pdf-dir ../pdf --repeat 5
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from app.services.extractors import get_extractor
+from app.services.text_splitter import TextSplitter, DEFAULT_SEPARATORS
+
+
+def same_offsets(text: str, expected, actual) -> bool:
+    """Whether the chunks of one page start at the same offsets, allowing LangChain's matches on
+    earlier copies of a chunk"""
+    for expected_doc, actual_doc in zip(expected, actual):
+        start, langchain_start = actual_doc.metadata["start_index"], expected_doc.metadata["start_index"]
+        if start != langchain_start and not (
+            langchain_start < start and text.startswith(actual_doc.page_content, langchain_start)
+        ):
+            return False
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pdf-dir", default=os.path.join("..", "pdf"))
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--chunk-overlap", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    langchain_splitter = RecursiveCharacterTextSplitter(
+        chunk_size=args.chunk_size,
+        chunk_overlap=args.chunk_overlap,
+        separators=DEFAULT_SEPARATORS,
+        add_start_index=True,
+    )
+    splitter = TextSplitter(args.chunk_size, args.chunk_overlap, DEFAULT_SEPARATORS)
+
+    failed = False
+    for path in sorted(glob.glob(os.path.join(args.pdf_dir, "*.pdf"))):
+        pages = get_extractor("pdf")(path)
+        characters = sum(len(page.page_content) for page in pages)
+
+        expected = langchain_splitter.split_documents(pages)
+        actual = splitter.split_documents(pages)
+        same_text = [doc.page_content for doc in expected] == [doc.page_content for doc in actual]
+        # Offsets are per page, so they are compared page by page
+        offsets_match = same_text and all(
+            same_offsets(page.page_content, langchain_splitter.split_documents([page]), splitter.split_documents([page]))
+            for page in pages
+        )
+
+        timings = {}
+        for name, split in (("langchain", langchain_splitter.split_documents), ("native", splitter.split_documents)):
+            start = time.perf_counter()
+            for _ in range(args.repeat):
+                split(pages)
+            timings[name] = (time.perf_counter() - start) / args.repeat
+
+        print(
+            f"{os.path.basename(path)}: {len(pages)} pages, {characters} chars, {len(actual)} chunks | "
+            f"langchain {timings['langchain'] * 1000:.1f} ms, native {timings['native'] * 1000:.1f} ms "
+            f"({timings['langchain'] / timings['native']:.1f}x) | "
+            f"chunks {'match' if same_text else 'DIFFER'}, offsets {'match' if offsets_match else 'DIFFER'}"
+        )
+        failed = failed or not (same_text and offsets_match)
+
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""Throughput benchmark of the BM25 analyzers against NLTK's word_tokenize.
+
+Extracts the bundled PDFs in ../pdf once, splits them into chunks like the
+ingestion pipeline does, then tokenizes every chunk with NLTK and with each
+registered analyzer, reporting chunks/s, tokens/s and MB/s plus the term
+cache hit rate.
+
+Usage (from the backend directory):
+    python scripts/bench_tokenizer.py --pdf-dir ../pdf --repeat 3
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.analyzer import Analyzer, _ANALYZERS
+from app.services.extractors import get_extractor
+from app.services.text_splitter import TextSplitter
+
+
+def load_chunks(pdf_dir: str) -> list:
+    splitter = TextSplitter(1000, 200)
+    chunks = []
+    for path in sorted(glob.glob(os.path.join(pdf_dir, "*.pdf"))):
+        for page in get_extractor("pdf")(path):
+            chunks.extend(splitter.split_text(page.page_content))
+    return chunks
+
+
+def nltk_tokenizer():
+    import nltk
+    from nltk.tokenize import word_tokenize
+
+    try:
+        nltk.data.find("tokenizers/punkt_tab")
+    except LookupError:
+        if not nltk.download("punkt_tab", quiet=True):
+            return None
+    return word_tokenize
+
+
+def measure(tokenize, chunks: list, repeat: int):
+    token_count = 0
+    start = time.perf_counter()
+    for _ in range(repeat):
+        token_count = sum(len(tokenize(chunk)) for chunk in chunks)
+    return (time.perf_counter() - start) / repeat, token_count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pdf-dir", default=os.path.join("..", "pdf"))
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--skip-nltk", action="store_true", help="Only benchmark the analyzers")
+    args = parser.parse_args()
+
+    chunks = load_chunks(args.pdf_dir)
+    megabytes = sum(len(chunk.encode("utf-8")) for chunk in chunks) / 1e6
+    print(f"{len(chunks)} chunks, {megabytes:.2f} MB\n")
+
+    candidates = []
+    if not args.skip_nltk:
+        word_tokenize = nltk_tokenizer()
+        if word_tokenize is None:
+            print("NLTK punkt data is unavailable, skipping word_tokenize\n")
+        else:
+            candidates.append(("nltk word_tokenize", word_tokenize))
+    # Fresh instances so each analyzer starts with a cold term cache
+    candidates += [(f"analyzer:{name}", factory()) for name, factory in _ANALYZERS.items()]
+
+    baseline = None
+    for name, tokenize in candidates:
+        seconds, tokens = measure(tokenize, chunks, args.repeat)
+        baseline = baseline or seconds
+        line = (
+            f"{name:24s} {seconds * 1000:8.1f} ms  {len(chunks) / seconds:9.0f} chunks/s  "
+            f"{tokens / seconds:10.0f} tokens/s  {megabytes / seconds:6.1f} MB/s  "
+            f"{baseline / seconds:5.1f}x  ({tokens} tokens)"
+        )
+        if isinstance(tokenize, Analyzer):
+            info = tokenize.cache_info()
+            lookups = info.hits + info.misses
+            if lookups:
+                line += f"  term cache {info.hits / lookups:.1%} hits, {info.currsize} terms"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
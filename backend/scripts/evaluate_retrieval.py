@@ -0,0 +1,228 @@
+"""Offline retrieval quality, latency and memory of retriever configurations.
+
+Loads a question / answer-span dataset (JSON lines with "question", "answer"
+and "source", the PDF file name), chunks and indexes the PDFs it refers to
+like ingestion does, and runs every question through each configured
+retriever: `bm25`, `vector`, or `hybrid:W_SEM,W_BM25` (reciprocal rank fusion
+weights). A chunk is relevant when it contains the answer span (compared
+without case, spaces or punctuation, which PDF extraction mangles).
+
+Reported per configuration: recall@k (share of questions with a relevant chunk
+in the top k), MRR and binary nDCG@k over the largest k, p50/p95/p99 query
+latency including the query embedding, and the index size. Each
+--vector-dtype gets its own rows, so e.g. float16 vectors can be weighed
+against their recall.
+
+Embeddings come from Ollama (--embeddings MODEL, EMBEDDING_MODEL by default),
+or from a local feature-hashing embedding with --embeddings hashing, which
+needs no model server and makes runs reproducible.
+
+Usage (from the backend directory):
+    python scripts/evaluate_retrieval.py --retrievers bm25 vector hybrid:0.5,0.5 --k 1 5 10
+    python scripts/evaluate_retrieval.py --embeddings hashing --vector-dtype float32 float16 --json eval.json
+"""
+import argparse
+import json
+import os
+import re
+import resource
+import sys
+import time
+import tracemalloc
+import zlib
+from typing import List
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.embeddings import Embeddings
+
+from app.services.file_service import DocumentProcessor
+from app.services.index_manager import EMBEDDING_MODEL
+from app.services.index_service import VectorIndex
+from app.services.rag_service import Retriever, as_documents
+
+
+class HashingEmbeddings(Embeddings):
+    """Feature-hashed word and character trigram counts; a deterministic offline stand-in for a model"""
+    def __init__(self, dim: int = 1024):
+        self.dim = dim
+
+    def embed_query(self, text: str) -> List[float]:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for word in re.findall(r"\w+", text.lower()):
+            vector[zlib.crc32(word.encode()) % self.dim] += 1.0
+            padded = f" {word} "
+            for i in range(len(padded) - 2):
+                vector[zlib.crc32(padded[i:i + 3].encode()) % self.dim] += 0.5
+        return vector.tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self.embed_query(text) for text in texts]
+
+
+def normalize(text: str) -> str:
+    return re.sub(r"\W+", "", text.lower())
+
+
+def load_dataset(path: str) -> List[dict]:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def build_retriever(pdf_dir: str, sources: List[str], embeddings: Embeddings) -> Retriever:
+    """Chunk and index each source PDF as one file; chunk ids are row numbers"""
+    retriever = Retriever(embeddings=embeddings)
+    processor = DocumentProcessor()
+    for file_id, source in enumerate(sources):
+        documents = as_documents(processor.process_documents(os.path.join(pdf_dir, source), "pdf"))
+        for row, doc in enumerate(documents, start=len(retriever.index)):
+            doc.metadata["chunk_id"] = row
+            doc.metadata["source"] = source
+        retriever.index_documents(documents, file_id=file_id, file_type="pdf")
+    return retriever
+
+
+def relevant_rows(retriever: Retriever, dataset: List[dict]) -> List[set]:
+    texts = [(normalize(doc.page_content), doc.metadata["source"]) for doc in retriever.index.documents]
+    return [
+        {row for row, (text, source) in enumerate(texts) if source == item["source"] and normalize(item["answer"]) in text}
+        for item in dataset
+    ]
+
+
+def search_function(retriever: Retriever, config: str):
+    """A function from (question, k) to ranked row ids for a retriever config"""
+    index = retriever.index
+    if config == "bm25":
+        return lambda question, k: [doc.metadata["chunk_id"] for doc in index.bm25_search(retriever.analyzer(question), k)]
+    if config == "vector":
+        return lambda question, k: [
+            doc.metadata["chunk_id"] for doc in index.vector_search(retriever.embeddings.embed_query(question), k)
+        ]
+    if config.startswith("hybrid"):
+        weights = config.partition(":")[2] or "0.5,0.5"
+        semantic_weight, bm25_weight = (float(weight) for weight in weights.split(","))
+        retriever.create_hybrid_retriever(semantic_weight, bm25_weight)
+        return lambda question, k: [
+            doc.metadata["chunk_id"] for doc in retriever.retrieve_relevant_docs(question, k)
+        ]
+    raise ValueError(f"Unknown retriever {config!r}; use bm25, vector or hybrid:W_SEM,W_BM25")
+
+
+def score(ranked: List[list], relevant: List[set], ks: List[int]) -> dict:
+    """recall@k for each k, and MRR and binary nDCG at the largest k"""
+    depth = max(ks)
+    recall = {k: float(np.mean([bool(set(rows[:k]) & rel) for rows, rel in zip(ranked, relevant)])) for k in ks}
+    reciprocal_ranks, ndcgs = [], []
+    discounts = 1.0 / np.log2(np.arange(2, depth + 2))
+    for rows, rel in zip(ranked, relevant):
+        hits = [row in rel for row in rows[:depth]]
+        reciprocal_ranks.append(1.0 / (hits.index(True) + 1) if True in hits else 0.0)
+        dcg = float(np.dot(hits, discounts[:len(hits)]))
+        ndcgs.append(dcg / float(discounts[:min(len(rel), depth)].sum()))
+    return {"recall": recall, "mrr": float(np.mean(reciprocal_ranks)), "ndcg": float(np.mean(ndcgs))}
+
+
+def run(search, questions: List[str], depth: int, trace_memory: bool) -> tuple:
+    search(questions[0], depth)  # warm up lazily built matrices and postings
+    ranked, latencies = [], []
+    for question in questions:
+        start = time.perf_counter()
+        ranked.append(search(question, depth))
+        latencies.append((time.perf_counter() - start) * 1000)
+    peak = None
+    if trace_memory:
+        # A separate pass, as tracing slows every allocation down
+        tracemalloc.start()
+        for question in questions:
+            search(question, depth)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return ranked, latencies, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--dataset", default=os.path.join("..", "pdf", "eval_qa.jsonl"))
+    parser.add_argument("--pdf-dir", default=os.path.join("..", "pdf"))
+    parser.add_argument("--retrievers", nargs="+", default=["bm25", "vector", "hybrid:0.5,0.5"])
+    parser.add_argument("--k", type=int, nargs="+", default=[1, 5, 10])
+    parser.add_argument("--embeddings", default=EMBEDDING_MODEL, help="Ollama model, or 'hashing'")
+    parser.add_argument("--vector-dtype", nargs="+", default=["float32"], choices=["float32", "float16"])
+    parser.add_argument("--trace-memory", action="store_true", help="also report peak Python allocations per run")
+    parser.add_argument("--json", help="write the results to this file")
+    args = parser.parse_args()
+
+    dataset = load_dataset(args.dataset)
+    embeddings = HashingEmbeddings() if args.embeddings == "hashing" else None
+    sources = sorted({item["source"] for item in dataset})
+    start = time.perf_counter()
+    retriever = build_retriever(args.pdf_dir, sources, embeddings or Retriever(args.embeddings).embeddings)
+    build_seconds = time.perf_counter() - start
+
+    relevant = relevant_rows(retriever, dataset)
+    for item, rel in zip(dataset, relevant):
+        if not rel:
+            print(f"warning: no chunk of {item['source']} contains the answer to {item['question']!r}; skipped",
+                  file=sys.stderr)
+    answerable = [(item["question"], rel) for item, rel in zip(dataset, relevant) if rel]
+    if not answerable:
+        sys.exit("No question has a relevant chunk")
+    questions = [question for question, _ in answerable]
+    relevant = [rel for _, rel in answerable]
+    ks = sorted(set(args.k))
+    depth = max(ks)
+    print(f"{len(retriever.index)} chunks from {len(sources)} PDFs indexed in {build_seconds:.1f}s; "
+          f"{len(questions)}/{len(dataset)} questions answerable; embeddings: {args.embeddings}\n")
+
+    float32_vectors = retriever.index.vectors
+    results = []
+    recall_columns = " ".join(f"{f'R@{k}':>6}" for k in ks)
+    print(f"{'retriever':18s} {'vectors':>8} {recall_columns} {f'MRR@{depth}':>7} {f'nDCG@{depth}':>8} "
+          f"{'p50 ms':>7} {'p95 ms':>7} {'p99 ms':>7} {'index MB':>9}" + (f" {'peak KB':>8}" if args.trace_memory else ""))
+    for dtype in args.vector_dtype:
+        retriever.index.vectors = (
+            float32_vectors if dtype == "float32"
+            else VectorIndex.from_matrix(float32_vectors.matrix.astype(dtype))
+        )
+        for config in args.retrievers:
+            if config == "bm25" and dtype != args.vector_dtype[0]:
+                continue  # vectors play no part in BM25
+            ranked, latencies, peak = run(search_function(retriever, config), questions, depth, args.trace_memory)
+            metrics = score(ranked, relevant, ks)
+            p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+            result = {
+                "retriever": config,
+                "vector_dtype": "-" if config == "bm25" else dtype,
+                "questions": len(questions),
+                "recall": {str(k): value for k, value in metrics["recall"].items()},
+                "mrr": metrics["mrr"],
+                "ndcg": metrics["ndcg"],
+                "latency_ms": {"p50": float(p50), "p95": float(p95), "p99": float(p99)},
+                "index_bytes": retriever.index.nbytes(),
+                "peak_query_bytes": peak,
+            }
+            results.append(result)
+            recalls = " ".join(f"{metrics['recall'][k]:>6.3f}" for k in ks)
+            print(f"{config:18s} {result['vector_dtype']:>8} {recalls} {metrics['mrr']:>7.3f} {metrics['ndcg']:>8.3f} "
+                  f"{p50:>7.2f} {p95:>7.2f} {p99:>7.2f} {result['index_bytes'] / 2 ** 20:>9.2f}"
+                  + (f" {peak / 1024:>8.0f}" if args.trace_memory else ""))
+
+    max_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"\nmax RSS {max_rss_mb:.0f} MB")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({
+                "dataset": args.dataset,
+                "embeddings": args.embeddings,
+                "chunks": len(retriever.index),
+                "build_seconds": build_seconds,
+                "max_rss_mb": max_rss_mb,
+                "results": results,
+            }, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""Import-time profile of the API and ingestion modules.
+
+Runs `python -X importtime` in a fresh interpreter and prints the slowest
+imports. With --check it exits non-zero when a heavy loader library is
+imported eagerly or the cold import exceeds the time budget, so it can be
+used as a startup-time regression check in CI.
+
+Usage (from the backend directory):
+    python scripts/profile_imports.py --module app.api.main --top 25
+    python scripts/profile_imports.py --module app.services.file_service --check
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Libraries that must only be imported by the extractor or retriever that needs them
+HEAVY_MODULES = (
+    "selenium",
+    "pytube",
+    "youtube_transcript_api",
+    "pdfplumber",
+    "nltk",
+    "langchain_community",
+    "langchain.retrievers",
+    "langchain_ollama",
+)
+
+
+def profile(module: str):
+    """Return (cumulative microseconds, module name) for every import of `module`"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=BACKEND_DIR,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        print(result.stderr, file=sys.stderr)
+        raise SystemExit(f"Importing {module} failed")
+
+    entries = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        # Lines look like "import time:   self_us |   cumulative_us | name"
+        _, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        entries.append((int(cumulative_us), name.strip()))
+    return entries
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--module", default="app.api.main")
+    parser.add_argument("--top", type=int, default=20)
+    parser.add_argument("--check", action="store_true", help="fail on heavy eager imports or a slow cold start")
+    parser.add_argument("--budget-ms", type=float, default=1500.0, help="cold import budget for --check")
+    args = parser.parse_args()
+
+    entries = profile(args.module)
+    names = {name for _, name in entries}
+    total_ms = max((us for us, name in entries if name == args.module), default=0) / 1000
+
+    print(f"Cold import of {args.module}: {total_ms:.1f} ms ({len(entries)} modules)")
+    for cumulative_us, name in sorted(entries, reverse=True)[:args.top]:
+        print(f"{cumulative_us / 1000:10.1f} ms  {name}")
+
+    if not args.check:
+        return
+
+    eager = sorted(
+        name for name in names
+        if any(name == heavy or name.startswith(heavy + ".") for heavy in HEAVY_MODULES)
+    )
+    failed = False
+    if eager:
+        print(f"FAIL: heavy modules imported eagerly: {', '.join(eager[:10])}")
+        failed = True
+    if total_ms > args.budget_ms:
+        print(f"FAIL: cold import took {total_ms:.1f} ms, budget is {args.budget_ms:.1f} ms")
+        failed = True
+    if failed:
+        raise SystemExit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""Rebuild the FileChunk rows of PDF files from the extracted-text cache.
+
+Cached page text is re-split, re-cleaned and re-deduplicated with the current
+DocumentProcessor code (or --chunk-size/--chunk-overlap) without opening a
+PDF, so changing the chunking or clean_text only costs the cheap steps.
+Files missing from the cache are extracted once (and cached) if they are
+still on disk, or skipped with --cache-only. Files are chunked in parallel
+worker processes and written one transaction per file, in upload order per
+user so near-duplicates keep pointing at the earliest chunk.
+
+Rebuilt chunks have no embeddings unless --embed is given; the index segments
+of affected users are unpublished either way, so their next load rebuilds from
+the database (embedding what is missing). API workers running without
+segments keep serving their resident indexes until restarted.
+
+Usage (from the backend directory):
+    python scripts/reprocess_chunks.py --chunk-size 800 --chunk-overlap 150 --workers 8
+    python scripts/reprocess_chunks.py --user-id 3 --dry-run
+"""
+import argparse
+import concurrent.futures
+import os
+import sys
+import time
+from itertools import groupby
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.db import SessionLocal
+from app.db.repositories.file_repository import FileRepository
+from app.services.dedup_service import Deduplicator, SimHashIndex, is_duplicate
+from app.services.file_service import DocumentProcessor
+from app.services.text_cache import ExtractedTextCache, content_hash
+from app.services.text_splitter import TextSplitter
+
+
+def chunk_file(job: tuple) -> tuple:
+    """Worker: (file_id, cleaned chunk Documents) of one file, read from the cache"""
+    file_id, file_path, key, cache, chunk_size, chunk_overlap = job
+    # The parent's cache, not one configured from this process's environment
+    processor = DocumentProcessor(text_cache=cache)
+    if chunk_size is not None:
+        processor.chunk_size = chunk_size
+    if chunk_overlap is not None:
+        processor.chunk_overlap = chunk_overlap
+    processor.text_splitter = TextSplitter(
+        chunk_size=processor.chunk_size,
+        chunk_overlap=processor.chunk_overlap,
+        separators=processor.text_splitter.separators,
+    )
+    # Same page handling as streaming ingestion, so rebuilt chunks match freshly ingested ones
+    documents = []
+    for page in processor.stream_pages(file_path, "pdf", key):
+        documents.extend(processor.clean_chunks(processor.split_page(page)))
+    return file_id, documents
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--user-id", type=int)
+    parser.add_argument("--file-id", type=int, nargs="+")
+    parser.add_argument("--chunk-size", type=int)
+    parser.add_argument("--chunk-overlap", type=int)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--cache-only", action="store_true", help="skip files without a cache entry")
+    parser.add_argument("--embed", action="store_true", help="embed rebuilt chunks now instead of on next load")
+    parser.add_argument("--dry-run", action="store_true", help="chunk and report without writing")
+    args = parser.parse_args()
+
+    cache = ExtractedTextCache(enabled=True)
+    db = SessionLocal()
+    embeddings = None
+    if args.embed:
+        from app.services.index_manager import EMBEDDING_MODEL
+        from app.services.rag_service import InstrumentedEmbeddings
+
+        embeddings = InstrumentedEmbeddings(EMBEDDING_MODEL)
+
+    # Resolve every file to its cache key up front; hashing is cheap next to parsing
+    files = []
+    skipped = 0
+    for db_file in FileRepository.get_files_by_type(db, "pdf", args.user_id, args.file_id):
+        key = db_file.content_hash
+        if key is None and os.path.exists(db_file.file_path):
+            key = content_hash(db_file.file_path)
+            if not args.dry_run:
+                FileRepository.set_content_hash(db, db_file.id, key)
+        if key is None or (not cache.contains(key) and (args.cache_only or not os.path.exists(db_file.file_path))):
+            reason = "not in the text cache" if args.cache_only else "not cached and not on disk"
+            print(f"Skipping file {db_file.id} ({db_file.filename}): {reason}")
+            skipped += 1
+            continue
+        files.append((db_file, key))
+
+    start = time.perf_counter()
+    total_chunks = 0
+    users = set()
+    jobs = [
+        (db_file.id, db_file.file_path, key, cache, args.chunk_size, args.chunk_overlap) for db_file, key in files
+    ]
+    with concurrent.futures.ProcessPoolExecutor(max_workers=args.workers) as executor:
+        # Results arrive in job order, i.e. grouped by user in upload order
+        results = executor.map(chunk_file, jobs, chunksize=4)
+        for user_id, user_files in groupby(files, key=lambda item: item[0].user_id):
+            user_files = list(user_files)
+            users.add(user_id)
+            # Dedupe against the user's files that are not being rebuilt, then against rebuilt ones in order
+            corpus_index = SimHashIndex.from_fingerprints(FileRepository.get_user_fingerprints(
+                db, user_id, exclude_file_ids=[db_file.id for db_file, _ in user_files]
+            ))
+            for _ in user_files:
+                file_id, documents = next(results)
+                ratio = Deduplicator(corpus_index).dedupe(documents)
+                total_chunks += len(documents)
+                if args.dry_run:
+                    print(f"File {file_id}: {len(documents)} chunks, dedup ratio {ratio:.1%}")
+                    continue
+
+                vectors = None
+                if embeddings is not None:
+                    canonical = [i for i, doc in enumerate(documents) if not is_duplicate(doc)]
+                    embedded = embeddings.embed_documents([documents[i].page_content for i in canonical])
+                    vectors = [None] * len(documents)
+                    for i, vector in zip(canonical, embedded):
+                        vectors[i] = vector
+                chunk_ids = FileRepository.replace_document_chunks(db, file_id, documents, vectors)
+                FileRepository.set_dedup_ratio(db, file_id, ratio)
+                for index, doc in enumerate(documents):
+                    if not is_duplicate(doc):
+                        corpus_index.add(doc.metadata["fingerprint"], chunk_ids[index])
+
+    seconds = time.perf_counter() - start
+    if not args.dry_run:
+        from app.services.index_manager import INDEX_SEGMENTS_ENABLED
+        from app.services.index_segments import SegmentStore
+
+        if INDEX_SEGMENTS_ENABLED:
+            store = SegmentStore()
+            for user_id in users:
+                store.unpublish(user_id)
+    db.close()
+    print(f"Rebuilt {len(files)} files ({total_chunks} chunks) for {len(users)} users in {seconds:.1f}s, "
+          f"{len(files) / seconds if seconds else 0:.1f} files/s; skipped {skipped}")
+
+
+if __name__ == "__main__":
+    main()
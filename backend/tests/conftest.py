@@ -0,0 +1,61 @@
+import hashlib
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+# Tests import the app the way the scripts do, from the backend directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class SiteServer:
+    """A local HTTP server serving a dict of path -> (status, content type, body).
+
+    Pages carry an ETag of their body and answer a matching If-None-Match
+    with 304 (paths answered so are listed in `not_modified`).
+    """
+    def __init__(self):
+        self.pages = {}
+        self.requests = []
+        self.not_modified = []
+        site = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                site.requests.append(self.path)
+                status, content_type, body = site.pages.get(self.path, (404, "text/html", "<h1>Not found</h1>"))
+                body = body.encode() if isinstance(body, str) else body
+                etag = '"%s"' % hashlib.sha256(body).hexdigest()[:16]
+                if status == 200 and self.headers.get("If-None-Match") == etag:
+                    site.not_modified.append(self.path)
+                    self.send_response(304)
+                    self.send_header("ETag", etag)
+                    self.end_headers()
+                    return
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                if status == 200:
+                    self.send_header("ETag", etag)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def url(self, path: str) -> str:
+        return f"http://127.0.0.1:{self.httpd.server_address[1]}{path}"
+
+
+@pytest.fixture
+def site():
+    server = SiteServer()
+    server.thread.start()
+    yield server
+    server.httpd.shutdown()
+    server.httpd.server_close()
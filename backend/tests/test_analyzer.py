@@ -0,0 +1,34 @@
+import pytest
+
+from app.services.analyzer import get_analyzer, stem_indonesian
+
+
+@pytest.mark.parametrize("word, stem", [
+    # meN-/peN- allomorphs restore the stem's first letter
+    ("menulis", "tulis"),
+    ("penulis", "tulis"),
+    ("memukul", "pukul"),
+    ("menyapu", "sapu"),
+    ("mengambil", "ambil"),
+    ("menggambar", "gambar"),
+    ("membaca", "baca"),
+    ("mencari", "cari"),
+    ("melihat", "lihat"),
+    # Prefix combinations and suffixes
+    ("memperbaiki", "baik"),
+    ("pertanyaan", "tanya"),
+    ("bekerja", "kerja"),
+    ("peserta", "serta"),
+    ("dibacakan", "baca"),
+    # Roots that only look prefixed stay whole
+    ("bersih", "bersih"),
+    ("perang", "perang"),
+    ("meja", "meja"),
+])
+def test_stem_indonesian(word, stem):
+    assert stem_indonesian(word) == stem
+
+
+def test_indonesian_analyzer_matches_inflected_forms():
+    analyzer = get_analyzer("indonesian")
+    assert analyzer("Dia menuliskan surat") == analyzer("tulis surat") == ["tulis", "surat"]
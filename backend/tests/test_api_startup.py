@@ -0,0 +1,39 @@
+import json
+import os
+import subprocess
+import sys
+
+from fastapi.testclient import TestClient
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Loaders only the extractor or retriever that needs them may import
+HEAVY_MODULES = ["pdfplumber", "selenium", "pytube", "youtube_transcript_api", "nltk", "langchain_community",
+                 "langchain_ollama"]
+
+
+def test_api_starts_without_heavy_loaders():
+    # A fresh interpreter, since this test session may have imported them already
+    result = subprocess.run(
+        [sys.executable, "-c", "import json, sys; import app.api.main; print(json.dumps(sorted(sys.modules)))"],
+        cwd=BACKEND_DIR, capture_output=True, text=True,
+    )
+    assert result.returncode == 0, result.stderr
+    modules = set(json.loads(result.stdout.splitlines()[-1]))
+    assert [name for name in HEAVY_MODULES if name in modules] == []
+
+
+def test_api_routes_are_served():
+    from app.api.main import app
+    from app.api.middleware.auth_middleware import create_access_token
+
+    paths = {route.path for route in app.routes}
+    assert {"/metrics", "/api/llm/qa/batch", "/api/llm/indexes", "/api/notebooks/{notebook_id}/ask",
+            "/api/profiles/"} <= paths
+    # Without entering the client, the lifespan (and its database upgrade) does not run
+    client = TestClient(app)
+    assert client.get("/health").json() == {"status": "healthy"}
+    assert client.get("/metrics").status_code == 401
+    token = create_access_token({"sub": "1", "user_id": 1})
+    response = client.get("/metrics", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 200
+    assert "deepnote_" in response.text
@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+from langchain_core.documents import Document
+
+from app.services.index_service import HybridIndex
+
+FILES = 8
+PER_FILE = 40
+DIM = 16
+
+
+@pytest.fixture(scope="module")
+def index():
+    rng = np.random.default_rng(0)
+    index = HybridIndex()
+    for file_id in range(FILES):
+        token_lists = [[f"t{term}" for term in rng.zipf(1.5, size=12) % 50] for _ in range(PER_FILE)]
+        index.add_file(
+            [Document(page_content=" ".join(tokens), metadata={"file_id": file_id}) for tokens in token_lists],
+            rng.standard_normal((PER_FILE, DIM)).astype(np.float32),
+            token_lists,
+            file_id=file_id,
+            file_type="pdf" if file_id % 2 else "url",
+        )
+    return index
+
+
+FILTERS = {
+    "no filter": {},
+    # Under DENSE_SELECTIVITY, so only the selected ranges are scored
+    "one file": {"file_ids": [3]},
+    # Over it, so every row is scored and masked
+    "half of the files": {"file_types": ["pdf"]},
+    "empty selection": {"file_ids": [FILES + 1]},
+}
+
+
+@pytest.mark.parametrize("filters", FILTERS.values(), ids=FILTERS.keys())
+def test_vector_search_many_matches_search(index, filters):
+    selection = index.select(**filters)
+    queries = np.random.default_rng(1).standard_normal((5, DIM)).astype(np.float32)
+    batched = index.vectors.search_many(queries, k=7, selection=selection, with_scores=True)
+    assert len(batched) == len(queries)
+    for query, (rows, scores) in zip(queries, batched):
+        expected_rows, expected_scores = index.vectors.search(query, k=7, selection=selection)
+        assert list(rows) == list(expected_rows)
+        np.testing.assert_allclose(scores, expected_scores, rtol=1e-5, atol=1e-6)
+    if filters == FILTERS["empty selection"]:
+        assert all(len(rows) == 0 for rows, _ in batched)
+
+
+@pytest.mark.parametrize("filters", FILTERS.values(), ids=FILTERS.keys())
+def test_bm25_search_many_matches_search(index, filters):
+    selection = index.select(**filters)
+    term_lists = [["t1"], ["t2", "t3"], ["t1", "t7", "t40"], ["missing"], []]
+    batched = index.bm25.search_many(term_lists, k=7, selection=selection)
+    assert len(batched) == len(term_lists)
+    for terms, rows in zip(term_lists, batched):
+        assert list(rows) == list(index.bm25.search(terms, k=7, selection=selection)[0])
+    if filters == FILTERS["empty selection"]:
+        assert all(len(rows) == 0 for rows in batched)
@@ -0,0 +1,152 @@
+import pytest
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.controllers.files_controller import process_in_background
+from app.db.models import FileChunk, User, upgrade_schema
+from app.db.repositories.file_repository import FileRepository
+from app.services import index_manager
+from app.services.crawl_service import crawl_site
+from app.services.index_manager import DatabaseIndexLoader, IndexManager
+from app.services.index_segments import SegmentStore
+
+
+def page(title, text, *links):
+    anchors = "".join(f'<a href="{link}">{link}</a>' for link in links)
+    return (200, "text/html", f"<html><head><title>{title}</title></head><body><article><p>{text}</p>"
+                              f"{anchors}</article></body></html>")
+
+
+@pytest.fixture
+def chain(site):
+    """/ -> /a -> /b -> /c, each page linking to the next"""
+    site.pages["/"] = page("Home", "Home page of the static site fixture.", "/a")
+    site.pages["/a"] = page("A", "Page A explains conditional requests.", "/b")
+    site.pages["/b"] = page("B", "Page B explains robots exclusion.", "/c")
+    site.pages["/c"] = page("C", "Page C is three links deep.")
+    return site
+
+
+def crawled(results, status=None):
+    return sorted(result.url for result in results if status is None or result.status == status)
+
+
+def known_pages(results):
+    return {result.url: {"etag": result.etag, "last_modified": result.last_modified,
+                         "content_hash": result.content_hash, "depth": result.depth} for result in results}
+
+
+def test_crawl_stops_at_max_depth(chain):
+    results = crawl_site(chain.url("/"), max_depth=1, delay=0.0)
+    assert crawled(results, "changed") == [chain.url("/"), chain.url("/a")]
+    assert "/b" not in chain.requests
+
+
+def test_robots_txt_disallowed_pages_are_not_fetched(chain):
+    chain.pages["/robots.txt"] = (200, "text/plain", "User-agent: *\nDisallow: /b\n")
+    results = crawl_site(chain.url("/"), max_depth=3, delay=0.0)
+    assert crawled(results, "changed") == [chain.url("/"), chain.url("/a")]
+    assert crawled(results, "failed") == [chain.url("/b")]
+    assert "/b" not in chain.requests and "/c" not in chain.requests
+
+
+def test_recrawl_of_unchanged_pages_is_conditional(chain):
+    first = crawl_site(chain.url("/"), max_depth=1, delay=0.0)
+    second = crawl_site(chain.url("/"), known_pages(first), max_depth=1, delay=0.0)
+    assert crawled(second, "unchanged") == crawled(first)
+    assert sorted(chain.not_modified) == ["/", "/a"]
+    assert all(result.documents == [] for result in second)
+
+
+@pytest.fixture
+def session_factory(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'crawl.db'}")
+    with engine.begin() as connection:
+        upgrade_schema(connection)
+    return sessionmaker(bind=engine)
+
+
+@pytest.fixture
+def crawl_db(session_factory):
+    db = session_factory()
+    yield db
+    db.close()
+
+
+@pytest.fixture(params=["resident", "segments"])
+def manager(request, session_factory, tmp_path, monkeypatch):
+    """The process-wide index manager, loading from the crawl database with fake embeddings"""
+    monkeypatch.setattr(index_manager, "INDEX_MANIFEST_CHECK_SECONDS", 0.0)
+    embeddings = DeterministicFakeEmbedding(size=16)
+    segments = SegmentStore(str(tmp_path / "segments")) if request.param == "segments" else None
+    manager = IndexManager(loader=DatabaseIndexLoader(session_factory, embeddings), segments=segments,
+                           embeddings=embeddings, compact_ratio=1.1)
+    monkeypatch.setattr(index_manager, "_index_manager", manager)
+    return manager
+
+
+@pytest.fixture
+def user_id(crawl_db):
+    user = User(email="crawler@example.com")
+    crawl_db.add(user)
+    crawl_db.commit()
+    return user.id
+
+
+def recrawl(db, site, file_id, max_depth=2):
+    process_in_background("url", site.url("/"), file_id, db, crawl=True, max_depth=max_depth).process()
+    db.expire_all()
+    return {
+        url: sorted((chunk.id, chunk.content) for chunk in db.query(FileChunk).filter(
+            FileChunk.file_id == file_id, FileChunk.source_url == url))
+        for url in FileRepository.get_crawled_pages(db, file_id)
+    }
+
+
+def test_recrawl_rechunks_only_changed_pages_and_drops_stale_ones(chain, crawl_db, manager, user_id):
+    file_id = FileRepository.create_file(crawl_db, "site", chain.url("/"), "url", user_id=user_id).id
+    first = recrawl(crawl_db, chain, file_id)
+    assert sorted(first) == [chain.url("/"), chain.url("/a"), chain.url("/b")]
+
+    chain.pages["/a"] = page("A", "Page A now explains validators instead.", "/b")
+    del chain.pages["/b"]
+    chain.not_modified.clear()
+    second = recrawl(crawl_db, chain, file_id)
+
+    # The home page answered 304 and kept its chunks; page A was re-chunked; page B is gone
+    assert chain.not_modified == ["/"]
+    assert second[chain.url("/")] == first[chain.url("/")]
+    assert [content for _, content in second[chain.url("/a")]] == ["Page A now explains validators instead. /b"]
+    assert chain.url("/b") not in second
+    chunks = crawl_db.query(FileChunk).filter(FileChunk.file_id == file_id).order_by(FileChunk.chunk_index).all()
+    assert [chunk.chunk_index for chunk in chunks] == list(range(len(chunks)))
+
+
+def indexed(manager, user_id, query):
+    return sorted((doc.metadata["chunk_id"], doc.metadata["chunk_index"], doc.page_content)
+                  for doc in manager.query(user_id, query, k=10))
+
+
+def stored(db, file_id):
+    db.expire_all()
+    return sorted((chunk.id, chunk.chunk_index, chunk.content)
+                  for chunk in db.query(FileChunk).filter(FileChunk.file_id == file_id))
+
+
+def test_crawled_pages_are_searchable_and_recrawls_update_the_index(chain, crawl_db, manager, user_id):
+    manager.get(user_id)  # resident (and published) before the crawl, as after a first query
+    file_id = FileRepository.create_file(crawl_db, "site", chain.url("/"), "url", user_id=user_id).id
+    recrawl(crawl_db, chain, file_id)
+    assert indexed(manager, user_id, "conditional requests") == stored(crawl_db, file_id)
+
+    chain.pages["/"] = page("Home", "Home page, now linking to B directly.", "/b")
+    chain.pages["/b"] = page("B", "Page B now explains validators.", "/c")
+    del chain.pages["/a"]
+    recrawl(crawl_db, chain, file_id)
+
+    # Page A's rows are gone, the changed pages are searchable and chunk_index follows the renumbering
+    current = stored(crawl_db, file_id)
+    assert indexed(manager, user_id, "validators") == current
+    assert "Page A explains conditional requests. /b" not in [content for _, _, content in current]
+    assert manager.query(user_id, "validators", k=1)[0].page_content == "Page B now explains validators. /c"
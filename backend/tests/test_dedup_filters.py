@@ -0,0 +1,115 @@
+import pytest
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from app.services.dedup_service import Deduplicator, SimHashIndex, is_duplicate
+from app.services import index_manager
+from app.services.index_manager import IndexManager
+from app.services.index_segments import SegmentStore
+from app.services.rag_service import Retriever
+
+USER = 7
+SHARED = [
+    "Near-duplicate chunks are stored as references to the chunk they repeat instead of being embedded again.",
+    "Both uploads contain this paragraph about reciprocal rank fusion of semantic and lexical rankings.",
+]
+FIRST_ONLY = ["The first upload alone describes memory-mapped index segments shared between workers."]
+SECOND_ONLY = ["The second upload alone covers tombstones and background compaction of deleted files."]
+
+
+class Upload:
+    """Chunks of one uploaded file as ingestion stores them, with database-like chunk ids"""
+    next_chunk_id = 100
+
+    def __init__(self, file_id, texts, corpus):
+        self.file_id = file_id
+        deduplicator = Deduplicator(SimHashIndex.from_fingerprints(corpus))
+        self.documents = []
+        for index, text in enumerate(texts):
+            doc = Document(page_content=text, metadata={"file_id": file_id, "chunk_index": index})
+            deduplicator.mark(doc)
+            Upload.next_chunk_id += 1
+            doc.metadata["chunk_id"] = Upload.next_chunk_id
+            self.documents.append(doc)
+        self.canonical = [doc for doc in self.documents if not is_duplicate(doc)]
+        self.duplicate_of = [doc.metadata["duplicate_of_chunk"] for doc in self.documents
+                             if "duplicate_of_chunk" in doc.metadata]
+
+    def fingerprints(self):
+        return [(doc.metadata["fingerprint"], doc.metadata["chunk_id"]) for doc in self.canonical]
+
+
+@pytest.fixture(params=["resident", "segments"])
+def manager(request, tmp_path, monkeypatch):
+    # Resident copies pick up every publish at once; tests compact explicitly
+    monkeypatch.setattr(index_manager, "INDEX_MANIFEST_CHECK_SECONDS", 0.0)
+    embeddings = DeterministicFakeEmbedding(size=16)
+    segments = SegmentStore(str(tmp_path)) if request.param == "segments" else None
+    manager = IndexManager(loader=lambda key: Retriever(embeddings=embeddings), segments=segments,
+                           embeddings=embeddings, compact_ratio=1.1)
+    manager.get(USER)  # resident (and published) before the uploads, as after a first query
+    return manager
+
+
+def ingest(manager, upload):
+    manager.index_file(USER, upload.canonical, upload.file_id, file_type="pdf", user_id=USER,
+                       duplicate_of=upload.duplicate_of)
+
+
+def texts(documents):
+    return sorted(doc.page_content for doc in documents)
+
+
+def test_filter_on_overlapping_upload_matches_its_duplicated_chunks(manager):
+    first = Upload(1, SHARED + FIRST_ONLY, corpus=[])
+    second = Upload(2, SHARED + SECOND_ONLY, corpus=first.fingerprints())
+    assert len(second.duplicate_of) == len(SHARED)
+    ingest(manager, first)
+    ingest(manager, second)
+
+    # Only the second upload's own chunk was added to the index
+    assert len(manager.get(USER).retriever.index) == len(SHARED) + 2
+    assert texts(manager.query(USER, "rank fusion", k=10, file_ids=[2])) == sorted(SHARED + SECOND_ONLY)
+    assert texts(manager.query(USER, "rank fusion", k=10, file_ids=[1])) == sorted(SHARED + FIRST_ONLY)
+    assert texts(manager.query(USER, "rank fusion", k=10, file_ids=[1, 2])) == sorted(SHARED + FIRST_ONLY + SECOND_ONLY)
+    assert manager.query_many(USER, ["rank fusion"], k=10, file_ids=[2]) == [
+        manager.query(USER, "rank fusion", k=10, file_ids=[2])
+    ]
+
+
+def test_upload_made_only_of_duplicates_is_still_filterable(manager):
+    first = Upload(1, SHARED + FIRST_ONLY, corpus=[])
+    copy = Upload(2, SHARED, corpus=first.fingerprints())
+    assert copy.canonical == []
+    ingest(manager, first)
+    ingest(manager, copy)
+
+    assert texts(manager.query(USER, "rank fusion", k=10, file_ids=[2])) == sorted(SHARED)
+    assert texts(manager.query(USER, "rank fusion", k=10, file_types=["pdf"])) == sorted(SHARED + FIRST_ONLY)
+
+
+def test_deleting_either_upload_keeps_filters_consistent(manager):
+    first = Upload(1, SHARED + FIRST_ONLY, corpus=[])
+    second = Upload(2, SHARED + SECOND_ONLY, corpus=first.fingerprints())
+    ingest(manager, first)
+    ingest(manager, second)
+
+    # Deleting the duplicate file drops its aliases without touching the canonical rows
+    manager.delete_file(USER, 2)
+    assert manager.query(USER, "rank fusion", k=10, file_ids=[2]) == []
+    assert texts(manager.query(USER, "rank fusion", k=10, file_ids=[1])) == sorted(SHARED + FIRST_ONLY)
+
+
+def test_aliases_of_deleted_canonical_file_stop_matching_and_survive_compaction(manager):
+    first = Upload(1, SHARED + FIRST_ONLY, corpus=[])
+    second = Upload(2, SHARED + SECOND_ONLY, corpus=first.fingerprints())
+    third = Upload(3, FIRST_ONLY + SECOND_ONLY, corpus=second.fingerprints())
+    assert third.duplicate_of == [second.canonical[0].metadata["chunk_id"]]
+    for upload in (first, second, third):
+        ingest(manager, upload)
+
+    manager.delete_file(USER, 1)
+    assert texts(manager.query(USER, "rank fusion", k=10, file_ids=[2])) == sorted(SECOND_ONLY)
+    assert manager.compact(USER, min_ratio=0.0)
+    assert texts(manager.query(USER, "rank fusion", k=10, file_ids=[2])) == sorted(SECOND_ONLY)
+    assert texts(manager.query(USER, "rank fusion", k=10, file_ids=[3])) == sorted(FIRST_ONLY + SECOND_ONLY)
@@ -0,0 +1,115 @@
+import os
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from app.db.models import File, FileChunk, User, upgrade_schema
+from app.db.repositories.file_repository import FileRepository
+from app.services.rag_service import FullTextRetriever
+
+# The Postgres variant runs against DATABASE_URL inside a transaction that is rolled back
+DATABASE_URL = os.getenv("DATABASE_URL", "")
+
+CHUNKS = {
+    # (owner, filename, file type): chunk texts
+    (1, "segments.pdf", "pdf"): [
+        "Memory-mapped segments are shared between worker processes through the page cache.",
+        "Segments are published by swapping a manifest file.",
+    ],
+    (1, "crawl.html", "url"): ["The crawler revisits known pages with conditional requests."],
+    (1, "deleted.pdf", "pdf"): ["Memory-mapped segments from a deleted upload."],
+    (2, "other.pdf", "pdf"): ["Another user's notes on memory-mapped segments."],
+}
+
+
+@pytest.fixture(params=["sqlite", "postgresql"])
+def corpus(request, tmp_path):
+    if request.param == "sqlite":
+        engine = create_engine(f"sqlite:///{tmp_path / 'fulltext.db'}")
+        connection = engine.connect()
+    elif not DATABASE_URL.startswith("postgresql"):
+        pytest.skip("set DATABASE_URL to a Postgres database to run the Postgres variant")
+    else:
+        engine = create_engine(DATABASE_URL)
+        connection = engine.connect()
+    transaction = connection.begin()
+    upgrade_schema(connection)
+
+    def session_factory():
+        return Session(bind=connection, join_transaction_mode="create_savepoint")
+
+    db = session_factory()
+    users = {}
+    files = {}
+    for owner, filename, file_type in CHUNKS:
+        if owner not in users:
+            user = User(email=f"fulltext-{owner}@example.com")
+            db.add(user)
+            db.flush()
+            users[owner] = user.id
+        db_file = File(filename=filename, file_type=file_type, user_id=users[owner])
+        db.add(db_file)
+        db.flush()
+        files[filename] = db_file.id
+        db.add_all(FileChunk(content=content, chunk_index=index, file_id=db_file.id)
+                   for index, content in enumerate(CHUNKS[owner, filename, file_type]))
+    db.commit()
+    FileRepository.mark_file_deleted(db, files["deleted.pdf"])
+    yield db, session_factory, users, files
+    db.close()
+    transaction.rollback()
+    connection.close()
+
+
+def search(db, terms, **filters):
+    return [row.content for row in FileRepository.search_chunks(db, terms, k=10, **filters)]
+
+
+def test_chunks_matching_more_terms_rank_first(corpus):
+    db, _, users, _ = corpus
+    rows = FileRepository.search_chunks(db, ["segments", "manifest"], user_id=users[1], k=10)
+    assert [row.filename for row in rows] == ["segments.pdf", "segments.pdf"]
+    assert rows[0].content == CHUNKS[1, "segments.pdf", "pdf"][1]
+    assert rows[0].score > rows[1].score
+
+
+def test_filters_and_deleted_files(corpus):
+    db, _, users, files = corpus
+    everyone = search(db, ["segments"])
+    assert CHUNKS[2, "other.pdf", "pdf"][0] in everyone
+    # The deleted upload is hidden before its chunks are purged
+    assert CHUNKS[1, "deleted.pdf", "pdf"][0] not in everyone
+    assert sorted(search(db, ["segments"], user_id=users[1])) == sorted(CHUNKS[1, "segments.pdf", "pdf"])
+    assert search(db, ["segments", "pages"], file_ids=[files["crawl.html"]]) == CHUNKS[1, "crawl.html", "url"]
+    assert search(db, ["segments", "pages"], user_id=users[1], file_types=["url"]) == CHUNKS[1, "crawl.html", "url"]
+    assert search(db, ["segments"], file_ids=[]) == []
+
+
+def test_duplicate_chunks_match_filters_on_their_file(corpus):
+    db, _, users, files = corpus
+    canonical = db.query(FileChunk).filter(FileChunk.file_id == files["segments.pdf"]).first()
+    db.add(FileChunk(content=canonical.content, chunk_index=1, file_id=files["crawl.html"],
+                     duplicate_of_id=canonical.id))
+    db.commit()
+    assert search(db, ["segments"], file_ids=[files["crawl.html"]]) == [canonical.content]
+
+
+def test_stopword_only_query_finds_nothing(corpus):
+    _, session_factory, users, _ = corpus
+    retriever = FullTextRetriever(session_factory=session_factory)
+    assert retriever.search("the of and yang dan", user_id=users[1]) == []
+
+
+@pytest.mark.parametrize("query", [
+    'segments" OR "crawler', "segments AND NOT manifest", "NEAR(segments manifest)", "-manifest*",
+    "manifest:* & !segments", "segments') | ('crawler", "column:segments", "{segments}",
+    'unbalanced "quote segments', "it's segments\\",
+])
+def test_query_operators_are_matched_as_text(corpus, query):
+    db, session_factory, users, _ = corpus
+    retriever = FullTextRetriever(session_factory=session_factory)
+    documents = retriever.search(query, user_id=users[1], k=10)
+    assert CHUNKS[1, "segments.pdf", "pdf"][1] in [doc.page_content for doc in documents]
+    # Raw terms reaching the repository are quoted as well
+    assert search(db, [query, "manifest"], user_id=users[1])[0] == CHUNKS[1, "segments.pdf", "pdf"][1]
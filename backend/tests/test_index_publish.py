@@ -0,0 +1,112 @@
+import pytest
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from app.services import index_manager
+from app.services.index_manager import IndexManager
+from app.services.index_segments import SegmentStore
+from app.services.rag_service import Retriever
+
+USER = 3
+FILE_ID = 11
+EXISTING = "An earlier upload about reciprocal rank fusion."
+BATCHES = [
+    ["Micro-batch one about memory-mapped segments.", "Micro-batch one about manifests."],
+    ["Micro-batch two about compaction of tombstones."],
+    ["Micro-batch three about ingestion pipelines."],
+]
+
+
+def documents(texts, first_chunk_id):
+    return [Document(page_content=text, metadata={"chunk_id": first_chunk_id + i, "file_id": FILE_ID})
+            for i, text in enumerate(texts)]
+
+
+@pytest.fixture
+def workers(tmp_path, monkeypatch):
+    """Two workers sharing one segment store, both with the tenant resident"""
+    monkeypatch.setattr(index_manager, "INDEX_MANIFEST_CHECK_SECONDS", 0.0)
+    embeddings = DeterministicFakeEmbedding(size=16)
+
+    def loader(key):
+        retriever = Retriever(embeddings=embeddings)
+        retriever.index_documents(documents([EXISTING], 1), file_id=1, file_type="pdf", user_id=USER)
+        return retriever
+
+    managers = [IndexManager(loader=loader, segments=SegmentStore(str(tmp_path)), embeddings=embeddings)
+                for _ in range(2)]
+    for manager in managers:
+        manager.get(USER)
+    return managers
+
+
+def texts(manager):
+    return sorted(doc.page_content for doc in manager.query(USER, "micro-batch", k=10, file_ids=[FILE_ID]))
+
+
+def test_ingest_publishes_one_segment_version(workers):
+    ingesting, other = workers
+    store = ingesting.segments
+    published = store.current_version(USER)
+    chunk_id = 100
+    for batch in BATCHES:
+        ingesting.index_file(USER, documents(batch, chunk_id), FILE_ID, "pdf", USER, publish=False)
+        chunk_id += len(batch)
+        # Searchable at once in the ingesting worker, without rewriting the segment
+        assert store.current_version(USER) == published
+    assert texts(ingesting) == sorted(sum(BATCHES, []))
+    assert texts(other) == []
+
+    ingesting.publish_file(USER, FILE_ID)
+    assert store.current_version(USER) != published
+    for manager in workers:
+        assert texts(manager) == sorted(sum(BATCHES, []))
+        assert len(manager.get(USER).retriever.index) == 1 + len(sum(BATCHES, []))
+    # Nothing is held back any more
+    ingesting.publish_file(USER, FILE_ID)
+    assert len(ingesting.get(USER).retriever.index) == 1 + len(sum(BATCHES, []))
+
+
+def test_each_publish_reaches_other_workers_mid_ingest(workers):
+    ingesting, other = workers
+    ingesting.index_file(USER, documents(BATCHES[0], 100), FILE_ID, "pdf", USER, publish=False)
+    ingesting.publish_file(USER, FILE_ID)
+    assert texts(other) == sorted(BATCHES[0])
+
+    ingesting.index_file(USER, documents(BATCHES[1], 102), FILE_ID, "pdf", USER, publish=False)
+    assert texts(other) == sorted(BATCHES[0])
+    ingesting.publish_file(USER, FILE_ID)
+    for manager in workers:
+        assert texts(manager) == sorted(BATCHES[0] + BATCHES[1])
+        assert len(manager.get(USER).retriever.index) == 1 + len(BATCHES[0] + BATCHES[1])
+
+
+def test_held_batches_are_published_when_not_resident(workers):
+    ingesting, other = workers
+    ingesting._tenants.clear()
+    ingesting.index_file(USER, documents(BATCHES[0], 100), FILE_ID, "pdf", USER, publish=False)
+    ingesting.publish_file(USER, FILE_ID)
+    assert texts(other) == sorted(BATCHES[0])
+
+
+def test_file_deleted_while_ingesting_is_not_published(workers):
+    ingesting, other = workers
+    published = ingesting.segments.current_version(USER)
+    ingesting.index_file(USER, documents(BATCHES[0], 100), FILE_ID, "pdf", USER, publish=False)
+    # The delete request is served by the other worker; the ingest sees it at its next batch
+    other.delete_file(USER, FILE_ID)
+    ingesting.delete_file(USER, FILE_ID)
+    ingesting.publish_file(USER, FILE_ID)
+    assert ingesting.segments.current_version(USER) == published
+    assert texts(ingesting) == texts(other) == []
+
+
+def test_compaction_forgets_the_deleted_files_it_removed(workers):
+    ingesting, other = workers
+    ingesting.index_file(USER, documents(BATCHES[0], 100), FILE_ID, "pdf", USER)
+    other.delete_file(USER, FILE_ID)
+    assert other.compact(USER, min_ratio=0.0)
+    _, index = other.segments.open(USER)
+    assert index.catalog.deleted_files == set()
+    assert len(index) == 1
+    assert texts(ingesting) == texts(other) == []
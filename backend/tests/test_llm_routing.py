@@ -0,0 +1,106 @@
+import pytest
+from langchain_core.documents import Document
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.runnables import RunnableGenerator
+from ollama import ResponseError
+
+from app.services.llm_service import LLMService, QueryRouter
+
+REASONING = "deepseek-r1:8b"
+FAST = "llama3.2:3b"
+DOCUMENTS = [Document(page_content="Skin is the biggest organ in humans.")]
+PROMPT = ChatPromptTemplate.from_template("{context}\n{question}")
+
+
+class StubModel:
+    """Stands in for an Ollama client, streaming fixed chunks and counting requests and chunks read"""
+    def __init__(self, chunks=(), error=None):
+        self.chunks = list(chunks)
+        self.error = error
+        self.requests = 0
+        self.streamed = 0
+
+    def _stream(self, inputs):
+        for _ in inputs:
+            pass
+        self.requests += 1
+        if self.error is not None:
+            raise self.error
+        for chunk in self.chunks:
+            self.streamed += 1
+            yield chunk
+
+    def runnable(self):
+        return RunnableGenerator(self._stream)
+
+
+def service(reasoning, fast, think_token_cap=0):
+    return LLMService(REASONING, FAST, think_token_cap=think_token_cap,
+                      models={REASONING: reasoning.runnable(), FAST: fast.runnable()})
+
+
+def answer(llm, question="What is the largest organ?", similarities=(0.9, 0.6)):
+    return llm.answer(PROMPT, {"context": DOCUMENTS[0].page_content, "question": question},
+                      question, DOCUMENTS, list(similarities))
+
+
+@pytest.mark.parametrize("question, similarities, model, reason", [
+    ("What is the largest organ?", [0.9, 0.6], FAST, "easy"),
+    ("Why is skin the largest organ?", [0.9, 0.6], REASONING, "reasoning_cue"),
+    ("Mengapa kulit organ terbesar?", [0.9, 0.6], REASONING, "reasoning_cue"),
+    ("What is skin? What is hair?", [0.9, 0.6], REASONING, "multi_part"),
+    ("What is the largest organ?", [0.3, 0.2], REASONING, "weak_match"),
+    ("What is the largest organ?", [0.9, 0.89], REASONING, "ambiguous_match"),
+    ("What is the largest organ?", None, REASONING, "no_scores"),
+])
+def test_router(question, similarities, model, reason):
+    decision = QueryRouter(FAST, REASONING).route(question, DOCUMENTS, similarities)
+    assert (decision.model, decision.reason) == (model, reason)
+
+
+def test_router_without_fast_model():
+    decision = QueryRouter(None, REASONING).route("What is the largest organ?", DOCUMENTS, [0.9, 0.6])
+    assert (decision.model, decision.reason) == (REASONING, "routing_disabled")
+
+
+def test_missing_fast_model_falls_back_to_reasoning_model():
+    reasoning = StubModel(["Skin."])
+    fast = StubModel(error=ResponseError(f'model "{FAST}" not found, try pulling it first', 404))
+    llm = service(reasoning, fast)
+
+    text, _, decision = answer(llm)
+    assert text == "Skin."
+    assert (decision.model, decision.reason) == (REASONING, "model_missing")
+    # Not asked again while it is known to be missing
+    answer(llm)
+    assert (fast.requests, reasoning.requests) == (1, 2)
+
+
+def test_other_model_errors_are_not_hidden():
+    fast = StubModel(error=ResponseError("server overloaded", 503))
+    with pytest.raises(ResponseError):
+        answer(service(StubModel(["Skin."]), fast))
+
+
+def test_think_cap_hands_over_to_fast_model_with_split_open_tag():
+    reasoning = StubModel(["<thi", "nk>", "Skin ", "covers ", "the ", "body ", "and ", "more"] + ["..."] * 20)
+    fast = StubModel(["Skin."])
+    llm = service(reasoning, fast, think_token_cap=3)
+
+    text, thinking, decision = answer(llm, question="Why is skin the largest organ?")
+    assert decision.model == REASONING
+    assert text == "Skin."
+    assert thinking.startswith("Skin covers")
+    # Closed on the fourth chunk inside <think> (the one completing the tag counts) instead of read to the end
+    assert reasoning.streamed == 5
+    assert fast.requests == 1
+
+
+def test_think_cap_sees_split_close_tag():
+    reasoning = StubModel(["<think>", "short", "</th", "ink>"] + ["Skin ", "is ", "the ", "largest ", "organ."])
+    fast = StubModel(["unused"])
+    llm = service(reasoning, fast, think_token_cap=3)
+
+    text, thinking, _ = answer(llm, question="Why is skin the largest organ?")
+    assert (text, thinking) == ("Skin is the largest organ.", "short")
+    assert fast.requests == 0
@@ -0,0 +1,90 @@
+import threading
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.db.models import upgrade_schema
+from app.db.repositories.notebook_repository import NotebookRepository
+from app.services.notebook_service import NotebookMemory, estimate_tokens, format_turn, notebook_prompt_tokens
+
+# Each turn is about 16 tokens, so a 40-token window holds the two newest
+TURNS = [("query", f"Question number {i} about the indexed documents?") if i % 2 == 0
+         else ("response", f"Answer number {i}, citing the indexed documents.") for i in range(6)]
+
+
+class BlockingSummarizer:
+    """Summarizer that waits until released, like a slow LLM call"""
+    def __init__(self):
+        self.release = threading.Event()
+        self.calls = []
+
+    def __call__(self, summary, entries):
+        self.release.wait(5)
+        self.calls.append([entry.content for entry in entries])
+        return " ".join(filter(None, [summary] + [f"covered {entry.id}" for entry in entries]))
+
+
+@pytest.fixture
+def notebook(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'notebooks.db'}")
+    with engine.begin() as connection:
+        upgrade_schema(connection)
+    session_factory = sessionmaker(bind=engine)
+    db = session_factory()
+    summarizer = BlockingSummarizer()
+    memory = NotebookMemory(summarizer=summarizer, session_factory=session_factory, window_tokens=40,
+                            summary_tokens=100, workers=1)
+    notebook_id = NotebookRepository.create_notebook(db, "memory", user_id=1).id
+    yield db, memory, summarizer, notebook_id
+    summarizer.release.set()
+    memory.shutdown()
+    db.close()
+
+
+def add_turns(db, memory, notebook_id, turns):
+    for entry_type, content in turns:
+        NotebookRepository.add_entry(db, notebook_id, content, entry_type)
+        memory.update(db, notebook_id)
+
+
+def test_turns_outside_the_window_stay_in_prompts_until_summarized(notebook):
+    db, memory, summarizer, notebook_id = notebook
+    turns = TURNS[:4]
+    add_turns(db, memory, notebook_id, turns)
+
+    # The refresh is still running: nothing is lost in the meantime
+    prompt = memory.context(db, notebook_id)
+    assert prompt.summary == ""
+    assert prompt.pending == 2
+    assert [entry.content for entry in prompt.window] == [content for _, content in turns]
+
+    summarizer.release.set()
+    memory.shutdown()
+    prompt = memory.context(db, notebook_id)
+    assert prompt.pending == 0
+    assert [entry.content for entry in prompt.window] == [content for _, content in turns[-2:]]
+    assert prompt.summary.endswith(f"covered {prompt.window[0].id - 1}")
+    assert sum(summarizer.calls, []) == [content for _, content in turns[:2]]
+
+
+def test_only_prompts_record_memory_tokens(notebook):
+    db, memory, summarizer, notebook_id = notebook
+    summarizer.release.set()
+    before = notebook_prompt_tokens.count()
+    add_turns(db, memory, notebook_id, TURNS)
+    memory.build(db, notebook_id).stats()
+    assert notebook_prompt_tokens.count() == before
+    memory.context(db, notebook_id)
+    assert notebook_prompt_tokens.count() == before + 1
+
+
+def test_unsummarized_turns_are_capped_at_another_window(notebook):
+    db, memory, summarizer, notebook_id = notebook
+    add_turns(db, memory, notebook_id, TURNS * 3)
+    prompt = memory.build(db, notebook_id)
+    assert prompt.pending == len(TURNS) * 3 - 2
+    # Two turns in the window and two more carried
+    assert len(prompt.window) == 4
+    assert estimate_tokens(prompt.history) <= 2 * memory.window_tokens + len(prompt.window)
+    assert format_turn(prompt.window[-1]).endswith(TURNS[-1][1])
@@ -0,0 +1,61 @@
+from langchain_core.documents import Document
+from sqlalchemy import create_engine, inspect
+from sqlalchemy.orm import Session
+
+from app.db.models import FileChunk, upgrade_schema
+from app.db.repositories.file_repository import FileRepository
+
+
+def columns(engine, table):
+    return {info["name"] for info in inspect(engine).get_columns(table)}
+
+
+def test_upgrade_adds_columns_to_an_existing_database(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    with engine.begin() as connection:
+        # Tables as created before dedup, lineage and the extracted-text cache
+        connection.exec_driver_sql(
+            "CREATE TABLE users (id INTEGER PRIMARY KEY, email VARCHAR, hashed_password VARCHAR, "
+            "is_active BOOLEAN, created_at DATETIME)"
+        )
+        connection.exec_driver_sql(
+            "CREATE TABLE files (id INTEGER PRIMARY KEY, filename VARCHAR, file_path VARCHAR, file_type VARCHAR, "
+            "upload_date DATETIME, user_id INTEGER REFERENCES users(id))"
+        )
+        connection.exec_driver_sql(
+            "CREATE TABLE file_chunks (id INTEGER PRIMARY KEY, content TEXT, embedding TEXT, chunk_index INTEGER, "
+            "file_id INTEGER REFERENCES files(id))"
+        )
+        connection.exec_driver_sql("INSERT INTO files (id, filename, file_type) VALUES (1, 'a.pdf', 'pdf')")
+        connection.exec_driver_sql("INSERT INTO file_chunks (id, content, file_id) VALUES (1, 'kept text', 1)")
+
+    for _ in range(2):  # idempotent
+        with engine.begin() as connection:
+            upgrade_schema(connection)
+
+    assert {"dedup_ratio", "content_hash", "deleted_at"} <= columns(engine, "files")
+    assert {"source_url", "source_hash", "fingerprint", "duplicate_of_id"} <= columns(engine, "file_chunks")
+    assert "crawled_pages" in inspect(engine).get_table_names()
+    with engine.connect() as connection:
+        assert connection.exec_driver_sql("SELECT content_hash FROM files").all() == [(None,)]
+        # Rows from before the full-text table are searchable
+        assert connection.exec_driver_sql(
+            "SELECT rowid FROM file_chunks_fts WHERE file_chunks_fts MATCH 'kept'"
+        ).all() == [(1,)]
+    # Files from before soft deletes are live
+    with Session(engine) as db:
+        assert FileRepository.get_file_by_id(db, 1).filename == "a.pdf"
+
+
+def test_batches_of_a_deleted_file_are_not_stored(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'files.db'}")
+    with engine.begin() as connection:
+        upgrade_schema(connection)
+    with Session(engine) as db:
+        db_file = FileRepository.create_file(db, "a.pdf", "uploads/a.pdf", "pdf", user_id=None)
+        batch = [Document(page_content="first batch")]
+        assert len(FileRepository.append_document_chunks(db, db_file.id, batch)) == 1
+        FileRepository.mark_file_deleted(db, db_file.id)
+        assert FileRepository.append_document_chunks(db, db_file.id, batch, first_index=1) is None
+        assert FileRepository.purge_file(db, db_file.id) == []
+        assert db.query(FileChunk).count() == 0
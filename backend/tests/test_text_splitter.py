@@ -0,0 +1,55 @@
+import random
+
+import pytest
+from langchain_core.documents import Document
+
+from app.services.text_splitter import DEFAULT_SEPARATORS, TextSplitter
+
+text_splitters = pytest.importorskip("langchain_text_splitters")
+
+
+def random_text(seed, length=3000):
+    """Words and separators in random runs, including separators back to back and at both ends"""
+    rng = random.Random(seed)
+    tokens = ["alpha", "beta", "gamma", "delta", "ünïcode", "x" * 40, "\n\n", "\n", ".", "!", "?", ",", " ", "  "]
+    parts = []
+    while sum(map(len, parts)) < length:
+        parts.append(rng.choice(tokens) if rng.random() < 0.3 else rng.choice(tokens[:6]) + " ")
+    return "".join(parts)
+
+
+TEXTS = {
+    "empty": "",
+    "whitespace only": " \n\n \n ",
+    "separators at chunk boundaries": ("a" * 19 + "\n\n") * 12,
+    "separator first and last": "\n\nSentence one. Sentence two.\n\n",
+    "no separators": "x" * 250,
+    "one long word among short ones": "short words " * 5 + "y" * 120 + " more short words" * 5,
+    "repeated sentences": "The same sentence. " * 40,
+    **{f"random {seed}": random_text(seed) for seed in range(6)},
+}
+# (chunk_size, chunk_overlap): overlaps both larger and smaller than the pieces being merged
+SIZES = [(20, 0), (20, 15), (50, 10), (100, 60), (1000, 200)]
+
+
+@pytest.mark.parametrize("chunk_size, chunk_overlap", SIZES)
+@pytest.mark.parametrize("text", TEXTS.values(), ids=TEXTS.keys())
+def test_chunks_and_offsets_match_langchain(text, chunk_size, chunk_overlap):
+    expected = text_splitters.RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size, chunk_overlap=chunk_overlap, separators=DEFAULT_SEPARATORS, add_start_index=True,
+    ).split_documents([Document(page_content=text, metadata={"page": 3})])
+    actual = TextSplitter(chunk_size, chunk_overlap, DEFAULT_SEPARATORS).split_documents(
+        [Document(page_content=text, metadata={"page": 3})]
+    )
+    assert [doc.page_content for doc in actual] == [doc.page_content for doc in expected]
+    assert [doc.metadata["page"] for doc in actual] == [3] * len(expected)
+    starts = [doc.metadata["start_index"] for doc in actual]
+    assert starts == sorted(starts)
+    for doc, langchain_doc in zip(actual, expected):
+        start, langchain_start = doc.metadata["start_index"], langchain_doc.metadata["start_index"]
+        assert text[start:start + len(doc.page_content)] == doc.page_content
+        # LangChain finds each chunk's text from a guessed offset, which can land on an earlier copy of
+        # a short repeated chunk; any other difference is ours
+        assert start == langchain_start or (
+            langchain_start < start and text.startswith(doc.page_content, langchain_start)
+        )
@@ -0,0 +1,119 @@
+import asyncio
+
+import pytest
+
+from app.services import url_service
+from app.services.url_service import URLExtractor, extract_urls
+
+ARTICLE = "<html><head><title>Static</title></head><body><article><p>{}</p></article></body></html>".format(
+    "Server rendered paragraph text. " * 20
+)
+JS_APP = (
+    "<html><head><title>App</title></head><body><div id=\"root\"></div>"
+    + "<script src=\"/bundle.js\"></script>" * 5
+    + "</body></html>"
+)
+
+
+@pytest.fixture
+def rendered(monkeypatch):
+    """URLs handed to the browser fallback, which returns a stub page instead of starting a browser"""
+    urls = []
+
+    async def render(self, url):
+        urls.append(url)
+        return [url_service.Document(page_content="rendered", metadata={"source": url})]
+
+    monkeypatch.setattr(URLExtractor, "_render", render)
+    return urls
+
+
+def test_static_page_is_extracted_without_browser(site, rendered):
+    site.pages["/article"] = (200, "text/html; charset=utf-8", ARTICLE)
+
+    documents = extract_urls([site.url("/article")])
+
+    assert len(documents) == 1
+    assert documents[0].metadata == {"source": site.url("/article"), "title": "Static"}
+    assert "Server rendered paragraph text." in documents[0].page_content
+    assert rendered == []
+
+
+def test_js_only_page_is_rendered(site, rendered):
+    site.pages["/app"] = (200, "text/html", JS_APP)
+
+    documents = extract_urls([site.url("/app")])
+
+    assert rendered == [site.url("/app")]
+    assert [doc.page_content for doc in documents] == ["rendered"]
+
+
+def test_js_only_page_without_fallback_keeps_http_text(site, rendered):
+    site.pages["/app"] = (200, "text/html", JS_APP)
+
+    documents = extract_urls([site.url("/app")], browser_fallback=False)
+
+    assert rendered == []
+    assert len(documents) == 1
+
+
+def test_missing_page_returns_nothing_and_is_not_rendered(site, rendered):
+    assert extract_urls([site.url("/missing")]) == []
+    assert site.requests == ["/missing"]
+    assert rendered == []
+
+
+def test_network_error_returns_nothing_and_is_not_rendered(site, rendered):
+    url = site.url("/article")
+    site.httpd.shutdown()
+    site.httpd.server_close()
+
+    assert extract_urls([url]) == []
+    assert rendered == []
+
+
+def test_binary_content_is_skipped(site, rendered):
+    site.pages["/logo.png"] = (200, "image/png", b"\x89PNG\r\n\x1a\n\x00\x00")
+
+    assert extract_urls([site.url("/logo.png")]) == []
+    assert rendered == []
+
+
+def test_plain_text_is_kept_as_is(site, rendered):
+    site.pages["/notes.txt"] = (200, "text/plain", "just some notes")
+
+    documents = extract_urls([site.url("/notes.txt")])
+
+    assert [doc.page_content for doc in documents] == ["just some notes"]
+
+
+def test_pdf_is_routed_to_pdf_extractor(site, rendered, monkeypatch):
+    from app.services import extractors
+
+    parsed = []
+
+    def extract_pdf(path):
+        with open(path, "rb") as f:
+            parsed.append(f.read())
+        return [url_service.Document(page_content="page one", metadata={"source": path, "file_path": path, "page": 0})]
+
+    monkeypatch.setitem(extractors._EXTRACTORS, "pdf", extract_pdf)
+    site.pages["/paper.pdf"] = (200, "application/pdf", b"%PDF-1.4 fake")
+
+    documents = extract_urls([site.url("/paper.pdf")])
+
+    assert parsed == [b"%PDF-1.4 fake"]
+    assert [(doc.page_content, doc.metadata) for doc in documents] == [
+        ("page one", {"source": site.url("/paper.pdf"), "page": 0})
+    ]
+
+
+def test_extract_urls_inside_running_event_loop(site, rendered):
+    site.pages["/article"] = (200, "text/html", ARTICLE)
+
+    async def handler():
+        return extract_urls([site.url("/article"), site.url("/missing")])
+
+    documents = asyncio.run(handler())
+
+    assert [doc.metadata["source"] for doc in documents] == [site.url("/article")]
@@ -0,0 +1,86 @@
+import threading
+import time
+
+import pytest
+
+from app.services.youtube_service import TranscriptCache, YouTubeIngestor, YouTubeProvider, youtube_cache_requests
+
+VIDEOS = ["aaaaaaaaaaa", "bbbbbbbbbbb", "ccccccccccc", "ddddddddddd", "eeeeeeeeeee", "fffffffffff"]
+PLAYLIST = "https://www.youtube.com/playlist?list=PLstub"
+
+
+def watch_url(video_id):
+    return f"https://www.youtube.com/watch?v={video_id}"
+
+
+class StubProvider(YouTubeProvider):
+    """Serves fixed transcripts, counting calls and the most transcript fetches in flight at once"""
+    def __init__(self, playlist=()):
+        self.playlist = list(playlist)
+        self.calls = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+    def get_transcript(self, video_id):
+        with self._lock:
+            self.calls.append(("transcript", video_id))
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        time.sleep(0.05)
+        with self._lock:
+            self.in_flight -= 1
+        return [{"text": f"{video_id} sentence {i}.", "start": 10.0 * i, "duration": 9.5} for i in range(30)]
+
+    def get_title(self, url, video_id):
+        with self._lock:
+            self.calls.append(("title", video_id))
+        return f"Video {video_id}"
+
+    def expand_playlist(self, url):
+        with self._lock:
+            self.calls.append(("playlist", url))
+        return [watch_url(video_id) for video_id in self.playlist]
+
+
+@pytest.fixture
+def ingestor(tmp_path):
+    provider = StubProvider(playlist=VIDEOS[2:] + VIDEOS[:1])
+    return YouTubeIngestor(provider=provider, cache=TranscriptCache(str(tmp_path)), max_workers=2)
+
+
+def test_playlists_are_expanded_and_video_ids_deduplicated(ingestor):
+    videos = ingestor.expand([watch_url(VIDEOS[0]), f"https://youtu.be/{VIDEOS[1]}", PLAYLIST,
+                              watch_url(VIDEOS[1]) + "&t=30s"])
+    assert list(videos) == VIDEOS
+    assert videos[VIDEOS[1]] == f"https://youtu.be/{VIDEOS[1]}"
+
+
+def test_fetches_are_bounded_by_max_workers(ingestor):
+    entries = ingestor.resolve([PLAYLIST])
+    assert [entry["video_id"] for entry in entries] == VIDEOS[2:] + VIDEOS[:1]
+    assert ingestor.provider.max_in_flight == 2
+
+
+def test_chunks_carry_timestamps(ingestor):
+    documents = ingestor.load([watch_url(VIDEOS[0])], chunk_size=200, chunk_overlap=40)
+    assert len(documents) > 1
+    for doc in documents:
+        assert doc.metadata["end"] > doc.metadata["start"]
+        assert doc.metadata["source"] == f"{watch_url(VIDEOS[0])}&t={int(doc.metadata['start'])}s"
+        assert doc.metadata["title"] == f"Video {VIDEOS[0]}"
+    assert documents[0].metadata["start"] == 0.0
+    assert documents[1].metadata["start"] < documents[0].metadata["end"]
+
+
+def test_reingesting_known_videos_makes_no_provider_calls(ingestor):
+    urls = [watch_url(video_id) for video_id in VIDEOS[:3]]
+    first = ingestor.load(urls)
+    calls = len(ingestor.provider.calls)
+    assert calls == 6
+
+    hits = youtube_cache_requests.value(result="hit")
+    second = ingestor.load(urls)
+    assert len(ingestor.provider.calls) == calls
+    assert youtube_cache_requests.value(result="hit") == hits + 3
+    assert [(doc.page_content, doc.metadata) for doc in second] == [(doc.page_content, doc.metadata) for doc in first]
@@ -0,0 +1,53 @@
+"""PDF ingestion for pdf_rag.py, run in worker processes.
+
+Streamlit runs pdf_rag.py as __main__, so spawned workers cannot import
+functions from it; this module holds what they run and imports neither
+Streamlit nor Ollama.
+"""
+import re
+import time
+from typing import Callable, List
+
+from langchain_community.document_loaders import PDFPlumberLoader
+from langchain_core.documents import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+
+def text_splitter() -> RecursiveCharacterTextSplitter:
+    return RecursiveCharacterTextSplitter(
+        chunk_size=1000,
+        chunk_overlap=200,
+        separators=["\n\n", "\n", ".", "!", "?", ",", " "],
+        add_start_index=True
+    )
+
+def clean_text(text: str) -> str:
+    """Enhanced text cleaning for PDF and URL content"""
+    text = re.sub(r'^\s*Page \d+\s*$', '', text, flags=re.MULTILINE)
+    text = re.sub(r'(\w+)-\s*\n\s*(\w+)', r'\1\2', text)
+    text = re.sub(r'\s+', ' ', text)
+    text = re.sub(r'[^\x20-\x7E\u2022\u2013\u2014\u2018\u2019\u201C\u201D]', '', text)
+    text = re.sub(r'\s+([.,!?])', r'\1', text)
+    text = re.sub(r'(?<=[a-z])(?=[A-Z])', ' ', text)
+    return text.strip()
+
+def load_pdf(file_path: str, splitter: RecursiveCharacterTextSplitter = None) -> List[Document]:
+    """Load PDF and split into chunks"""
+    loader = PDFPlumberLoader(file_path)
+    documents = loader.load()
+    return (splitter or text_splitter()).split_documents(documents)
+
+def ingest_pdf(file_path: str) -> List[Document]:
+    """Complete PDF processing pipeline; each file is parsed in one worker process"""
+    processed_docs = []
+    for doc in load_pdf(file_path):
+        cleaned_content = clean_text(doc.page_content)
+        doc.page_content = cleaned_content
+        if cleaned_content.strip():
+            processed_docs.append(doc)
+    return processed_docs
+
+def run_timed(func: Callable, argument: str):
+    """Call func(argument) in a worker, returning (result, seconds)"""
+    start = time.perf_counter()
+    return func(argument), time.perf_counter() - start
@@ -1,7 +1,10 @@
 import streamlit as st
+import multiprocessing
+import os
 import re
+import time
 from pathlib import Path
-from typing import List
+from typing import List, Optional
 
 import requests
 
@@ -11,8 +14,7 @@ import concurrent.futures
 from youtube_transcript_api import YouTubeTranscriptApi
 from pytube import YouTube
 
-from langchain_community.document_loaders import PDFPlumberLoader, SeleniumURLLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
+from langchain_community.document_loaders import SeleniumURLLoader
 from langchain_core.vectorstores import InMemoryVectorStore
 from langchain_ollama import OllamaEmbeddings
 from langchain_core.prompts import ChatPromptTemplate
@@ -21,6 +23,8 @@ from langchain_core.documents import Document
 from langchain_community.retrievers import BM25Retriever
 from langchain.retrievers import EnsembleRetriever
 
+from pdf_ingest import clean_text, ingest_pdf, load_pdf, run_timed, text_splitter
+
 
 
 distilled_template = """
@@ -55,6 +59,14 @@ Response should be clear and direct, citing specific parts of the context.
 pdfs_directory = Path('./pdf/')
 pdfs_directory.mkdir(exist_ok=True)
 
+# Bounded pools shared by all sessions: PDF parsing is CPU-bound pure Python, so it runs in
+# processes; URL and YouTube loading waits on the network and summaries on Ollama, so threads do
+MAX_PDF_WORKERS = min(8, os.cpu_count() or 1)
+MAX_FETCH_WORKERS = 4
+MAX_SUMMARY_WORKERS = 2
+# How often the UI refreshes while sources are ingested or summarized
+POLL_SECONDS = 0.5
+
 
 
 llm = OllamaLLM(model="deepseek-r1:8b")
@@ -62,12 +74,7 @@ llm = OllamaLLM(model="deepseek-r1:8b")
 class DocumentProcessor:
     def __init__(self):
         self.answer_prompt = ChatPromptTemplate.from_template(answer_template)
-        self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1000,
-            chunk_overlap=200,
-            separators=["\n\n", "\n", ".", "!", "?", ",", " "],
-            add_start_index=True
-        )
+        self.text_splitter = text_splitter()
         self.vector_store = None    
         self.bm25_retriever_obj = None
         self.semantic_retriever_obj = None
@@ -75,10 +82,7 @@ class DocumentProcessor:
 
     def load_pdf(self, file_path: str) -> List[Document]:
         """Load PDF and split into chunks"""
-        loader = PDFPlumberLoader(file_path)
-        documents = loader.load()
-        split_docs = self.text_splitter.split_documents(documents)
-        return split_docs
+        return load_pdf(file_path, self.text_splitter)
 
     def load_url(self, url: str) -> List[Document]:
         """Load content from a URL, extract text and create a Document"""
@@ -97,31 +101,28 @@ class DocumentProcessor:
     def load_youtube(self, url: str) -> List[Document]:
         """Load content from a YouTube video, extract transcript and create a Document"""
 
-        try:
-            video_id_match = re.search(r'(?:v=|\/)([0-9A-Za-z_-]{11}).*', url)
-            if not video_id_match:
-                return []
-            video_id = video_id_match.group(1)
-            title = self.get_youtube_title(url, video_id)
-
-            # Get transcript
-            transcript_list = YouTubeTranscriptApi.get_transcript(video_id)
-            full_transcript = " ".join([entry["text"] for entry in transcript_list])
-
-            doc = Document(
-                page_content = full_transcript,
-                metadata={
-                    "source": url,
-                    "title": title,
-                    "type": "youtube_transcript"
-                }
-            )
-
-            split_docs = self.text_splitter.split_documents([doc])
-            return split_docs
-        except Exception as e:
-            st.error(f"Error loading YouTube video: {str(e)}")
+        # Runs in a worker thread, so errors are raised and shown with the source's progress
+        video_id_match = re.search(r'(?:v=|\/)([0-9A-Za-z_-]{11}).*', url)
+        if not video_id_match:
             return []
+        video_id = video_id_match.group(1)
+        title = self.get_youtube_title(url, video_id)
+
+        # Get transcript
+        transcript_list = YouTubeTranscriptApi.get_transcript(video_id)
+        full_transcript = " ".join([entry["text"] for entry in transcript_list])
+
+        doc = Document(
+            page_content = full_transcript,
+            metadata={
+                "source": url,
+                "title": title,
+                "type": "youtube_transcript"
+            }
+        )
+
+        split_docs = self.text_splitter.split_documents([doc])
+        return split_docs
         
     def get_youtube_title(self, url: str, video_id: str) -> str:
         """Get YouTube video title using multiple fallback methods"""
@@ -151,36 +152,11 @@ class DocumentProcessor:
 
     def clean_text(self, text: str) -> str:
         """Enhanced text cleaning for PDF and URL content"""
-        text = re.sub(r'^\s*Page \d+\s*$', '', text, flags=re.MULTILINE)
-        text = re.sub(r'(\w+)-\s*\n\s*(\w+)', r'\1\2', text)
-        text = re.sub(r'\s+', ' ', text)
-        text = re.sub(r'[^\x20-\x7E\u2022\u2013\u2014\u2018\u2019\u201C\u201D]', '', text)
-        text = re.sub(r'\s+([.,!?])', r'\1', text)
-        text = re.sub(r'(?<=[a-z])(?=[A-Z])', ' ', text)
-        return text.strip()
+        return clean_text(text)
 
     def process_pdf(self, file_path: str) -> List[Document]:
         """Complete PDF processing pipeline"""
-        docs = self.load_pdf(file_path)
-        processed_docs = []
-
-        # Process documents in parallel
-        with concurrent.futures.ThreadPoolExecutor() as executor:
-            def process_doc(doc):
-                cleaned_content = self.clean_text(doc.page_content)
-                doc.page_content = cleaned_content
-                if cleaned_content.strip():
-                    return doc
-                return None
-            processed_docs = list(filter(None, executor.map(process_doc, docs)))
-
-        # Process documents sequentially
-        # for doc in docs:
-        #   cleaned_content = self.clean_text(doc.page_content)
-        #    doc.page_content = cleaned_content
-        #    if cleaned_content.strip():
-        #        processed_docs.append(doc)
-        return processed_docs
+        return ingest_pdf(file_path)
 
     def process_url(self, url: str) -> List[Document]:
         """Complete URL processing pipeline"""
@@ -291,6 +267,166 @@ class DocumentProcessor:
         clean_content, _ = self.clean_thinking(result)
         return clean_content
 
+# Source ingestion, run in the worker pools (ingest_pdf and run_timed come from pdf_ingest,
+# which spawned worker processes can import)
+def ingest_url(url: str) -> List[Document]:
+    return DocumentProcessor().process_url(url)
+
+def ingest_youtube(url: str) -> List[Document]:
+    return DocumentProcessor().process_youtube(url)
+
+def summarize(documents: List[Document]) -> str:
+    return DocumentProcessor().generate_summary(documents)
+
+
+@st.cache_resource
+def worker_pools():
+    """(pdf, fetch, summary) executors, created once per server"""
+    # Spawned rather than forked: forking the Streamlit server with its threads and Ollama clients
+    # is unsafe. Workers import pdf_ingest, and start once per server since the pools are cached
+    pdf_pool = concurrent.futures.ProcessPoolExecutor(MAX_PDF_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return (
+        pdf_pool,
+        concurrent.futures.ThreadPoolExecutor(MAX_FETCH_WORKERS),
+        concurrent.futures.ThreadPoolExecutor(MAX_SUMMARY_WORKERS),
+    )
+
+
+class SourceJob:
+    """Ingestion and summary of one source, kept in the session across reruns"""
+    LABELS = {"URL": "URL", "PDF": "File", "Youtube": "Youtube video"}
+
+    def __init__(self, kind: str, source: str, future: concurrent.futures.Future):
+        self.kind = kind
+        self.source = source
+        self.future = future
+        self.documents: List[Document] = []
+        self.error: Optional[str] = None
+        self.seconds = 0.0
+        self.summary_future: Optional[concurrent.futures.Future] = None
+        self.summary_start = 0.0
+
+    @property
+    def done(self) -> bool:
+        return self.future.done()
+
+    def collect(self, summary_pool):
+        """Take the ingestion result once it is ready and start summarizing it in the background"""
+        if not self.future.done() or self.summary_future is not None or self.error:
+            return
+        try:
+            self.documents, self.seconds = self.future.result()
+        except Exception as e:
+            self.error = str(e) or type(e).__name__
+            return
+        if self.documents:
+            self.summary_start = time.perf_counter()
+            self.summary_future = summary_pool.submit(summarize, self.documents)
+
+    def status(self) -> str:
+        label = self.LABELS[self.kind]
+        if self.error:
+            return f"{label} failed: {self.source} ({self.error})"
+        if self.future.done():
+            return f"{label} indexed: {self.source} ({len(self.documents)} chunks in {self.seconds:.1f}s)"
+        if self.future.running():
+            return f"Processing {label.lower()}: {self.source}..."
+        return f"Queued: {self.source}"
+
+    @property
+    def title(self) -> str:
+        if self.kind == "Youtube" and self.documents:
+            return self.documents[0].metadata.get("title", self.source)
+        return self.source
+
+    def summary(self) -> Optional[str]:
+        """The summary once generated, else None"""
+        if self.summary_future is None or not self.summary_future.done():
+            return None
+        try:
+            return self.summary_future.result()
+        except Exception as e:
+            return f"Summary unavailable: {str(e)}"
+
+    def cancel(self):
+        self.future.cancel()
+        if self.summary_future is not None:
+            self.summary_future.cancel()
+
+
+def submit_sources(kind: str, requested: List[tuple]) -> List[SourceJob]:
+    """Jobs of the requested (source, ingest function, argument) sources, submitting new ones"""
+    pdf_pool, fetch_pool, _ = worker_pools()
+    # Sources no longer given are dropped, so giving one again retries it
+    names = {source for source, _, _ in requested}
+    for source in [source for source in st.session_state.sources if source not in names]:
+        st.session_state.sources.pop(source).cancel()
+    jobs = []
+    for source, ingest, argument in requested:
+        job = st.session_state.sources.get(source)
+        if job is None:
+            pool = pdf_pool if ingest is ingest_pdf else fetch_pool
+            job = SourceJob(kind, source, pool.submit(run_timed, ingest, argument))
+            st.session_state.sources[source] = job
+        jobs.append(job)
+    return jobs
+
+
+def show_ingest_progress(jobs: List[SourceJob]):
+    """Show per-source progress in the sidebar until every source is ingested"""
+    _, _, summary_pool = worker_pools()
+    slots = [st.sidebar.empty() for _ in jobs]
+    progress = st.sidebar.progress(0.0)
+    while True:
+        for job in jobs:
+            job.collect(summary_pool)
+        done = sum(job.done for job in jobs)
+        for slot, job in zip(slots, jobs):
+            slot.write(job.status())
+        pending = [job.future for job in jobs if not job.done]
+        if not pending:
+            progress.empty()
+            return
+        progress.progress(done / len(jobs), text=f"{done}/{len(jobs)} sources processed")
+        concurrent.futures.wait(pending, timeout=POLL_SECONDS, return_when=concurrent.futures.FIRST_COMPLETED)
+
+
+def show_summaries(jobs: List[SourceJob]) -> List[tuple]:
+    """Render ready summaries, returning (job, placeholder) pairs of those still being generated"""
+    pending = []
+    for job in jobs:
+        if not job.documents:
+            continue
+        st.markdown(f"**{job.title}** ({job.kind})")
+        slot = st.empty()
+        summary = job.summary()
+        if summary is None:
+            slot.caption("Generating summary...")
+            pending.append((job, slot))
+        else:
+            slot.markdown(summary)
+        st.markdown("---")
+    return pending
+
+
+def wait_for_summaries(pending: List[tuple]):
+    """Fill in summaries as they finish; a new question interrupts this at the next refresh"""
+    while pending:
+        concurrent.futures.wait(
+            [job.summary_future for job, _ in pending], timeout=POLL_SECONDS,
+            return_when=concurrent.futures.FIRST_COMPLETED
+        )
+        still_pending = []
+        for job, slot in pending:
+            summary = job.summary()
+            if summary is None:
+                slot.caption(f"Generating summary... {time.perf_counter() - job.summary_start:.0f}s")
+                still_pending.append((job, slot))
+            else:
+                slot.markdown(summary)
+        pending = still_pending
+
+
 # Streamlit interface
 def main():
 
@@ -299,95 +435,69 @@ def main():
     st.sidebar.title("Content Source")
     input_type = st.sidebar.radio("Choose Input Type", ["URL", "PDF", "Youtube"])
 
-    if 'all_documents' not in st.session_state:
-        st.session_state.all_documents = []
+    # Sources by name, with their ingestion and summary jobs
+    if 'sources' not in st.session_state:
+        st.session_state.sources = {}
 
-    if 'content_summaries' not in st.session_state:
-        st.session_state.content_summarises = []
-    
-    if 'indexed' not in st.session_state:
-        st.session_state.indexed = False
+    # The processor holding the index, and the sources it was built from
+    if 'processor' not in st.session_state:
+        st.session_state.processor = DocumentProcessor()
+        st.session_state.indexed_sources = ()
 
     if 'last_input_type' not in st.session_state or st.session_state.last_input_type != input_type:
-        st.session_state.all_documents = []
-        st.session_state.content_summaries = []
-        st.session_state.indexed = False
+        for job in st.session_state.sources.values():
+            job.cancel()
+        st.session_state.sources = {}
+        st.session_state.processor = DocumentProcessor()
+        st.session_state.indexed_sources = ()
         st.session_state.last_input_type = input_type
 
-    processor = DocumentProcessor()
+    processor = st.session_state.processor
 
-    
+    # (source, ingest function, argument) of every source currently given
+    requested = []
     if input_type == "URL":
-        urls = []
         for i in range(3):
             url = st.sidebar.text_input(f"Article URL {i+1}")
             if url:
-                urls.append(url)
-        if urls:
-            for url in urls:
-                with st.spinner(f"Processing URL: {url}"):
-                    docs = processor.process_url(url)
-                    st.session_state.all_documents.extend(docs)
-                    st.sidebar.write(f"URL indexed: {url}")
-
-                    # Generate summary for URL
-                    with st.spinner(f"Generating summary for {url}..."):
-                        summary = processor.generate_summary(docs)
-                        st.session_state.content_summaries.append({"type": "URL", "source": url, "summary": summary})
-
+                requested.append((url, ingest_url, url))
 
     elif input_type == "PDF":
         uploaded_files = st.sidebar.file_uploader("Upload File (PDF)", type=["pdf"], accept_multiple_files=True)
-        if uploaded_files:
-            for uploaded_file in uploaded_files:
-                file_path = pdfs_directory / uploaded_file.name
+        for uploaded_file in uploaded_files or []:
+            file_path = pdfs_directory / uploaded_file.name
+            if uploaded_file.name not in st.session_state.sources:
                 with open(file_path, "wb") as f:
                     f.write(uploaded_file.getbuffer())
-                with st.spinner(f"Processing {uploaded_file.name}..."):
-                    docs = processor.process_pdf(str(file_path))
-                    st.session_state.all_documents.extend(docs)
-                    st.sidebar.write(f"File indexed: {uploaded_file.name}")
-
-                    # Generate summary for URL
-                    with st.spinner(f"Generating summary for {uploaded_file.name}..."):
-                        summary = processor.generate_summary(docs)
-                        st.session_state.content_summaries.append({"type": "PDF", "source": uploaded_file.name, "summary": summary})
+            requested.append((uploaded_file.name, ingest_pdf, str(file_path)))
 
     elif input_type == "Youtube":
-        youtube_urls = []
         for i in range(3):
             youtube_url = st.sidebar.text_input(f"Youtube URL {i+1}")
             if youtube_url:
-                youtube_urls.append(youtube_url)
-
-        if youtube_urls:
-            for youtube_url in youtube_urls:
-                with st.spinner(f"Processing Youtube video: {youtube_url}"):
-                    docs = processor.process_youtube(youtube_url)
-                    st.session_state.all_documents.extend(docs)
-                    st.sidebar.write(f"Youtube video indexed: {youtube_url}")
-
-                    # Generate summary for Youtube Video
-                    with st.spinner(f"Generating summary for {youtube_url}..."):
-                        summary = processor.generate_summary(docs)
-                        st.session_state.content_summaries.append({"type": "URL", "source": youtube_url, "summary": summary})
-    
-    # Index all collective documents if any
-
-    if st.session_state.all_documents:
-        processor.semantic_retriever(st.session_state.all_documents)
-        processor.bm25_retriever(st.session_state.all_documents)
-        processor.create_hybrid_retriever(semantic_weight=0.5, bm25_weight=0.5)
+                requested.append((youtube_url, ingest_youtube, youtube_url))
+
+    # Ingest all new sources concurrently; each summary starts as soon as its source is done
+    jobs = submit_sources(input_type, requested)
+    pending_summaries = []
+    if jobs:
+        show_ingest_progress(jobs)
+
+    # Index all collective documents if any, once per change in the set of sources
+    indexed_sources = tuple(job.source for job in jobs if job.documents)
+    if indexed_sources != st.session_state.indexed_sources:
+        processor = st.session_state.processor = DocumentProcessor()
+        documents = [doc for job in jobs for doc in job.documents]
+        if documents:
+            with st.spinner("Indexing documents..."):
+                processor.semantic_retriever(documents)
+                processor.bm25_retriever(documents)
+                processor.create_hybrid_retriever(semantic_weight=0.5, bm25_weight=0.5)
+        st.session_state.indexed_sources = indexed_sources
+
+    if indexed_sources:
         st.success("All documents processed and indexed!")
-        
-        if st.session_state.content_summaries:
-            for item in st.session_state.content_summaries:
-                if item["type"] == "YouTube":
-                    st.markdown(f"**{item['title']}** (YouTube)")
-                else:
-                    st.markdown(f"**{item['source']}** ({item['type']})")
-                st.markdown(item["summary"])
-                st.markdown("---")
+        pending_summaries = show_summaries(jobs)
     
     # Question answering interface
     question = st.chat_input("Ask a question about the documents")
@@ -419,6 +529,9 @@ def main():
                         st.markdown(f"*Source: {source}*")
                     st.markdown("---")
 
+    # Summaries still being generated appear in place as they finish
+    wait_for_summaries(pending_summaries)
+
 if __name__ == "__main__":
     main()
 